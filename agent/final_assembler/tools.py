@@ -2,6 +2,7 @@ from datetime import datetime
 from pathlib import Path
 import pypandoc
 from agent.state import GraphState
+from agent.researcher.web_cache import get_web_cache
 from utils.token_tracker import create_token_usage
 
 
@@ -155,6 +156,19 @@ def save_token_report(state: GraphState, output_dir: Path):
         f.write(f"Total output cost: ${total_usage['output_cost']:.6f}\n")
         f.write(f"TOTAL COST: ${total_usage['total_cost']:.6f}\n")
 
+        web_cache = get_web_cache().stats()
+        f.write("\nWEB SEARCH CACHE\n")
+        f.write("-" * 80 + "\n")
+        f.write(
+            f"Hits: {web_cache['hits']:,}, misses: {web_cache['misses']:,} "
+            f"(hit rate {web_cache['hit_rate']:.0%}, "
+            f"{web_cache['expired']:,} expired)\n"
+        )
+        f.write(
+            f"Stored searches: {web_cache['entries']:,} "
+            f"({web_cache['bytes'] / 1024 ** 2:,.1f} MB)\n"
+        )
+
     print(f"📊 Token report saved to: {report_filepath}")
 
 
@@ -5,6 +5,8 @@ from agent.state import GraphState
 from agent.workflow_router.graph import (
     route_master_router,
 )
+from agent.retrieval_prefetch.graph import create_retrieval_prefetch_graph
+from agent.research_digest.graph import create_research_digest_graph
 from agent.prepare_chapter.graph import create_prepare_chapter_graph
 from agent.researcher.graph import create_researcher_graph
 from agent.writer.graph import create_writer_graph
@@ -20,6 +22,8 @@ def create_document_generation_graph():
     workflow = StateGraph(GraphState)
 
     # Add nodes (each node is a compiled subgraph)
+    workflow.add_node("prefetch_retrieval", create_retrieval_prefetch_graph())
+    workflow.add_node("research_digest", create_research_digest_graph())
     workflow.add_node("workflow_router", lambda state: state)  # Simple router node
     workflow.add_node("prepare_next_chapter", create_prepare_chapter_graph())
     workflow.add_node("researcher", create_researcher_graph())
@@ -28,8 +32,11 @@ def create_document_generation_graph():
     workflow.add_node("save_chapter", create_save_chapter_graph())
     workflow.add_node("final_assembler", create_final_assembler_graph())
 
-    # Set entry point
-    workflow.set_entry_point("workflow_router")
+    # Set entry point: outline-wide retrieval and research file digests run
+    # once before the chapter loop
+    workflow.set_entry_point("prefetch_retrieval")
+    workflow.add_edge("prefetch_retrieval", "research_digest")
+    workflow.add_edge("research_digest", "workflow_router")
 
     # Add edges and conditional edges
     workflow.add_conditional_edges(
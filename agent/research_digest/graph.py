@@ -0,0 +1,15 @@
+from langgraph.graph import StateGraph, END
+from agent.state import GraphState
+from agent.research_digest.tools import build_research_digests
+
+
+def create_research_digest_graph():
+    """Create the research file digest subgraph"""
+    workflow = StateGraph(GraphState)
+
+    workflow.add_node("digest", build_research_digests)
+
+    workflow.set_entry_point("digest")
+    workflow.add_edge("digest", END)
+
+    return workflow.compile()
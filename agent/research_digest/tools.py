@@ -0,0 +1,49 @@
+from pathlib import Path
+from typing import Dict
+from agent.state import GraphState
+from agent.researcher.digest import build_digest
+from utils.llm_config import get_llm
+from utils.token_tracker import (
+    create_token_usage,
+    merge_token_usage,
+    print_token_usage,
+    update_total_tokens,
+)
+
+
+def build_research_digests(state: GraphState) -> dict:
+    """Digest every distinct research file of the outline once"""
+    print("\n--- 🗂️ DIGESTING RESEARCH FILES ---")
+
+    if not state.get("digest_research_files"):
+        print("  - Skipped (digest_research_files is disabled)")
+        return {}
+
+    chapters = state["outline"].get("table_of_contents", [])
+    # Many chapters share the same files; each is digested once
+    research_files = list(
+        dict.fromkeys(
+            f for chapter in chapters for f in chapter.get("research_files", [])
+        )
+    )
+
+    llm = get_llm()
+    digests: Dict[str, Dict] = {}
+    usage = create_token_usage(0, 0)
+    for md_file in research_files:
+        if not Path(md_file).exists():
+            print(f"  - Warning: Markdown file not found: {md_file}")
+            continue
+        try:
+            digest = build_digest(md_file, llm)
+        except Exception as e:
+            print(f"  - Error digesting {md_file}, chapters get its sections: {e}")
+            continue
+        usage = merge_token_usage(usage, digest.pop("token_usage"))
+        digests[md_file] = digest
+
+    updates = {"research_digests": digests}
+    if usage["total_tokens"]:
+        print_token_usage(usage, "Digest Token Usage")
+        updates.update(update_total_tokens(state, usage, "digest", "all"))
+    return updates
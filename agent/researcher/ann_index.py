@@ -0,0 +1,143 @@
+import math
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+
+ANN_FILE = "ivf_index.npz"
+
+# Knowledge bases smaller than this are always searched exactly
+DEFAULT_ANN_MIN_ROWS = 50_000
+
+# Rows assigned to centroids per matrix product while building
+_ASSIGN_BATCH = 65_536
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _assign(embeddings: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (by inner product) of every row, in batches"""
+    assignments = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), _ASSIGN_BATCH):
+        batch = np.asarray(embeddings[start : start + _ASSIGN_BATCH], dtype=np.float32)
+        assignments[start : start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """Inverted-file ANN index over normalised embeddings (pure NumPy)
+
+    Rows are grouped by their nearest k-means centroid. A query scores the
+    centroids, then only the rows of the ``nprobe`` closest lists. Raising
+    ``nprobe`` trades latency for recall; ``nprobe == n_lists`` is exact.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        list_rows: np.ndarray,
+        nprobe: Optional[int] = None,
+    ):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.nprobe = nprobe or self.default_nprobe(self.n_lists)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @staticmethod
+    def default_n_lists(n_rows: int) -> int:
+        return max(1, min(n_rows, int(4 * math.sqrt(n_rows))))
+
+    @staticmethod
+    def default_nprobe(n_lists: int) -> int:
+        return max(1, n_lists // 16)
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_iter: int = 10,
+        sample_size: int = 100_000,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """Train spherical k-means on a sample and bucket every row"""
+        n_rows = len(embeddings)
+        n_lists = min(n_lists or cls.default_n_lists(n_rows), n_rows)
+        rng = np.random.default_rng(seed)
+
+        sample_ids = np.sort(
+            rng.choice(n_rows, min(sample_size, n_rows), replace=False)
+        )
+        sample = _normalize(np.asarray(embeddings[sample_ids], dtype=np.float32))
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for _ in range(n_iter):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+
+            # Re-seed empty lists with random sample points
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        assignments = _assign(embeddings, centroids)
+        list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+        list_offsets = np.searchsorted(
+            assignments[list_rows], np.arange(n_lists + 1)
+        ).astype(np.int64)
+
+        return cls(centroids, list_offsets, list_rows)
+
+    def candidates(
+        self, query_embeddings: np.ndarray, nprobe: Optional[int] = None
+    ) -> List[np.ndarray]:
+        """Sorted candidate row ids for each query"""
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        centroid_scores = (
+            np.asarray(query_embeddings, dtype=np.float32) @ self.centroids.T
+        )
+
+        if nprobe >= self.n_lists:
+            probed = np.tile(np.arange(self.n_lists), (len(centroid_scores), 1))
+        else:
+            probed = np.argpartition(centroid_scores, -nprobe, axis=1)[:, -nprobe:]
+
+        results = []
+        for lists in probed:
+            parts = [
+                self.list_rows[self.list_offsets[i] : self.list_offsets[i + 1]]
+                for i in lists
+            ]
+            results.append(np.sort(np.concatenate(parts)))
+        return results
+
+    def save(self, path):
+        np.savez(
+            path,
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_rows=self.list_rows,
+        )
+
+    @classmethod
+    def load(cls, path, nprobe: Optional[int] = None) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(
+                data["centroids"], data["list_offsets"], data["list_rows"], nprobe
+            )
+
+
+def ann_index_path(kb_dir) -> Path:
+    """Location of the persisted IVF index inside a compiled sidecar"""
+    return Path(kb_dir) / ANN_FILE
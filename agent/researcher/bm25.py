@@ -0,0 +1,246 @@
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+BM25_FILE = "bm25_index.npz"
+
+# Reciprocal rank fusion constant (Cormack et al.)
+RRF_K = 60
+
+# Runs of letters/digits, optionally joined by "/", "." or "-", so that
+# identifiers like "EBA/GL/2017/06", "5.5.3" or "IFRS-9" stay one token
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[/.\-][a-z0-9]+)*")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were which will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound identifiers also yield their parts"""
+    tokens = []
+    for match in _TOKEN_RE.findall((text or "").lower()):
+        if match in _STOPWORDS:
+            continue
+        tokens.append(match)
+        if len(match) > 1 and any(sep in match for sep in "/.-"):
+            tokens.extend(
+                part
+                for part in re.split(r"[/.\-]", match)
+                if part and part not in _STOPWORDS
+            )
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 inverted index over the chunk texts of a knowledge base
+
+    Postings are stored CSR-style (term -> doc ids, term frequencies) so the
+    index can be persisted next to the embedding matrix and scored with a
+    single ``bincount`` per query.
+    """
+
+    def __init__(
+        self,
+        terms: np.ndarray,
+        term_offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.terms = terms
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: Dict[str, int] = {term: i for i, term in enumerate(terms)}
+
+        n_docs = len(doc_lengths)
+        doc_freqs = np.diff(term_offsets).astype(np.float32)
+        self.idf = np.log1p((n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5))
+
+        # Per-posting term weight, so a query only sums idf * weight
+        avgdl = float(doc_lengths.mean()) if n_docs else 1.0
+        tf = term_freqs.astype(np.float32)
+        norm = k1 * (1 - b + b * doc_lengths[doc_ids] / max(avgdl, 1e-9))
+        self.weights = (tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (
+            self.term_offsets,
+            self.doc_ids,
+            self.term_freqs,
+            self.doc_lengths,
+            self.idf,
+            self.weights,
+        )
+        return int(sum(array.nbytes for array in arrays))
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "BM25Index":
+        vocabulary: Dict[str, int] = {}
+        term_ids, doc_ids, term_freqs, doc_lengths = [], [], [], []
+
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc)
+                term_freqs.append(count)
+
+        terms = np.array(list(vocabulary), dtype=str)
+        return cls._from_postings(
+            terms,
+            np.asarray(term_ids, dtype=np.int64),
+            np.asarray(doc_ids, dtype=np.int64),
+            np.asarray(term_freqs, dtype=np.int32),
+            np.asarray(doc_lengths, dtype=np.int32),
+        )
+
+    @classmethod
+    def _from_postings(cls, terms, term_ids, doc_ids, term_freqs, doc_lengths):
+        """Sort (term, doc, tf) triples into CSR postings"""
+        order = np.lexsort((doc_ids, term_ids))
+        term_offsets = np.searchsorted(
+            term_ids[order], np.arange(len(terms) + 1)
+        ).astype(np.int64)
+        return cls(
+            terms,
+            term_offsets,
+            doc_ids[order].astype(np.int32),
+            term_freqs[order].astype(np.int32),
+            doc_lengths,
+        )
+
+    @classmethod
+    def merge(
+        cls, indexes: List["BM25Index"], live_rows: List[np.ndarray]
+    ) -> "BM25Index":
+        """Combine per-segment indexes, keeping only ``live_rows`` of each"""
+        vocabulary: Dict[str, int] = {}
+        term_ids, doc_ids, term_freqs, doc_lengths = [], [], [], []
+        offset = 0
+
+        for index, live in zip(indexes, live_rows):
+            global_terms = np.array(
+                [vocabulary.setdefault(t, len(vocabulary)) for t in index.terms],
+                dtype=np.int64,
+            )
+            # Old doc id -> new doc id, -1 for tombstoned rows
+            remap = np.full(index.n_docs, -1, dtype=np.int64)
+            remap[live] = offset + np.arange(len(live))
+
+            posting_terms = np.repeat(global_terms, np.diff(index.term_offsets))
+            new_docs = remap[index.doc_ids]
+            keep = new_docs >= 0
+            term_ids.append(posting_terms[keep])
+            doc_ids.append(new_docs[keep])
+            term_freqs.append(index.term_freqs[keep])
+            doc_lengths.append(index.doc_lengths[live])
+            offset += len(live)
+
+        if not indexes:
+            return cls.build([])
+        return cls._from_postings(
+            np.array(list(vocabulary), dtype=str),
+            np.concatenate(term_ids),
+            np.concatenate(doc_ids),
+            np.concatenate(term_freqs),
+            np.concatenate(doc_lengths).astype(np.int32),
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for a query"""
+        starts, stops, idfs = [], [], []
+        for term, count in Counter(tokenize(query)).items():
+            term_id = self.vocabulary.get(term)
+            if term_id is not None:
+                starts.append(self.term_offsets[term_id])
+                stops.append(self.term_offsets[term_id + 1])
+                idfs.append(self.idf[term_id] * count)
+
+        if not starts:
+            return np.zeros(self.n_docs, dtype=np.float32)
+
+        postings = np.concatenate(
+            [np.arange(start, stop) for start, stop in zip(starts, stops)]
+        )
+        posting_idf = np.repeat(
+            np.asarray(idfs, dtype=np.float32), np.subtract(stops, starts)
+        )
+        return np.bincount(
+            self.doc_ids[postings],
+            weights=posting_idf * self.weights[postings],
+            minlength=self.n_docs,
+        ).astype(np.float32)
+
+    def top(
+        self, query: str, top_k: int, rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Best matching rows (optionally within ``rows``) and their scores"""
+        scores = self.scores(query)
+        if rows is not None:
+            scores = scores[rows]
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(scores[matched], -top_k)[-top_k:]]
+        matched = matched[np.argsort(scores[matched])[::-1]]
+        found = matched if rows is None else rows[matched]
+        return found, scores[matched]
+
+    def save(self, path):
+        np.savez(
+            path,
+            terms=self.terms,
+            term_offsets=self.term_offsets,
+            doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+        )
+
+    @classmethod
+    def load(cls, path) -> "BM25Index":
+        with np.load(path) as data:
+            return cls(
+                data["terms"],
+                data["term_offsets"],
+                data["doc_ids"],
+                data["term_freqs"],
+                data["doc_lengths"],
+            )
+
+
+def bm25_index_path(kb_dir) -> Path:
+    """Location of the persisted BM25 index inside a compiled sidecar"""
+    return Path(kb_dir) / BM25_FILE
+
+
+def reciprocal_rank_fusion(
+    rankings: List[np.ndarray], k: int = RRF_K
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse ranked row lists; returns rows and fused scores, best first"""
+    rankings = [np.asarray(ranking, dtype=np.int64) for ranking in rankings]
+    if not any(len(ranking) for ranking in rankings):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    rows = np.concatenate(rankings)
+    contributions = np.concatenate(
+        [1.0 / (k + 1 + np.arange(len(ranking))) for ranking in rankings]
+    )
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    fused = np.bincount(inverse, weights=contributions)
+    order = np.argsort(fused, kind="stable")[::-1]
+    return unique_rows[order], fused[order]
@@ -0,0 +1,222 @@
+"""Extractive compression of retrieved context
+
+Long chunks are cut down to the sentences most similar to the chapter query,
+plus their neighbours so each kept sentence keeps its local context.
+Knowledge base chunks use the sentence embeddings precomputed at build time
+(``kb_compiler --sentences``); other chunks have their sentences embedded
+through the embedding cache.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from agent.state import ContextItem
+from agent.researcher.context_packer import count_tokens, render_item
+from agent.researcher.federated import FederatedKnowledgeBase
+from agent.researcher.sentence_index import (
+    GAP_MARKER,
+    split_sentences,
+    truncate_vectors,
+)
+
+# Original tokens per kept token aimed for in each compressed chunk
+DEFAULT_TARGET_RATIO = 4.0
+
+# Sentences kept on each side of a selected sentence
+DEFAULT_NEIGHBOURS = 1
+
+# Chunks with fewer sentences than this are kept whole
+MIN_SENTENCES = 4
+
+# Sources whose items are compressed; research documents are kept as-is
+COMPRESSED_SOURCES = ("kb", "web")
+
+
+def select_sentences(
+    scores: np.ndarray,
+    sentence_tokens: np.ndarray,
+    target_tokens: int,
+    neighbours: int = DEFAULT_NEIGHBOURS,
+) -> np.ndarray:
+    """Mask of the sentences to keep
+
+    The best scoring sentences are added, each with its neighbours, until the
+    kept sentences reach ``target_tokens``. The best one is always kept.
+    """
+    n = len(scores)
+    keep = np.zeros(n, dtype=bool)
+    for seed in np.argsort(-scores, kind="stable"):
+        if keep.any() and sentence_tokens[keep].sum() >= target_tokens:
+            break
+        keep[max(0, seed - neighbours) : min(n, seed + neighbours + 1)] = True
+    return keep
+
+
+def extract(text: str, spans: np.ndarray, keep: np.ndarray) -> str:
+    """Join the kept sentence runs, marking the text left out between them"""
+    parts = []
+    run_start = None
+    for i, kept in enumerate(keep):
+        if kept and run_start is None:
+            run_start = i
+        if run_start is not None and (not kept or i == len(keep) - 1):
+            run_end = i if kept else i - 1
+            if run_start > 0 or parts:
+                parts.append(GAP_MARKER)
+            parts.append(text[spans[run_start][0] : spans[run_end][1]])
+            run_start = None
+    if not keep[-1]:
+        parts.append(GAP_MARKER)
+    return " ".join(parts)
+
+
+class ContextCompressor:
+    """Compress context items against one query vector
+
+    Args:
+        federated: Knowledge bases the KB items were retrieved from
+        query_vector: Embedding of the chapter query
+        target_ratio: Original / kept tokens aimed for per chunk
+        neighbours: Sentences kept around each selected sentence
+        allow_embedding: Whether sentences without a precomputed or cached
+            vector may be sent to the embeddings API
+    """
+
+    def __init__(
+        self,
+        federated: FederatedKnowledgeBase,
+        query_vector: np.ndarray,
+        target_ratio: float = DEFAULT_TARGET_RATIO,
+        neighbours: int = DEFAULT_NEIGHBOURS,
+        allow_embedding: bool = True,
+    ):
+        self.federated = federated
+        self.query_vector = np.asarray(query_vector, dtype=np.float32)
+        self.target_ratio = target_ratio
+        self.neighbours = neighbours
+        self.allow_embedding = allow_embedding
+
+    def compress(self, items: List[ContextItem]) -> Tuple[List[ContextItem], Dict]:
+        """Compressed copies of the items and a report of the reduction"""
+        sentences = [self._sentences(item) for item in items]
+        self._embed_missing(items, sentences)
+
+        compressed = []
+        totals = {
+            "items": len(items),
+            "compressed": 0,
+            "original_tokens": 0,
+            "compressed_tokens": 0,
+            "kept_score": 0.0,
+            "total_score": 0.0,
+        }
+        for item, found in zip(items, sentences):
+            item = dict(item)
+            original_tokens = count_tokens(render_item(item))
+            totals["original_tokens"] += original_tokens
+
+            if found is not None and found[1] is not None:
+                spans, vectors = found
+                scores = self._scores(vectors)
+                sentence_tokens = np.array(
+                    [count_tokens(item["text"][begin:end]) for begin, end in spans]
+                )
+                keep = select_sentences(
+                    scores,
+                    sentence_tokens,
+                    int(sentence_tokens.sum() / self.target_ratio),
+                    self.neighbours,
+                )
+                positive = np.clip(scores, 0, None)
+                totals["kept_score"] += float(positive[keep].sum())
+                totals["total_score"] += float(positive.sum())
+                if not keep.all():
+                    item["text"] = extract(item["text"], spans, keep)
+                    item["compressed"] = True
+                    totals["compressed"] += 1
+
+            totals["compressed_tokens"] += count_tokens(render_item(item))
+            compressed.append(item)
+
+        return compressed, compression_report(totals)
+
+    def _sentences(
+        self, item: ContextItem
+    ) -> Optional[Tuple[np.ndarray, Optional[np.ndarray]]]:
+        """Sentence spans of an item, with precomputed vectors if available
+
+        Returns None for items that are not compressed (or already are).
+        """
+        source = item["source"]
+        if source.split("_")[0] not in COMPRESSED_SOURCES or item.get("compressed"):
+            return None
+
+        querier = (
+            self.federated.queriers.get(source[3:])
+            if source.startswith("kb_")
+            else None
+        )
+        if querier is not None and querier.sentence_index is not None:
+            if "row" in item:
+                spans, vectors = querier.sentence_index.sentences(item["row"])
+                return (spans, vectors) if len(spans) >= MIN_SENTENCES else None
+
+        spans = np.array(split_sentences(item["text"]), dtype=np.int64)
+        return (spans, None) if len(spans) >= MIN_SENTENCES else None
+
+    def _embed_missing(self, items: List[ContextItem], sentences: List):
+        """Fill in vectors for items without precomputed sentence embeddings"""
+        pending = [
+            (i, [items[i]["text"][begin:end] for begin, end in found[0]])
+            for i, found in enumerate(sentences)
+            if found is not None and found[1] is None
+        ]
+        if not pending:
+            return
+
+        texts = [text for _, item_texts in pending for text in item_texts]
+        embedder = self.federated.embedding_model
+        try:
+            if self.allow_embedding:
+                vectors = np.array(embedder.embed_documents(texts), dtype=np.float32)
+            else:
+                vectors = embedder.cached_vectors(texts)
+        except Exception as e:
+            print(f"    • Sentence embedding failed, keeping chunks whole: {e}")
+            return
+
+        position = 0
+        for i, item_texts in pending:
+            item_vectors = vectors[position : position + len(item_texts)]
+            position += len(item_texts)
+            if any(vector is None for vector in item_vectors):
+                continue
+            sentences[i] = (sentences[i][0], np.vstack(item_vectors))
+
+    def _scores(self, vectors: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each sentence to the query"""
+        query = truncate_vectors(self.query_vector, vectors.shape[1])[0]
+        return truncate_vectors(vectors, vectors.shape[1]) @ query
+
+
+def compression_report(totals: Dict) -> Dict:
+    """Compression ratio and the share of sentence relevance that was kept"""
+    return {
+        "items": totals["items"],
+        "compressed": totals["compressed"],
+        "original_tokens": totals["original_tokens"],
+        "compressed_tokens": totals["compressed_tokens"],
+        "ratio": totals["original_tokens"] / max(totals["compressed_tokens"], 1),
+        "coverage": (
+            totals["kept_score"] / totals["total_score"]
+            if totals["total_score"]
+            else 1.0
+        ),
+    }
+
+
+def print_compression_report(report: Dict):
+    print(
+        f"  - Compressed {report['compressed']}/{report['items']} items: "
+        f"{report['original_tokens']:,} -> {report['compressed_tokens']:,} tokens "
+        f"({report['ratio']:.1f}x, {report['coverage']:.0%} of relevance kept)"
+    )
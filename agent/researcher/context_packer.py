@@ -0,0 +1,414 @@
+"""Token-budget-aware packing of retrieved context
+
+Search results from every source (web, knowledge bases, research documents)
+are turned into scored context items. ``pack_context`` fills a per-stage
+token budget, counted with the LLM's tokenizer, and reports every item it
+leaves out:
+
+1. Knowledge base results are cut per source where their score distribution
+   drops off (``adaptive_cutoff``), instead of a fixed top_k / threshold
+2. Each source gets its minimum number of items (``min_per_source``)
+3. The remaining budget is filled greedily by score per token
+4. Any leftover budget is used for a truncated copy of the best item left
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional
+import numpy as np
+import tiktoken
+from agent.state import ContextItem
+from agent.researcher.sentence_index import expand_windows
+
+# "documents" is the budget of the sections retrieved from each research file;
+# "writer" is the context passed straight to the writer in direct mode and
+# "rewrite" the additional context retrieved for review feedback
+DEFAULT_CONTEXT_BUDGETS = {
+    "research": 24_000,
+    "documents": 4_000,
+    "writer": 12_000,
+    "rewrite": 6_000,
+}
+
+# Minimum items per source; "kb" applies to every kb_<name> source
+DEFAULT_MIN_PER_SOURCE = {"web": 1, "kb": 2, "documents": 1}
+
+# Scores for items that have no retrieval score of their own
+DEFAULT_ITEM_SCORES = {"web": 0.5, "documents": 0.5}
+
+# Candidates retrieved per knowledge base before the adaptive cutoff
+DEFAULT_KB_CANDIDATES = 30
+
+# No single item may take more than this share of the budget
+MAX_ITEM_SHARE = 0.5
+
+# Truncated items shorter than this are not worth including
+MIN_TRUNCATED_TOKENS = 200
+
+SOURCE_HEADINGS = {"web": "WEB SEARCH RESULTS", "documents": "RESEARCH DOCUMENTS"}
+
+
+class _ApproximateEncoding:
+    """Stand-in when tokenizer files cannot be loaded (~4 characters per token)"""
+
+    def encode(self, text: str, **kwargs) -> List[str]:
+        return [text[i : i + 4] for i in range(0, len(text), 4)]
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = "o3"):
+    """Tokenizer of the model the context is sent to"""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its files on first use
+        print(f"  - Tokenizer unavailable, estimating token counts: {e}")
+        return _ApproximateEncoding()
+
+
+def count_tokens(text: str, model: str = "o3") -> int:
+    return len(get_encoding(model).encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "o3") -> str:
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]) + "..."
+
+
+def budget_for(state: Dict, stage: str) -> int:
+    """Token budget of a stage from ``context_budgets`` in state"""
+    budgets = {**DEFAULT_CONTEXT_BUDGETS, **(state.get("context_budgets") or {})}
+    return budgets[stage]
+
+
+def source_heading(source: str) -> str:
+    if source.startswith("kb_"):
+        return f"{source[3:].upper()} KNOWLEDGE BASE"
+    return SOURCE_HEADINGS.get(source, source.upper())
+
+
+def kb_items(results: List[Dict]) -> List[ContextItem]:
+    """Context items for federated knowledge base results"""
+    items = []
+    for result in results:
+        categories = str(result["category_1"])
+        if result["category_2"] and result["category_2"] != result["category_1"]:
+            categories += f" > {result['category_2']}"
+        # Lexical-only hits have no cosine similarity, only BM25 relevance
+        if "lexical_relevance" in result:
+            score = result["lexical_relevance"]
+            label = f"BM25 relevance: {score:.3f}"
+        else:
+            score = result["score"]
+            label = f"Similarity: {score:.3f}"
+        item: ContextItem = {
+            "source": f"kb_{result['source']}",
+            "id": str(result["id"]),
+            "score": float(score),
+            "header": (
+                f"**Entry {result['id']}** ({label})\n" f"- Categories: {categories}"
+            ),
+            "text": result["combined_text"],
+            "row": int(result["row"]),
+        }
+        # Sentence-window results carry only the text around their matches
+        if result.get("windows"):
+            item["text"] = expand_windows(item["text"], result["windows"])
+            item["compressed"] = True
+        items.append(item)
+    return items
+
+
+def web_items(
+    search_results: List[Dict],
+    delivered: Optional[Dict[str, str]] = None,
+    chapter_id: Optional[str] = None,
+) -> List[ContextItem]:
+    """Context items for web search results and the pages they cited
+
+    Each cited page becomes one item holding its passages, even if several
+    queries found it. Queries answered from the web source store have no
+    text response and only contribute their pages. Pages whose content already went to an earlier
+    chapter (``delivered``: URL -> chapter id) are only listed by title
+    and URL, so their content reaches the researcher once per run.
+    """
+    items: List[ContextItem] = [
+        {
+            "source": "web",
+            "id": result["query"],
+            "score": DEFAULT_ITEM_SCORES["web"],
+            "header": f"--- Web Search: {result['query']} ---",
+            "text": result["response"],
+        }
+        for result in search_results
+        if result["response"]
+    ]
+
+    delivered = delivered or {}
+    pages: Dict[str, Dict] = {}
+    for result in search_results:
+        for source in result.get("sources") or []:
+            pages.setdefault(source["url"], source)
+
+    references = []
+    for url, page in pages.items():
+        first_chapter = delivered.get(url)
+        if first_chapter is not None and first_chapter != chapter_id:
+            references.append(
+                f"- {page['title']} ({url}), provided for chapter {first_chapter}"
+            )
+        elif page["snippets"]:
+            items.append(
+                {
+                    "source": "web",
+                    "id": url,
+                    "url": url,
+                    "score": DEFAULT_ITEM_SCORES["web"],
+                    "header": f"--- Web Source: {page['title']} ({url}) ---",
+                    "text": "\n".join(f"> {s}" for s in page["snippets"]),
+                }
+            )
+    if references:
+        items.append(
+            {
+                "source": "web",
+                "id": "Previously provided web sources",
+                "score": DEFAULT_ITEM_SCORES["web"],
+                "header": "--- Web Sources Already Provided to Earlier Chapters ---",
+                "text": "\n".join(references),
+            }
+        )
+    return items
+
+
+def delivered_sources(
+    items: List[ContextItem], chapter_id: str, delivered: Optional[Dict[str, str]]
+) -> Dict[str, str]:
+    """URL -> first chapter, updated with the web pages among packed items"""
+    delivered = dict(delivered or {})
+    for item in items:
+        if item.get("url"):
+            delivered.setdefault(item["url"], chapter_id)
+    return delivered
+
+
+def document_items(contents: Dict[str, str]) -> List[ContextItem]:
+    """Context items for research documents (file name -> formatted content)"""
+    return [
+        {
+            "source": "documents",
+            "id": name,
+            "score": DEFAULT_ITEM_SCORES["documents"],
+            "header": "",
+            "text": content,
+        }
+        for name, content in contents.items()
+    ]
+
+
+def section_items(filename: str, sections: List[Dict]) -> List[ContextItem]:
+    """Context items for the retrieved sections of one research document"""
+    return [
+        {
+            "source": "documents",
+            "id": f"{filename} > {section['heading']}",
+            "score": section["score"],
+            "header": f"--- Research Document: {filename} ({section['heading']}) ---",
+            "text": section["text"],
+        }
+        for section in sections
+    ]
+
+
+def render_item(item: ContextItem) -> str:
+    if not item["header"]:
+        return item["text"]
+    return f"{item['header']}\n{item['text']}"
+
+
+def render_context(items: List[ContextItem]) -> str:
+    """Render packed items grouped under one heading per source"""
+    sections: Dict[str, List[str]] = {}
+    for item in items:
+        sections.setdefault(item["source"], []).append(render_item(item))
+
+    parts = []
+    for source, rendered in sections.items():
+        parts.append(f"=== {source_heading(source)} ===")
+        parts.extend(rendered)
+        parts.append("")
+    return "\n\n".join(parts).strip()
+
+
+def adaptive_cutoff(
+    scores: np.ndarray, min_keep: int = 1, relative_floor: float = 0.75
+) -> int:
+    """How many of the (descending) scores to keep
+
+    Only scores within ``relative_floor`` of the best are eligible, and the
+    list is cut at the largest gap among them when that gap stands out from
+    the typical spacing of the scores.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores) <= min_keep:
+        return len(scores)
+
+    best = scores[0]
+    floor = best * relative_floor if best > 0 else best - abs(best) * 0.25
+    eligible = max(min_keep, int(np.sum(scores >= floor)))
+    if eligible <= min_keep + 1:
+        return eligible
+
+    gaps = scores[: eligible - 1] - scores[1:eligible]
+    candidate_gaps = gaps[min_keep - 1 :] if min_keep > 0 else gaps
+    largest = int(np.argmax(candidate_gaps))
+    if candidate_gaps[largest] > 2 * np.median(gaps):
+        return largest + max(min_keep, 1)
+    return eligible
+
+
+def _minimum(source: str, min_per_source: Dict[str, int]) -> int:
+    if source in min_per_source:
+        return min_per_source[source]
+    return min_per_source.get(source.split("_")[0], 0)
+
+
+def pack_context(
+    items: List[ContextItem],
+    budget_tokens: int,
+    min_per_source: Optional[Dict[str, int]] = None,
+    model: str = "o3",
+) -> Dict:
+    """Select the items that fit the token budget
+
+    Returns:
+        Dict with the packed ``items`` (in input order), the ``dropped``
+        items with the reason for each, and ``used_tokens`` / ``budget``
+    """
+    if min_per_source is None:
+        min_per_source = DEFAULT_MIN_PER_SOURCE
+    items = [dict(item) for item in items]
+    for item in items:
+        item["tokens"] = count_tokens(render_item(item), model)
+
+    dropped = []
+    candidates = set()
+
+    # 1. Adaptive cutoff on each knowledge base's score distribution
+    by_source: Dict[str, List[int]] = {}
+    for position, item in enumerate(items):
+        by_source.setdefault(item["source"], []).append(position)
+    for source, positions in by_source.items():
+        if not source.startswith("kb_"):
+            candidates.update(positions)
+            continue
+        positions.sort(key=lambda p: -items[p]["score"])
+        keep = adaptive_cutoff(
+            np.array([items[p]["score"] for p in positions]),
+            min_keep=_minimum(source, min_per_source),
+        )
+        candidates.update(positions[:keep])
+        for p in positions[keep:]:
+            dropped.append({**items[p], "reason": "below score cutoff"})
+
+    max_item_tokens = int(budget_tokens * MAX_ITEM_SHARE)
+    selected: Dict[int, Dict] = {}
+    used = 0
+
+    def take(position: int, allow_truncation: bool) -> bool:
+        nonlocal used
+        item = items[position]
+        room = min(budget_tokens - used, max_item_tokens)
+        if item["tokens"] <= room:
+            selected[position] = item
+            used += item["tokens"]
+            return True
+        if not allow_truncation or room < MIN_TRUNCATED_TOKENS:
+            return False
+        # Leave room for the header and the truncation marker
+        header_tokens = count_tokens(item["header"], model) + 2
+        text = truncate_to_tokens(item["text"], room - header_tokens, model)
+        truncated = {**item, "text": text, "truncated": True}
+        truncated["tokens"] = count_tokens(render_item(truncated), model)
+        selected[position] = truncated
+        used += truncated["tokens"]
+        return True
+
+    # 2. Per-source minimums, best scores first
+    for source, positions in by_source.items():
+        ranked = sorted(
+            (p for p in positions if p in candidates), key=lambda p: -items[p]["score"]
+        )
+        for p in ranked[: _minimum(source, min_per_source)]:
+            take(p, allow_truncation=True)
+
+    # 3. Greedy fill by score per token
+    remaining = sorted(
+        (p for p in candidates if p not in selected),
+        key=lambda p: -items[p]["score"] / max(items[p]["tokens"], 1),
+    )
+    for p in remaining:
+        take(p, allow_truncation=False)
+
+    # 4. Spend any leftover budget on a truncated copy of the best item left
+    leftover = sorted(
+        (p for p in candidates if p not in selected), key=lambda p: -items[p]["score"]
+    )
+    if leftover:
+        take(leftover[0], allow_truncation=True)
+
+    for p in sorted(candidates):
+        if p not in selected:
+            dropped.append({**items[p], "reason": "over token budget"})
+
+    return {
+        "items": [selected[p] for p in sorted(selected)],
+        "dropped": dropped,
+        "used_tokens": used,
+        "budget": budget_tokens,
+    }
+
+
+def print_pack_report(packed: Dict):
+    """Show what was packed and exactly what was left out"""
+    truncated = sum(1 for item in packed["items"] if item.get("truncated"))
+    print(
+        f"  - Context packed: {len(packed['items'])} items, "
+        f"{packed['used_tokens']:,}/{packed['budget']:,} tokens"
+        + (f" ({truncated} truncated)" if truncated else "")
+    )
+    for item in packed["dropped"]:
+        print(
+            f"    • Dropped [{item['source']}] {item['id']} "
+            f"(score {item['score']:.3f}, {item['tokens']:,} tokens): {item['reason']}"
+        )
+
+
+def pack_report(packed: Dict) -> Dict:
+    """Compact, serialisable summary of a packing decision"""
+    return {
+        "budget": packed["budget"],
+        "used_tokens": packed["used_tokens"],
+        "packed": [
+            {"source": i["source"], "id": i["id"], "tokens": i["tokens"]}
+            for i in packed["items"]
+        ],
+        "dropped": [
+            {
+                "source": i["source"],
+                "id": i["id"],
+                "score": i["score"],
+                "tokens": i["tokens"],
+                "reason": i["reason"],
+            }
+            for i in packed["dropped"]
+        ],
+    }
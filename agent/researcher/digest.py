@@ -0,0 +1,268 @@
+"""Per-document digests of research files
+
+A digest is built once per distinct research file with a map-reduce pass:
+each header section is summarised on its own (map), then the section
+summaries are condensed into an overview of the document (reduce). Digests
+are cached as JSON under ``data/cache/digests`` keyed by a hash of the file
+content and the model, so they survive across runs until the file changes.
+Chapters then receive only the digest sections relevant to them.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from agent.state import ContextItem, TokenUsage
+from agent.researcher.bm25 import BM25Index
+from agent.researcher.context_packer import adaptive_cutoff, budget_for, count_tokens
+from agent.researcher.embedding_cache import get_cached_embeddings
+from agent.researcher.knowledge_base import chapter_search_query
+from agent.researcher.md_processor import split_sections
+from agent.researcher.researcher_prompts import (
+    DIGEST_OVERVIEW_PROMPT,
+    DIGEST_SECTION_PROMPT,
+)
+from utils.token_tracker import create_token_usage, merge_token_usage
+
+DEFAULT_DIGEST_DIR = "data/cache/digests"
+
+# Bump when the digest structure or prompts change, invalidating old digests
+DIGEST_FORMAT_VERSION = 1
+
+# Word limits of a section summary and of the document overview
+SECTION_SUMMARY_WORDS = 150
+OVERVIEW_WORDS = 250
+
+# Sections summarised concurrently
+DIGEST_CONCURRENCY = 4
+
+# Score given to the overview, so it is packed ahead of the sections
+OVERVIEW_SCORE = 1.0
+
+
+def model_name(llm) -> str:
+    return getattr(llm, "model_name", None) or getattr(llm, "model", "unknown")
+
+
+def digest_key(content: str, model: str) -> str:
+    """Cache key of a digest: content hash, model and digest format"""
+    payload = f"{DIGEST_FORMAT_VERSION}\n{model}\n{content}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def digest_path(md_file: str, key: str, cache_dir: str = DEFAULT_DIGEST_DIR) -> Path:
+    return Path(cache_dir) / f"{Path(md_file).stem}-{key[:16]}.json"
+
+
+def _usage(response) -> TokenUsage:
+    metadata = response.response_metadata.get("token_usage", {})
+    return create_token_usage(
+        metadata.get("prompt_tokens", 0), metadata.get("completion_tokens", 0)
+    )
+
+
+def build_digest(md_file: str, llm, cache_dir: str = DEFAULT_DIGEST_DIR) -> Dict:
+    """Digest of one research file, from the cache when the file is unchanged
+
+    Returns:
+        Dict with the file, its content hash, the model, the ``overview``,
+        the ``sections`` (heading, summary, original token count) and the
+        ``token_usage`` spent building it (zero when served from the cache)
+    """
+    content = Path(md_file).read_text(encoding="utf-8")
+    model = model_name(llm)
+    key = digest_key(content, model)
+    path = digest_path(md_file, key, cache_dir)
+
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            digest = json.load(f)
+        print(f"  - Digest cached: {Path(md_file).name}")
+        return {**digest, "token_usage": create_token_usage(0, 0)}
+
+    sections = split_sections(content)
+    filename = Path(md_file).name
+    print(f"  - Building digest: {filename} ({len(sections)} sections)")
+
+    # Map: summarise every section independently
+    responses = llm.batch(
+        [
+            DIGEST_SECTION_PROMPT.format(
+                filename=filename,
+                heading=section["heading"],
+                text=section["text"],
+                max_words=SECTION_SUMMARY_WORDS,
+            )
+            for section in sections
+        ],
+        config={"max_concurrency": DIGEST_CONCURRENCY},
+    )
+    usage = create_token_usage(0, 0)
+    for response in responses:
+        usage = merge_token_usage(usage, _usage(response))
+
+    digest_sections = [
+        {
+            "heading": section["heading"],
+            "summary": response.content.strip(),
+            "tokens": count_tokens(section["text"]),
+        }
+        for section, response in zip(sections, responses)
+    ]
+
+    # Reduce: condense the section summaries into one overview
+    response = llm.invoke(
+        DIGEST_OVERVIEW_PROMPT.format(
+            filename=filename,
+            summaries="\n\n".join(
+                f"## {s['heading']}\n{s['summary']}" for s in digest_sections
+            ),
+            max_words=OVERVIEW_WORDS,
+        )
+    )
+    usage = merge_token_usage(usage, _usage(response))
+
+    digest = {
+        "file": str(md_file),
+        "content_hash": key,
+        "model": model,
+        "created": datetime.now().isoformat(),
+        "overview": response.content.strip(),
+        "sections": digest_sections,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(digest, f, indent=2)
+
+    original = sum(s["tokens"] for s in digest_sections)
+    digested = count_tokens(digest["overview"]) + sum(
+        count_tokens(s["summary"]) for s in digest_sections
+    )
+    print(f"    • {original:,} -> {digested:,} tokens, saved to {path}")
+    return {**digest, "token_usage": usage}
+
+
+def _section_scores(
+    digest: Dict,
+    query: str,
+    query_vector: Optional[np.ndarray],
+    embeddings,
+    allow_embedding: bool,
+) -> np.ndarray:
+    """Relevance of each digest section: cosine to the query, else BM25"""
+    texts = [f"{s['heading']}\n{s['summary']}" for s in digest["sections"]]
+    vectors = None
+    if query_vector is not None:
+        try:
+            if allow_embedding:
+                vectors = embeddings.embed_documents(texts)
+            else:
+                cached = embeddings.cached_vectors(texts)
+                vectors = None if any(v is None for v in cached) else cached
+        except Exception as e:
+            print(f"    • Digest embedding failed, ranking lexically: {e}")
+
+    if vectors is not None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        direction = np.asarray(query_vector, dtype=np.float32)
+        return vectors @ (direction / max(float(np.linalg.norm(direction)), 1e-12))
+
+    scores = BM25Index.build(texts).scores(query)
+    return scores / scores.max() if scores.max() > 0 else scores
+
+
+def digest_items(
+    digest: Dict,
+    query: str,
+    query_vector: Optional[np.ndarray],
+    embeddings,
+    budget_tokens: int,
+    allow_embedding: bool = True,
+) -> List[ContextItem]:
+    """Overview plus the relevant digest sections, within the budget"""
+    filename = Path(digest["file"]).name
+    items: List[ContextItem] = [
+        {
+            "source": "documents",
+            "id": f"{filename} > Overview",
+            "score": OVERVIEW_SCORE,
+            "header": f"--- Research Document Digest: {filename} (Overview) ---",
+            "text": digest["overview"],
+        }
+    ]
+    if not digest["sections"]:
+        return items
+
+    scores = _section_scores(digest, query, query_vector, embeddings, allow_embedding)
+    ranked = np.argsort(-scores, kind="stable")
+    keep = ranked[: adaptive_cutoff(scores[ranked], min_keep=1)]
+
+    used = count_tokens(digest["overview"])
+    selected = []
+    for i in keep:
+        tokens = count_tokens(digest["sections"][i]["summary"])
+        if used + tokens <= budget_tokens:
+            selected.append(int(i))
+            used += tokens
+
+    for i in sorted(selected):
+        section = digest["sections"][i]
+        items.append(
+            {
+                "source": "documents",
+                "id": f"{filename} > {section['heading']}",
+                "score": float(scores[i]),
+                "header": (
+                    f"--- Research Document Digest: {filename} "
+                    f"({section['heading']}) ---"
+                ),
+                "text": section["summary"],
+            }
+        )
+    print(
+        f"    • Digest of {filename}: {len(selected)}/{len(digest['sections'])} "
+        f"sections, {used:,} tokens"
+    )
+    return items
+
+
+def chapter_digest_items(state: Dict, chapter: Dict) -> List[ContextItem]:
+    """Digest context for the chapter's research files that have a digest"""
+    digests = state.get("research_digests") or {}
+    files = [f for f in chapter.get("research_files", []) if f in digests]
+    if not files:
+        return []
+
+    query = chapter_search_query(chapter)
+    embeddings = get_cached_embeddings(
+        state.get("embedding_model", "text-embedding-3-large")
+    )
+    # Same rules as retrieval: lexical and cached modes never call the API
+    mode = state.get("kb_retrieval_mode") or "hybrid"
+    allow_embedding = mode in ("hybrid", "dense")
+    query_vector = None
+    if mode == "cached":
+        query_vector = embeddings.cached_vectors([query])[0]
+    elif allow_embedding:
+        try:
+            query_vector = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+        except Exception as e:
+            print(f"    • Query embedding failed, ranking digests lexically: {e}")
+
+    print("  - Adding research document digests...")
+    items = []
+    for md_file in files:
+        items.extend(
+            digest_items(
+                digests[md_file],
+                query,
+                query_vector,
+                embeddings,
+                budget_for(state, "documents"),
+                allow_embedding,
+            )
+        )
+    return items
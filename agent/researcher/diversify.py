@@ -0,0 +1,75 @@
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+# Results at or above this cosine similarity to a kept result are dropped
+DEFAULT_DUPLICATE_THRESHOLD = 0.93
+
+# Weight of relevance against novelty (1.0 ranks on relevance alone)
+DEFAULT_MMR_LAMBDA = 0.75
+
+# Candidates fetched per source for each result finally kept
+DIVERSITY_OVERFETCH = 2
+
+
+def mmr_select(
+    embeddings: np.ndarray,
+    relevance: np.ndarray,
+    limit: int,
+    mmr_lambda: float = DEFAULT_MMR_LAMBDA,
+    duplicate_threshold: float = DEFAULT_DUPLICATE_THRESHOLD,
+    groups: Optional[np.ndarray] = None,
+    group_limits: Optional[Dict] = None,
+) -> Tuple[np.ndarray, int]:
+    """Maximal marginal relevance selection with near-duplicate removal
+
+    Args:
+        embeddings: Candidate vectors (one row per candidate)
+        relevance: Relevance of each candidate to the query, higher is better
+        limit: Maximum number of candidates to select
+        groups: Optional group label per candidate (e.g. its source)
+        group_limits: Maximum number of selections per group label
+
+    Returns:
+        Selected candidate indices in selection order, and the number of
+        candidates dropped as near-duplicates
+    """
+    n = len(relevance)
+    if n == 0 or limit <= 0:
+        return np.empty(0, dtype=np.int64), 0
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+    similarity = vectors @ vectors.T
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    redundancy = np.zeros(n, dtype=np.float32)
+    counts: Dict = {}
+    selected = []
+    duplicates = 0
+
+    while len(selected) < limit and available.any():
+        gain = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        best = int(np.argmax(np.where(available, gain, -np.inf)))
+        selected.append(best)
+        available[best] = False
+
+        near = available & (similarity[best] >= duplicate_threshold)
+        duplicates += int(near.sum())
+        available &= ~near
+
+        redundancy = (
+            similarity[best]
+            if len(selected) == 1
+            else np.maximum(redundancy, similarity[best])
+        )
+
+        if groups is not None and group_limits:
+            group = groups[best]
+            counts[group] = counts.get(group, 0) + 1
+            if counts[group] >= group_limits.get(group, limit):
+                available &= groups != group
+
+    return np.asarray(selected, dtype=np.int64), duplicates
@@ -0,0 +1,235 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+
+DEFAULT_CACHE_PATH = "data/cache/embeddings.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024**2
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of a text for cache lookups (unicode and whitespace)"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def embedding_cache_key(model: str, dimensions: Optional[int], text: str) -> str:
+    """Content address of an embedding: model, dimensions and normalised text"""
+    payload = f"{model}\x1f{dimensions or 0}\x1f{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent embedding cache stored as float32 blobs in SQLite
+
+    Entries are evicted least-recently-used first once the stored vectors
+    exceed ``max_bytes``. The database is shared across runs and processes.
+    """
+
+    def __init__(
+        self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)"
+        )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(nbytes), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Look up vectors by key; missing keys are absent from the result"""
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start : start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                        [now, *batch],
+                    )
+            self._conn.commit()
+
+            unique_keys = set(keys)
+            self.hits += len(found)
+            self.misses += len(unique_keys) - len(found)
+        return found
+
+    def put_many(
+        self, model: str, dimensions: Optional[int], vectors: Dict[str, np.ndarray]
+    ):
+        """Store vectors and evict the least recently used ones if over budget"""
+        if not vectors:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in vectors.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, model, dimensions or 0, blob, len(blob), now))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            # Writes only happen on misses, so recounting the size is cheap enough
+            self._total_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(nbytes), 0) FROM embeddings"
+            ).fetchone()[0]
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits max_bytes"""
+        while self._total_bytes > self.max_bytes:
+            oldest = self._conn.execute(
+                "SELECT key, nbytes FROM embeddings ORDER BY last_used LIMIT ?",
+                (_SQL_BATCH,),
+            ).fetchall()
+            if not oldest:
+                self._total_bytes = 0
+                break
+
+            evict, freed = [], 0
+            for key, nbytes in oldest:
+                evict.append(key)
+                freed += nbytes
+                if self._total_bytes - freed <= self.max_bytes:
+                    break
+
+            self._conn.execute(
+                f"DELETE FROM embeddings WHERE key IN ({','.join('?' * len(evict))})",
+                evict,
+            )
+            self._total_bytes -= freed
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            (entries,) = self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": self._total_bytes,
+            }
+
+    def print_stats(self):
+        """Pretty print cache effectiveness"""
+        stats = self.stats()
+        print("\n🧮 Embedding Cache:")
+        print(
+            f"  - Hits: {stats['hits']:,}, misses: {stats['misses']:,} "
+            f"(hit rate {stats['hit_rate']:.0%})"
+        )
+        print(
+            f"  - Stored: {stats['entries']:,} vectors, "
+            f"{stats['bytes'] / 1024 ** 2:,.1f} MB"
+        )
+
+
+class CachedEmbeddings:
+    """Embeddings client that serves repeated texts from the EmbeddingCache
+
+    Exposes the same embed_query / embed_documents interface as
+    OpenAIEmbeddings; only texts missing from the cache reach the API, in a
+    single embed_documents call.
+    """
+
+    def __init__(self, embeddings: OpenAIEmbeddings, model: str, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.model = model
+        self.dimensions = getattr(embeddings, "dimensions", None)
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_cache_key(self.model, self.dimensions, t) for t in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Embed each missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        if missing:
+            fresh = self.embeddings.embed_documents(list(missing.values()))
+            fresh_vectors = {
+                key: np.asarray(vector, dtype=np.float32)
+                for key, vector in zip(missing, fresh)
+            }
+            self.cache.put_many(self.model, self.dimensions, fresh_vectors)
+            vectors.update(fresh_vectors)
+
+        return [vectors[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def cached_vectors(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Vectors already in the cache (None for misses), without any API call"""
+        keys = [embedding_cache_key(self.model, self.dimensions, t) for t in texts]
+        vectors = self.cache.get_many(keys)
+        return [vectors.get(key) for key in keys]
+
+
+_cache: Optional[EmbeddingCache] = None
+_clients: Dict[str, CachedEmbeddings] = {}
+_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide embedding cache"""
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+def get_cached_embeddings(model: str = "text-embedding-3-large") -> CachedEmbeddings:
+    """Return the shared, cache-backed embeddings client for a model"""
+    cache = get_embedding_cache()
+    with _lock:
+        if model not in _clients:
+            _clients[model] = CachedEmbeddings(
+                OpenAIEmbeddings(model=model), model, cache
+            )
+        return _clients[model]
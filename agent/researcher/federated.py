@@ -0,0 +1,386 @@
+import copy
+import hashlib
+import heapq
+from typing import Dict, List, Optional
+import numpy as np
+from agent.researcher.kb_registry import get_knowledge_base
+from agent.researcher.knowledge_base import (
+    DEFAULT_TOP_K,
+    RETRIEVAL_UNITS,
+    KnowledgeBaseQuerier,
+)
+from agent.researcher.embedding_cache import get_cached_embeddings
+from agent.researcher.diversify import (
+    DEFAULT_DUPLICATE_THRESHOLD,
+    DEFAULT_MMR_LAMBDA,
+    DIVERSITY_OVERFETCH,
+    mmr_select,
+)
+from agent.researcher.semantic_cache import DEFAULT_MAX_DISTANCE, get_semantic_cache
+from agent.researcher.web_kb import DEFAULT_WEB_KB_PATH, WEB_KB_SOURCE
+from agent.researcher.kb_segments import is_segmented_kb
+
+DEFAULT_PRIMARY_KB = "data/knowledge_base/df_with_embeddings_large.parquet"
+DEFAULT_IFRS_KB = "data/knowledge_base/ifrs_knowledge_base_with_embeddings.parquet"
+
+# hybrid: dense + BM25 fused with RRF; dense: embeddings only; lexical: BM25
+# only, no embedding call; cached: hybrid when the query embedding is already
+# cached, lexical otherwise (never calls the embedding API)
+RETRIEVAL_MODES = ("hybrid", "dense", "lexical", "cached")
+
+
+def knowledge_base_sources(state: Dict) -> Dict[str, str]:
+    """Knowledge bases declared in state, as source name -> path
+
+    ``knowledge_base_path`` and ``knowledge_base_additional_path`` become the
+    "primary" and "ifrs" sources, and the web shard (once it exists) the
+    "web" source; ``knowledge_base_sources`` adds (or overrides) any number
+    of further ones.
+    """
+    sources = {
+        "primary": state.get("knowledge_base_path") or DEFAULT_PRIMARY_KB,
+        "ifrs": state.get("knowledge_base_additional_path") or DEFAULT_IFRS_KB,
+    }
+    web_kb_path = state.get("web_kb_path") or DEFAULT_WEB_KB_PATH
+    if state.get("web_kb", True) and is_segmented_kb(web_kb_path):
+        sources[WEB_KB_SOURCE] = web_kb_path
+    sources.update(state.get("knowledge_base_sources") or {})
+    return sources
+
+
+class FederatedKnowledgeBase:
+    """Search several knowledge bases as one index
+
+    The query is embedded once and scored against every shard, and the
+    per-shard rankings are merged into a single list tagged with the source
+    of each result. ``quotas`` caps how many results each source contributes.
+    If embedding fails, the BM25 indexes answer the query instead.
+
+    The merged list is diversified with MMR over the KB embeddings, dropping
+    results whose cosine similarity to an already kept one reaches
+    ``duplicate_threshold`` (EBA/ECB texts often paraphrase each other).
+
+    With ``retrieval_unit="sentence"``, knowledge bases compiled with
+    sentence embeddings match single sentences and return the windows
+    around them instead of whole chunks.
+
+    With ``semantic_cache_distance`` set, the candidates of a query are
+    cached per source under its embedding. A later query within that cosine
+    distance of cached ones (e.g. a sibling chapter) re-ranks their merged
+    candidates locally instead of searching the knowledge base again.
+    Entries are dropped when the knowledge base version changes.
+
+    With ``lexical_prefilter`` set, hybrid searches only score the rows among
+    that many BM25 candidates of the query (0 scores every row).
+    """
+
+    def __init__(
+        self,
+        sources: Dict[str, str],
+        embedding_model: str = "text-embedding-3-large",
+        quotas: Optional[Dict[str, int]] = None,
+        retrieval_mode: str = "hybrid",
+        mmr_lambda: float = DEFAULT_MMR_LAMBDA,
+        duplicate_threshold: float = DEFAULT_DUPLICATE_THRESHOLD,
+        retrieval_unit: str = "chunk",
+        semantic_cache_distance: Optional[float] = None,
+        lexical_prefilter: int = 0,
+    ):
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(
+                f"Unknown retrieval mode '{retrieval_mode}', "
+                f"expected one of {RETRIEVAL_MODES}"
+            )
+        if retrieval_unit not in RETRIEVAL_UNITS:
+            raise ValueError(
+                f"Unknown retrieval unit '{retrieval_unit}', "
+                f"expected one of {RETRIEVAL_UNITS}"
+            )
+        self.embedding_model = get_cached_embeddings(embedding_model)
+        self.quotas = quotas or {}
+        self.retrieval_mode = retrieval_mode
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.retrieval_unit = retrieval_unit
+        self.semantic_cache_distance = semantic_cache_distance
+        self.lexical_prefilter = lexical_prefilter
+        self.queriers: Dict[str, KnowledgeBaseQuerier] = {}
+
+        for name, kb_path in sources.items():
+            querier = get_knowledge_base(
+                kb_path, embedding_model, lexical_prefilter=lexical_prefilter
+            )
+            if querier.is_loaded:
+                self.queriers[name] = querier
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "FederatedKnowledgeBase":
+        """Build the federated index configured in the graph state"""
+        return cls(
+            knowledge_base_sources(state),
+            state.get("embedding_model", "text-embedding-3-large"),
+            state.get("knowledge_base_quotas"),
+            state.get("kb_retrieval_mode") or "hybrid",
+            state.get("kb_mmr_lambda", DEFAULT_MMR_LAMBDA),
+            state.get("kb_duplicate_threshold", DEFAULT_DUPLICATE_THRESHOLD),
+            state.get("kb_retrieval_unit") or "chunk",
+            (
+                state.get("semantic_cache_distance", DEFAULT_MAX_DISTANCE)
+                if state.get("semantic_cache", True)
+                else None
+            ),
+            state.get("kb_lexical_prefilter") or 0,
+        )
+
+    def subset(self, names: List[str]) -> "FederatedKnowledgeBase":
+        """The same index restricted to the named (loaded) sources"""
+        subset = copy.copy(self)
+        subset.queriers = {
+            name: querier for name, querier in self.queriers.items() if name in names
+        }
+        return subset
+
+    def search(
+        self,
+        query: str,
+        chapter: Optional[Dict] = None,
+        top_k: int = DEFAULT_TOP_K,
+        min_score: Optional[float] = None,
+    ) -> List[Dict]:
+        """Ranked results across all sources for one query"""
+        return self.search_batch([query], [chapter], top_k, min_score)[0]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        chapters: Optional[List[Optional[Dict]]] = None,
+        top_k: int = DEFAULT_TOP_K,
+        min_score: Optional[float] = None,
+    ) -> List[List[Dict]]:
+        """Ranked results across all sources for many queries at once
+
+        Args:
+            queries: Query texts, embedded in a single call
+            chapters: Per-query chapter used to route metadata filters
+            top_k: Results per source unless overridden by a quota
+            min_score: Optional cosine similarity floor; by default every
+                candidate is returned and the context packer decides the cutoff
+        """
+        if not queries or not self.queriers:
+            return [[] for _ in queries]
+        chapters = chapters or [None] * len(queries)
+
+        print(
+            f"  - Searching {len(self.queriers)} knowledge bases "
+            f"({', '.join(self.queriers)}) for {len(queries)} queries "
+            f"[{self.retrieval_mode}, {self.retrieval_unit}]"
+        )
+        vectors = self.embed_queries(queries)
+        embedded = [i for i, vector in enumerate(vectors) if vector is not None]
+        lexical = [i for i, vector in enumerate(vectors) if vector is None]
+        hybrid = self.retrieval_mode != "dense"
+        quotas = {name: self.quotas.get(name, top_k) for name in self.queriers}
+        overfetch = DIVERSITY_OVERFETCH if self.diversifies else 1
+
+        per_source = {}
+        for name, querier in self.queriers.items():
+            quota = quotas[name] * overfetch
+            row_filters = [querier.route_filters(chapter) for chapter in chapters]
+            results: List[List[Dict]] = [[] for _ in queries]
+
+            pending = embedded
+            if self.uses_semantic_cache and embedded:
+                namespaces = {
+                    i: self._cache_namespace(name, quota, row_filters[i], min_score)
+                    for i in embedded
+                }
+                pending = []
+                for i in embedded:
+                    cached = get_semantic_cache().lookup(
+                        namespaces[i],
+                        vectors[i],
+                        querier.kb_version,
+                        self.semantic_cache_distance,
+                    )
+                    if not cached:
+                        pending.append(i)
+                        continue
+                    results[i] = querier.rerank_rows(
+                        np.array([r["row"] for hits in cached for r in hits]),
+                        vectors[i],
+                        quota,
+                        query_text=queries[i] if hybrid else None,
+                        min_score=min_score,
+                    )
+                if len(pending) < len(embedded):
+                    print(
+                        f"    • {name}: {len(embedded) - len(pending)} queries "
+                        "served from the semantic cache"
+                    )
+
+            if pending:
+                dense = querier.search_by_vectors(
+                    np.array([vectors[i] for i in pending]),
+                    quota,
+                    [row_filters[i] for i in pending],
+                    min_score=min_score,
+                    query_texts=[queries[i] for i in pending] if hybrid else None,
+                    units=self.retrieval_unit,
+                )
+                for i, query_results in zip(pending, dense):
+                    results[i] = query_results
+                    if self.uses_semantic_cache:
+                        get_semantic_cache().put(
+                            namespaces[i], vectors[i], query_results, querier.kb_version
+                        )
+            if lexical:
+                lexical_results = querier.lexical_search_batch(
+                    [queries[i] for i in lexical],
+                    quota,
+                    [row_filters[i] for i in lexical],
+                )
+                for i, query_results in zip(lexical, lexical_results):
+                    results[i] = query_results
+            per_source[name] = results
+
+        return [
+            self.merge_rankings(
+                {name: results[i] for name, results in per_source.items()}, top_k
+            )
+            for i in range(len(queries))
+        ]
+
+    def merge_rankings(
+        self, results_by_source: Dict[str, List[Dict]], top_k: int = DEFAULT_TOP_K
+    ) -> List[Dict]:
+        """Merge per-source rankings of one query into a diversified ranking
+
+        Applies the same near-duplicate removal, MMR re-ranking and per-source
+        quotas (``top_k`` unless overridden) as ``search``.
+        """
+        merged = self._merge(results_by_source)
+        if not self.diversifies:
+            return merged
+        quotas = {name: self.quotas.get(name, top_k) for name in results_by_source}
+        return self._diversify(merged, quotas)
+
+    @property
+    def uses_semantic_cache(self) -> bool:
+        """Sentence windows depend on the query, so only chunks are cached"""
+        return self.semantic_cache_distance is not None and (
+            self.retrieval_unit == "chunk"
+        )
+
+    def _cache_namespace(
+        self,
+        name: str,
+        quota: int,
+        rows: Optional[np.ndarray],
+        min_score: Optional[float],
+    ) -> tuple:
+        """Semantic cache namespace: everything but the query that shapes results"""
+        filters = "all" if rows is None else hashlib.sha1(rows.tobytes()).hexdigest()
+        return (
+            "kb",
+            str(self.queriers[name].kb_path),
+            self.retrieval_mode,
+            quota,
+            filters,
+            min_score,
+            self.lexical_prefilter,
+        )
+
+    @property
+    def diversifies(self) -> bool:
+        return self.mmr_lambda < 1.0 or self.duplicate_threshold < 1.0
+
+    def _diversify(self, results: List[Dict], quotas: Dict[str, int]) -> List[Dict]:
+        """Drop near-duplicates and re-rank with MMR, keeping per-source quotas"""
+        if len(results) < 2:
+            return results
+
+        # Vectors come from the KB matrices already in memory, per source
+        vectors = [None] * len(results)
+        for name, querier in self.queriers.items():
+            positions = [i for i, r in enumerate(results) if r["source"] == name]
+            if not positions:
+                continue
+            rows = np.array([results[i]["row"] for i in positions])
+            for i, vector in zip(positions, np.asarray(querier.embeddings[rows])):
+                vectors[i] = vector
+        if len({len(vector) for vector in vectors}) > 1:
+            return results  # Sources embedded with different dimensions
+
+        key = self._ranking_key(results)
+        relevance = np.array([result[key] for result in results], dtype=np.float32)
+        relevance /= max(float(relevance.max()), 1e-9)
+
+        selected, duplicates = mmr_select(
+            np.vstack(vectors),
+            relevance,
+            limit=sum(quotas.values()),
+            mmr_lambda=self.mmr_lambda,
+            duplicate_threshold=self.duplicate_threshold,
+            groups=np.array([result["source"] for result in results]),
+            group_limits=quotas,
+        )
+        if duplicates:
+            print(f"    • Removed {duplicates} near-duplicate entries")
+        return [results[i] for i in selected]
+
+    def embed_queries(self, queries: List[str]) -> List[Optional[np.ndarray]]:
+        """Query vectors per the retrieval mode; None means search lexically"""
+        if self.retrieval_mode == "lexical":
+            return [None] * len(queries)
+        if self.retrieval_mode == "cached":
+            vectors = self.embedding_model.cached_vectors(queries)
+            misses = sum(vector is None for vector in vectors)
+            if misses:
+                print(f"    • {misses} queries not cached, searching them lexically")
+            return vectors
+
+        try:
+            return list(np.array(self.embedding_model.embed_documents(queries)))
+        except Exception as e:
+            print(f"    • Embedding failed, falling back to lexical search: {e}")
+            return [None] * len(queries)
+
+    @staticmethod
+    def _merge(results_by_source: Dict[str, List[Dict]]) -> List[Dict]:
+        """Merge per-source rankings into one list
+
+        Rankings are merged on their fused (rank-based) score when every
+        source produced one, otherwise on cosine similarity. Each ranking is
+        sorted on that key first, as hybrid ones are ordered by fused score.
+        """
+        tagged = [
+            [{**result, "source": name} for result in results]
+            for name, results in results_by_source.items()
+        ]
+        key = FederatedKnowledgeBase._ranking_key(
+            [result for results in tagged for result in results]
+        )
+        ranked = [
+            sorted(results, key=lambda result: -result[key]) for results in tagged
+        ]
+        return list(heapq.merge(*ranked, key=lambda result: -result[key]))
+
+    @staticmethod
+    def _ranking_key(results: List[Dict]) -> str:
+        """Fused (rank-based) score if every result has one, else cosine"""
+        return (
+            "fused_score"
+            if all("fused_score" in result for result in results)
+            else "score"
+        )
+
+    def format_results(self, results: List[Dict]) -> Dict[str, str]:
+        """Format merged results per source, keeping the ranking within each"""
+        by_source: Dict[str, List[Dict]] = {}
+        for result in results:
+            by_source.setdefault(result["source"], []).append(result)
+
+        return {
+            name: self.queriers[name].format_results(source_results)
+            for name, source_results in by_source.items()
+        }
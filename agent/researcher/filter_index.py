@@ -0,0 +1,131 @@
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+
+CATEGORY_COLUMNS = ("Category_1", "Category_2")
+SOURCE_COLUMN = "source_file"
+
+# Placeholder values filled in for missing metadata never drive routing
+UNROUTABLE_VALUES = {"general", ""}
+
+# Words a keyword and a category must share when neither equals the other
+MIN_ROUTING_OVERLAP = 2
+
+
+def _terms(text: str) -> set:
+    """Lower-cased word set used to match keywords against metadata values"""
+    return set(re.findall(r"[a-z0-9]+", str(text).lower()))
+
+
+def _source_key(name: str) -> str:
+    """Compare sources by lower-cased file stem, ignoring folders and suffix"""
+    return Path(str(name)).stem.lower()
+
+
+class MetadataFilterIndex:
+    """Inverted index from category and source values to sorted row ids
+
+    Built once when a knowledge base is loaded, so metadata filters become a
+    handful of array unions/intersections instead of per-row Python checks.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.n_rows = len(df)
+        self._postings: Dict[str, Dict[str, np.ndarray]] = {}
+
+        for column in CATEGORY_COLUMNS + (SOURCE_COLUMN,):
+            if column in df.columns:
+                self._postings[column] = self._build_postings(df[column])
+
+    @staticmethod
+    def _build_postings(values: pd.Series) -> Dict[str, np.ndarray]:
+        codes, uniques = pd.factorize(values.astype(str))
+        order = np.argsort(codes, kind="stable").astype(np.int64)
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        return {
+            value: order[bounds[i] : bounds[i + 1]] for i, value in enumerate(uniques)
+        }
+
+    def values(self, column: str) -> List[str]:
+        """Distinct values of an indexed column"""
+        return list(self._postings.get(column, {}))
+
+    def rows_for(self, column: str, values: Iterable[str]) -> np.ndarray:
+        """Sorted row ids whose column matches any of the values"""
+        postings = self._postings.get(column, {})
+        arrays = [postings[v] for v in values if v in postings]
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(arrays))
+
+    def select(
+        self,
+        categories: Optional[Iterable[str]] = None,
+        sources: Optional[Iterable[str]] = None,
+    ) -> Optional[np.ndarray]:
+        """Row ids matching the filters, or None when no filter is given
+
+        Categories match either category column; categories and sources are
+        combined with AND.
+        """
+        selected = None
+
+        if categories:
+            categories = list(categories)
+            selected = np.unique(
+                np.concatenate(
+                    [self.rows_for(column, categories) for column in CATEGORY_COLUMNS]
+                )
+            )
+
+        if sources:
+            source_rows = self.rows_for(SOURCE_COLUMN, sources)
+            selected = (
+                source_rows
+                if selected is None
+                else np.intersect1d(selected, source_rows, assume_unique=True)
+            )
+
+        return selected
+
+    def route(
+        self, keywords: Iterable[str], internal_files: Iterable[str] = ()
+    ) -> Dict[str, List[str]]:
+        """Pick category and source filters for a chapter
+
+        A keyword selects a category when both have the same words (e.g.
+        "ECL" -> "ECL"), or when all words of one are contained in the other
+        and they share at least ``MIN_ROUTING_OVERLAP`` words (e.g. "IFRS 9
+        staging" -> "IFRS 9"). A single generic word such as "risk" thus
+        does not select every category containing it, since the filter
+        drops all other rows. Internal files select sources with the same
+        file stem.
+        """
+        keyword_terms = [t for t in (_terms(k) for k in keywords) if t]
+
+        categories = []
+        for column in CATEGORY_COLUMNS:
+            for value in self.values(column):
+                if value.strip().lower() in UNROUTABLE_VALUES:
+                    continue
+                value_terms = _terms(value)
+                if value_terms and any(
+                    terms == value_terms
+                    or (
+                        (terms <= value_terms or value_terms <= terms)
+                        and len(terms & value_terms) >= MIN_ROUTING_OVERLAP
+                    )
+                    for terms in keyword_terms
+                ):
+                    categories.append(value)
+
+        wanted_sources = {_source_key(f) for f in internal_files}
+        sources = [
+            value
+            for value in self.values(SOURCE_COLUMN)
+            if _source_key(value) in wanted_sources
+        ]
+
+        return {"categories": sorted(set(categories)), "sources": sources}
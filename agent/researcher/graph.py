@@ -2,23 +2,39 @@ from langgraph.graph import StateGraph, END
 from agent.state import ResearcherState
 from agent.researcher.nodes.prepare import prepare_node
 from agent.researcher.nodes.search_all import search_all_node
+from agent.researcher.nodes.promote_web import promote_web_node
+from agent.researcher.nodes.compress_context import compress_context_node
 from agent.researcher.nodes.format_research import format_research_node
+from agent.researcher.nodes.delta_research import delta_research_node, route_research
 
 
 def create_researcher_graph():
-    """Simple 3-node researcher graph"""
+    """Simple researcher graph
+
+    First passes search every source, promote the cited web pages into the
+    web knowledge base, then compress and format the results;
+    rewrites after a rejected review only add context for the feedback.
+    """
 
     workflow = StateGraph(ResearcherState)
 
-    # Add our 3 nodes
+    # Add our nodes
     workflow.add_node("prepare", prepare_node)
     workflow.add_node("search_all", search_all_node)
+    workflow.add_node("promote_web", promote_web_node)
+    workflow.add_node("compress_context", compress_context_node)
     workflow.add_node("format_research", format_research_node)
+    workflow.add_node("delta_research", delta_research_node)
 
     # Simple linear flow
     workflow.set_entry_point("prepare")
-    workflow.add_edge("prepare", "search_all")
-    workflow.add_edge("search_all", "format_research")
+    workflow.add_conditional_edges(
+        "prepare", route_research, {"full": "search_all", "delta": "delta_research"}
+    )
+    workflow.add_edge("search_all", "promote_web")
+    workflow.add_edge("promote_web", "compress_context")
+    workflow.add_edge("compress_context", "format_research")
     workflow.add_edge("format_research", END)
+    workflow.add_edge("delta_research", END)
 
     return workflow.compile()
@@ -0,0 +1,187 @@
+"""Retrieval benchmarks on synthetic (or compiled) knowledge bases
+
+Measures recall@10 against exact search and per-query latency as the
+knowledge base grows, and the memory/latency of the compact storage tiers::
+
+    python -m agent.researcher.kb_benchmark --sizes 10000 100000 --dim 256
+    python -m agent.researcher.kb_benchmark --report tiers --dim 3072
+    python -m agent.researcher.kb_benchmark --report tiers --kb <kb.parquet>
+"""
+
+import argparse
+import time
+from typing import Callable, Dict, List
+import numpy as np
+from agent.researcher.ann_index import IVFIndex
+from agent.researcher.kb_compiler import EMBEDDINGS_FILE, compiled_dir
+from agent.researcher.knowledge_base import top_k_indices
+from agent.researcher.quantization import (
+    DEFAULT_RESCORE_CANDIDATES,
+    TIERS,
+    CompactTier,
+)
+
+TOP_K = 10
+
+
+def synthetic_embeddings(
+    n_rows: int, dim: int, n_topics: int = 200, seed: int = 0
+) -> np.ndarray:
+    """Clustered unit vectors, closer to real document embeddings than noise"""
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(n_topics, dim)).astype(np.float32)
+    labels = rng.integers(0, n_topics, n_rows)
+    vectors = topics[labels] + 0.6 * rng.normal(size=(n_rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_queries(embeddings: np.ndarray, n_queries: int, seed: int = 1):
+    """Perturbed copies of random rows"""
+    rng = np.random.default_rng(seed)
+    picks = embeddings[rng.integers(0, len(embeddings), n_queries)]
+    queries = picks + 0.3 * rng.normal(size=picks.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def recall_at_k(truth: List[np.ndarray], found: List[np.ndarray]) -> float:
+    hits = sum(len(np.intersect1d(t, f)) for t, f in zip(truth, found))
+    return hits / sum(len(t) for t in truth)
+
+
+def time_per_query(search: Callable, queries: np.ndarray) -> tuple:
+    """Run one query at a time (as the researcher does) and time it"""
+    start = time.perf_counter()
+    found = [search(query) for query in queries]
+    elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    return found, elapsed_ms
+
+
+def benchmark_ann(
+    sizes: List[int], dim: int, n_queries: int, nprobes: List[int]
+) -> List[Dict]:
+    """Compare exact search with the IVF index at several nprobe settings"""
+    rows = []
+    for n_rows in sizes:
+        embeddings = synthetic_embeddings(n_rows, dim)
+        queries = synthetic_queries(embeddings, n_queries)
+
+        truth, exact_ms = time_per_query(
+            lambda q: top_k_indices(embeddings @ q, TOP_K), queries
+        )
+        rows.append({"rows": n_rows, "method": "exact", "recall": 1.0, "ms": exact_ms})
+
+        start = time.perf_counter()
+        index = IVFIndex.build(embeddings)
+        build_s = time.perf_counter() - start
+
+        for nprobe in nprobes:
+
+            def ann_search(query, nprobe=nprobe):
+                candidates = index.candidates(query[None, :], nprobe)[0]
+                scores = embeddings[candidates] @ query
+                return candidates[top_k_indices(scores, TOP_K)]
+
+            found, ann_ms = time_per_query(ann_search, queries)
+            rows.append(
+                {
+                    "rows": n_rows,
+                    "method": f"ivf lists={index.n_lists} nprobe={nprobe}",
+                    "recall": recall_at_k(truth, found),
+                    "ms": ann_ms,
+                    "build_s": build_s,
+                }
+            )
+    return rows
+
+
+def benchmark_tiers(
+    embeddings: np.ndarray,
+    queries: np.ndarray,
+    rescore_candidates: int = DEFAULT_RESCORE_CANDIDATES,
+) -> List[Dict]:
+    """Compare float32 exact search with each compact tier plus rescoring"""
+    n_rows, dim = embeddings.shape
+    full_bytes = embeddings.nbytes
+
+    truth, exact_ms = time_per_query(
+        lambda q: top_k_indices(embeddings @ q, TOP_K), queries
+    )
+    rows = [
+        {
+            "rows": n_rows,
+            "method": "float32 (exact)",
+            "recall": 1.0,
+            "ms": exact_ms,
+            "mb": full_bytes / 1024**2,
+        }
+    ]
+
+    for name in TIERS:
+        if name.startswith("trunc") and int(name[len("trunc") :]) >= dim:
+            continue
+        tier = CompactTier.build(name, embeddings)
+
+        def tiered_search(query, tier=tier):
+            approx = tier.score(query[None, :])[0]
+            candidates = top_k_indices(approx, rescore_candidates)
+            exact = embeddings[candidates] @ query
+            return candidates[top_k_indices(exact, TOP_K)]
+
+        found, tier_ms = time_per_query(tiered_search, queries)
+        rows.append(
+            {
+                "rows": n_rows,
+                "method": f"{name} + rescore {rescore_candidates}",
+                "recall": recall_at_k(truth, found),
+                "ms": tier_ms,
+                "mb": tier.nbytes / 1024**2,
+            }
+        )
+    return rows
+
+
+def print_table(rows: List[Dict], title: str):
+    print(f"\n📈 {title}")
+    print(
+        f"  {'rows':>10}  {'method':<34} {'recall@10':>9} {'ms/query':>9}"
+        f" {'resident MB':>12}"
+    )
+    for row in rows:
+        resident = f"{row['mb']:>12,.1f}" if "mb" in row else f"{'':>12}"
+        print(
+            f"  {row['rows']:>10,}  {row['method']:<34} "
+            f"{row['recall']:>9.3f} {row['ms']:>9.2f} {resident}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark knowledge base search")
+    parser.add_argument("--report", choices=["ann", "tiers"], default="ann")
+    parser.add_argument(
+        "--kb", default=None, help="Compiled KB to use for the tiers report"
+    )
+    parser.add_argument("--rescore", type=int, default=DEFAULT_RESCORE_CANDIDATES)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 50_000, 200_000]
+    )
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    args = parser.parse_args()
+
+    if args.report == "ann":
+        rows = benchmark_ann(args.sizes, args.dim, args.queries, args.nprobe)
+        print_table(rows, "ANN (IVF) vs exact search")
+        return
+
+    if args.kb:
+        embeddings = np.load(compiled_dir(args.kb) / EMBEDDINGS_FILE)
+    else:
+        embeddings = synthetic_embeddings(args.sizes[0], args.dim)
+    queries = synthetic_queries(embeddings, args.queries)
+    rows = benchmark_tiers(embeddings, queries, args.rescore)
+    print_table(rows, "Compact tiers with exact rescoring vs float32")
+
+
+if __name__ == "__main__":
+    main()
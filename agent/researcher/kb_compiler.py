@@ -0,0 +1,411 @@
+"""Compiled knowledge base format
+
+A compiled knowledge base lives next to its source parquet file in a
+``<stem>.kb/`` directory:
+
+- ``embeddings.npy``: contiguous, L2-normalised float32 matrix that is opened
+  with ``np.load(mmap_mode="r")`` so several processes share the page cache
+- ``rows.parquet``: the row metadata (id, categories, text) in matrix order
+- ``texts.bin`` / ``text_offsets.npy``: the chunk texts as one UTF-8 blob
+  with byte offsets, so queriers can leave texts on disk until a row is hit
+- ``bm25_index.npz``: BM25 inverted index over the chunk texts
+- ``manifest.json``: shape, dtype, embedding model and the fingerprint of the
+  source parquet the sidecar was built from
+- ``ivf_index.npz`` (optional, ``--ann``): IVF index for approximate search
+- ``tier_<name>_*.npy`` (optional, ``--tier``): compact first-pass codes
+- ``sentence_*.npy`` (optional, ``--sentences``): sentence spans,
+  embeddings and neighbour windows per chunk, used for sentence-window
+  retrieval and to compress retrieved context
+
+Build it with::
+
+    python -m agent.researcher.kb_compiler [kb.parquet ...]
+"""
+
+import argparse
+import json
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from agent.researcher.ann_index import IVFIndex, ann_index_path
+from agent.researcher.bm25 import BM25Index, bm25_index_path
+from agent.researcher.embedding_cache import get_cached_embeddings
+from agent.researcher.quantization import TIERS, CompactTier
+from agent.researcher.sentence_index import (
+    DEFAULT_SENTENCE_DIMS,
+    DEFAULT_WINDOW,
+    SentenceIndex,
+    write_sentence_index,
+)
+from agent.researcher.text_store import text_store_exists, write_text_store
+
+FORMAT_VERSION = 1
+EMBEDDINGS_FILE = "embeddings.npy"
+ROWS_FILE = "rows.parquet"
+MANIFEST_FILE = "manifest.json"
+
+DEFAULT_KB_PATHS = [
+    "data/knowledge_base/df_with_embeddings_large.parquet",
+    "data/knowledge_base/ifrs_knowledge_base_with_embeddings.parquet",
+]
+
+REQUIRED_COLUMNS = {"combined_text", "embedding"}
+OPTIONAL_COLUMNS = {"id", "Category_1", "Category_2", "source_file"}
+
+# Rows converted per step when writing the matrix, bounds peak memory
+WRITE_BATCH_ROWS = 4096
+
+
+def compiled_dir(kb_path) -> Path:
+    """Directory holding the compiled sidecar of a knowledge base"""
+    kb_path = Path(kb_path)
+    return kb_path.parent / f"{kb_path.stem}.kb"
+
+
+def source_fingerprint(kb_path) -> Dict:
+    """mtime and size of the source parquet, used to detect stale sidecars"""
+    stat = Path(kb_path).stat()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def normalize_kb_frame(df: pd.DataFrame, source_name: str = "General") -> pd.DataFrame:
+    """Keep the columns the querier uses and fill in missing metadata"""
+    available_cols = set(df.columns)
+    if not REQUIRED_COLUMNS.issubset(available_cols):
+        raise ValueError(f"DataFrame must contain at least: {REQUIRED_COLUMNS}")
+
+    cols_to_use = list(
+        REQUIRED_COLUMNS.union(available_cols.intersection(OPTIONAL_COLUMNS))
+    )
+    return fill_kb_metadata(df[cols_to_use].copy(), source_name)
+
+
+def fill_kb_metadata(df: pd.DataFrame, source_name: str = "General") -> pd.DataFrame:
+    """Add missing metadata columns with defaults"""
+    if "id" not in df.columns:
+        df["id"] = [f"doc_{i}" for i in range(len(df))]
+    if "Category_1" not in df.columns:
+        df["Category_1"] = "General"
+    if "Category_2" not in df.columns:
+        df["Category_2"] = "General"
+    # Rows without a source file belong to the knowledge base file itself
+    if "source_file" not in df.columns:
+        df["source_file"] = source_name
+    return df
+
+
+def read_manifest(kb_path) -> Optional[Dict]:
+    """Return the sidecar manifest, or None when there is no sidecar"""
+    manifest_path = compiled_dir(kb_path) / MANIFEST_FILE
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def is_compiled_current(kb_path) -> bool:
+    """Whether a sidecar exists and matches the source parquet (if present)"""
+    manifest = read_manifest(kb_path)
+    if manifest is None or manifest.get("format_version") != FORMAT_VERSION:
+        return False
+    # A sidecar shipped without its parquet is used as-is
+    if not Path(kb_path).exists():
+        return True
+    source = manifest.get("source", {})
+    return {
+        "mtime_ns": source.get("mtime_ns"),
+        "size": source.get("size"),
+    } == source_fingerprint(kb_path)
+
+
+def load_compiled(
+    kb_path, lazy_text: bool = False
+) -> Optional[Tuple[pd.DataFrame, np.ndarray, Dict]]:
+    """Open a current sidecar: row metadata, memory-mapped matrix and manifest
+
+    With ``lazy_text`` the ``combined_text`` column is not loaded; texts are
+    read from the sidecar's text store instead (see ``TextStore``).
+    """
+    if not is_compiled_current(kb_path):
+        return None
+
+    kb_dir = compiled_dir(kb_path)
+    manifest = read_manifest(kb_path)
+    embeddings = np.load(kb_dir / EMBEDDINGS_FILE, mmap_mode="r")
+
+    df = read_rows(kb_dir / ROWS_FILE, Path(kb_path).name, lazy_text)
+
+    if embeddings.shape != (manifest["rows"], manifest["dim"]) or len(df) != len(
+        embeddings
+    ):
+        raise ValueError(f"Compiled knowledge base is inconsistent: {kb_dir}")
+
+    return df, embeddings, manifest
+
+
+def read_rows(rows_path, source_name: str, lazy_text: bool = False) -> pd.DataFrame:
+    """Read the row metadata of a sidecar, optionally without the texts"""
+    columns = None
+    if lazy_text:
+        schema = pq.read_schema(rows_path)
+        columns = [name for name in schema.names if name != "combined_text"]
+    return fill_kb_metadata(pd.read_parquet(rows_path, columns=columns), source_name)
+
+
+def write_kb_files(out_dir, df: pd.DataFrame, embeddings=None) -> int:
+    """Write the matrix, row metadata, text store and BM25 index of ``df``
+
+    Vectors come from ``embeddings`` (a 2-D array) or, when it is None, from
+    the ``embedding`` column. Returns the embedding dimension.
+    """
+    out_dir = Path(out_dir)
+    if embeddings is None:
+        embeddings = df["embedding"].values
+    n_rows = len(df)
+    dim = len(embeddings[0])
+
+    # Write the matrix in batches instead of vstacking the whole column
+    matrix = np.lib.format.open_memmap(
+        out_dir / EMBEDDINGS_FILE, mode="w+", dtype=np.float32, shape=(n_rows, dim)
+    )
+    for start in range(0, n_rows, WRITE_BATCH_ROWS):
+        stop = min(start + WRITE_BATCH_ROWS, n_rows)
+        batch = np.asarray(
+            [np.asarray(v, dtype=np.float32) for v in embeddings[start:stop]]
+        )
+        norms = np.linalg.norm(batch, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix[start:stop] = batch / norms
+    matrix.flush()
+    del matrix
+
+    df.drop(columns=["embedding"], errors="ignore").reset_index(drop=True).to_parquet(
+        out_dir / ROWS_FILE, index=False
+    )
+    write_text_store(out_dir, df["combined_text"].values)
+    BM25Index.build(df["combined_text"].values).save(bm25_index_path(out_dir))
+    return dim
+
+
+def compile_knowledge_base(
+    kb_path, embedding_model: str = "text-embedding-3-large", force: bool = False
+) -> Path:
+    """Convert a parquet knowledge base into the compiled sidecar format"""
+    kb_path = Path(kb_path)
+    kb_dir = compiled_dir(kb_path)
+
+    if not force and is_compiled_current(kb_path):
+        print(f"  - Up to date: {kb_dir}")
+        # Sidecars compiled before the text store existed get one added
+        if not text_store_exists(kb_dir):
+            build_text_store(kb_path)
+        if not bm25_index_path(kb_dir).exists():
+            build_bm25_index(kb_path)
+        return kb_dir
+
+    print(f"  - Compiling {kb_path} -> {kb_dir}")
+    df = normalize_kb_frame(pd.read_parquet(kb_path), kb_path.name)
+    if df.empty:
+        raise ValueError(f"Knowledge base is empty: {kb_path}")
+
+    n_rows = len(df)
+
+    # Build into a temporary directory and swap it in at the end, so readers
+    # never see a half-written sidecar
+    tmp_dir = kb_dir.with_name(kb_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    dim = write_kb_files(tmp_dir, df)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "rows": n_rows,
+        "dim": dim,
+        "dtype": "float32",
+        "normalized": True,
+        "embedding_model": embedding_model,
+        "source": {"path": kb_path.name, **source_fingerprint(kb_path)},
+        "created": datetime.now().isoformat(),
+    }
+    with open(tmp_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    if kb_dir.exists():
+        shutil.rmtree(kb_dir)
+    tmp_dir.rename(kb_dir)
+
+    size_mb = (kb_dir / EMBEDDINGS_FILE).stat().st_size / 1024**2
+    print(f"    • {n_rows:,} rows x {dim} dims, matrix {size_mb:,.1f} MB")
+    return kb_dir
+
+
+def write_manifest(kb_path, manifest: Dict):
+    """Rewrite the sidecar manifest (e.g. after adding an index)"""
+    with open(compiled_dir(kb_path) / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def build_text_store(kb_path):
+    """Write the on-demand text store of an existing sidecar"""
+    kb_dir = compiled_dir(kb_path)
+    texts = pd.read_parquet(kb_dir / ROWS_FILE, columns=["combined_text"])
+    write_text_store(kb_dir, texts["combined_text"].values)
+    print(f"    • Text store: {len(texts):,} chunks")
+
+
+def build_bm25_index(kb_path):
+    """Write the BM25 lexical index of an existing sidecar"""
+    kb_dir = compiled_dir(kb_path)
+    texts = pd.read_parquet(kb_dir / ROWS_FILE, columns=["combined_text"])
+    index = BM25Index.build(texts["combined_text"].values)
+    index.save(bm25_index_path(kb_dir))
+    print(f"    • BM25 index: {len(index.terms):,} terms")
+
+
+def build_ann_index(kb_path, n_lists: Optional[int] = None) -> Path:
+    """Train and persist an IVF index next to a compiled knowledge base"""
+    if not is_compiled_current(kb_path):
+        raise ValueError(f"Compile the knowledge base before indexing: {kb_path}")
+
+    kb_dir = compiled_dir(kb_path)
+    embeddings = np.load(kb_dir / EMBEDDINGS_FILE, mmap_mode="r")
+    index = IVFIndex.build(embeddings, n_lists=n_lists)
+    index.save(ann_index_path(kb_dir))
+
+    manifest = read_manifest(kb_path)
+    manifest["ann"] = {"type": "ivf", "n_lists": index.n_lists}
+    write_manifest(kb_path, manifest)
+
+    print(f"    • IVF index: {index.n_lists:,} lists over {len(embeddings):,} rows")
+    return ann_index_path(kb_dir)
+
+
+def build_tier(kb_path, tier: str) -> CompactTier:
+    """Encode the compact first-pass tier chosen for this knowledge base"""
+    if not is_compiled_current(kb_path):
+        raise ValueError(f"Compile the knowledge base before adding a tier: {kb_path}")
+
+    kb_dir = compiled_dir(kb_path)
+    embeddings = np.load(kb_dir / EMBEDDINGS_FILE, mmap_mode="r")
+    compact = CompactTier.build(tier, embeddings)
+    compact.save(kb_dir)
+
+    manifest = read_manifest(kb_path)
+    manifest["tier"] = tier
+    write_manifest(kb_path, manifest)
+
+    saved = 1 - compact.nbytes / embeddings.nbytes
+    print(
+        f"    • Tier {tier}: {compact.nbytes / 1024 ** 2:,.1f} MB resident "
+        f"({saved:.0%} smaller than float32)"
+    )
+    return compact
+
+
+def build_sentence_index(
+    kb_path,
+    embedding_model: str = "text-embedding-3-large",
+    dims: int = DEFAULT_SENTENCE_DIMS,
+    window: int = DEFAULT_WINDOW,
+) -> SentenceIndex:
+    """Embed the sentences of every chunk of a compiled knowledge base"""
+    if not is_compiled_current(kb_path):
+        raise ValueError(
+            f"Compile the knowledge base before adding sentences: {kb_path}"
+        )
+
+    kb_dir = compiled_dir(kb_path)
+    texts = pd.read_parquet(kb_dir / ROWS_FILE, columns=["combined_text"])
+    # Straight to the API: sentence vectors are stored here, not in the cache
+    embeddings = get_cached_embeddings(embedding_model).embeddings
+    n_sentences = write_sentence_index(
+        kb_dir, texts["combined_text"].values, embeddings, dims, window
+    )
+    index = SentenceIndex(kb_dir)
+
+    manifest = read_manifest(kb_path)
+    manifest["sentences"] = {
+        "count": n_sentences,
+        "dims": index.dims,
+        "window": window,
+    }
+    write_manifest(kb_path, manifest)
+
+    print(f"    • Sentence index: {n_sentences:,} sentences x {index.dims} dims")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile parquet knowledge bases into memory-mappable sidecars"
+    )
+    parser.add_argument(
+        "kb_paths",
+        nargs="*",
+        default=DEFAULT_KB_PATHS,
+        help="Parquet knowledge bases to compile (default: both project KBs)",
+    )
+    parser.add_argument("--embedding-model", default="text-embedding-3-large")
+    parser.add_argument(
+        "--force", action="store_true", help="Rebuild even if the sidecar is current"
+    )
+    parser.add_argument(
+        "--ann", action="store_true", help="Also build an IVF index for ANN search"
+    )
+    parser.add_argument(
+        "--ann-lists",
+        type=int,
+        default=None,
+        help="Number of IVF lists (default: 4 * sqrt(rows))",
+    )
+    parser.add_argument(
+        "--tier",
+        choices=TIERS,
+        default=None,
+        help="Compact first-pass tier; full vectors are only used for rescoring",
+    )
+    parser.add_argument(
+        "--sentences",
+        action="store_true",
+        help="Also embed every sentence, for extractive context compression",
+    )
+    parser.add_argument(
+        "--sentence-dims",
+        type=int,
+        default=DEFAULT_SENTENCE_DIMS,
+        help="Dimensions kept per sentence vector (Matryoshka truncation)",
+    )
+    parser.add_argument(
+        "--sentence-window",
+        type=int,
+        default=DEFAULT_WINDOW,
+        help="Sentences on each side returned around a matching sentence",
+    )
+    args = parser.parse_args()
+
+    for kb_path in args.kb_paths:
+        if not Path(kb_path).exists():
+            print(f"  - Knowledge base not found at: {kb_path}")
+            continue
+        compile_knowledge_base(kb_path, args.embedding_model, force=args.force)
+        if args.ann:
+            build_ann_index(kb_path, args.ann_lists)
+        if args.tier:
+            build_tier(kb_path, args.tier)
+        if args.sentences:
+            build_sentence_index(
+                kb_path,
+                args.embedding_model,
+                args.sentence_dims,
+                args.sentence_window,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from agent.researcher.knowledge_base import KnowledgeBaseQuerier
+from agent.researcher.kb_compiler import MANIFEST_FILE, compiled_dir
+
+
+def _stat_key(path: Path) -> Tuple:
+    try:
+        stat = path.stat()
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return (None, None)
+
+
+def kb_fingerprint(kb_path: str) -> Tuple:
+    """Identify the on-disk state of a knowledge base (parquet and sidecar)
+
+    A segmented knowledge base is a directory whose manifest is replaced on
+    every append, delete or compaction.
+    """
+    return (
+        _stat_key(Path(kb_path))
+        + _stat_key(compiled_dir(kb_path) / MANIFEST_FILE)
+        + _stat_key(Path(kb_path) / MANIFEST_FILE)
+    )
+
+
+class KnowledgeBaseRegistry:
+    """Process-wide cache of loaded knowledge bases
+
+    Each knowledge base is loaded once per process and shared by every node
+    that queries it. Entries are keyed by (path, mtime, size, embedding model)
+    so a rewritten file is picked up automatically on the next lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Tuple[str, str, bool], threading.Lock] = {}
+        self._entries: Dict[
+            Tuple[str, str, bool], Tuple[Tuple, KnowledgeBaseQuerier]
+        ] = {}
+
+    def get(
+        self,
+        kb_path: str,
+        embedding_model: str = "text-embedding-3-large",
+        lazy_text: bool = True,
+        lexical_prefilter: Optional[int] = None,
+    ) -> KnowledgeBaseQuerier:
+        """Return a loaded querier, loading or reloading it only when needed
+
+        ``lexical_prefilter`` only shapes searches, not the loaded data, so
+        it is set on the shared querier instead of keying another load;
+        None leaves the current setting and 0 turns the pre-filter off.
+        """
+        entry_key = (str(Path(kb_path).resolve()), embedding_model, lazy_text)
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(entry_key, threading.Lock())
+
+        # Loads of different knowledge bases can run in parallel, while
+        # concurrent requests for the same one wait for a single load
+        with load_lock:
+            fingerprint = kb_fingerprint(kb_path)
+            cached = self._entries.get(entry_key)
+            # Failed loads are cached too, and retried once the files change
+            if cached and cached[0] == fingerprint:
+                if lexical_prefilter is not None:
+                    cached[1].lexical_prefilter = lexical_prefilter
+                return cached[1]
+
+            if cached:
+                print(f"  - Knowledge base changed on disk, reloading: {kb_path}")
+
+            querier = KnowledgeBaseQuerier(
+                kb_path,
+                embedding_model,
+                lazy_text=lazy_text,
+                lexical_prefilter=lexical_prefilter or None,
+            )
+            if querier.is_loaded:
+                print(
+                    f"  - Knowledge base cached: {Path(kb_path).name} "
+                    f"({querier.load_seconds:.2f}s, "
+                    f"{querier.memory_usage() / 1024 ** 2:,.1f} MB)"
+                )
+            self._entries[entry_key] = (fingerprint, querier)
+            return querier
+
+    def warm(
+        self,
+        kb_paths: List[str],
+        embedding_model: str = "text-embedding-3-large",
+        background: bool = True,
+        lexical_prefilter: Optional[int] = None,
+    ) -> Optional[threading.Thread]:
+        """Preload knowledge bases, optionally on a daemon thread"""
+
+        def _warm():
+            for kb_path in kb_paths:
+                self.get(kb_path, embedding_model, lexical_prefilter=lexical_prefilter)
+
+        if not background:
+            _warm()
+            return None
+
+        thread = threading.Thread(target=_warm, name="kb-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def invalidate(self, kb_path: Optional[str] = None):
+        """Drop one knowledge base (or all of them) from the cache"""
+        with self._lock:
+            if kb_path is None:
+                self._entries.clear()
+                return
+            resolved = str(Path(kb_path).resolve())
+            for entry_key in [k for k in self._entries if k[0] == resolved]:
+                del self._entries[entry_key]
+
+    def stats(self) -> List[Dict]:
+        """Load time and resident size of every cached knowledge base"""
+        with self._lock:
+            entries = list(self._entries.items())
+
+        return [
+            {
+                "path": entry_key[0],
+                "embedding_model": entry_key[1],
+                "entries": len(querier.df) if querier.df is not None else 0,
+                "kb_version": querier.kb_version,
+                "load_seconds": querier.load_seconds,
+                "memory_bytes": querier.memory_usage(),
+            }
+            for entry_key, (_, querier) in entries
+        ]
+
+    def print_stats(self):
+        """Pretty print the registry contents"""
+        print("\n📚 Knowledge Base Registry:")
+        stats = self.stats()
+        if not stats:
+            print("  - No knowledge bases loaded")
+        for entry in stats:
+            print(
+                f"  - {Path(entry['path']).name}: {entry['entries']:,} entries, "
+                f"loaded in {entry['load_seconds']:.2f}s, "
+                f"{entry['memory_bytes'] / 1024 ** 2:,.1f} MB resident"
+            )
+
+
+# Shared registry for the whole process
+_registry = KnowledgeBaseRegistry()
+
+
+def get_registry() -> KnowledgeBaseRegistry:
+    """Return the process-wide knowledge base registry"""
+    return _registry
+
+
+def get_knowledge_base(
+    kb_path: str,
+    embedding_model: str = "text-embedding-3-large",
+    lazy_text: bool = True,
+    lexical_prefilter: Optional[int] = None,
+) -> KnowledgeBaseQuerier:
+    """Return the shared querier for a knowledge base"""
+    return _registry.get(kb_path, embedding_model, lazy_text, lexical_prefilter)
+
+
+def warm_knowledge_bases(
+    kb_paths: List[str],
+    embedding_model: str = "text-embedding-3-large",
+    background: bool = True,
+    lexical_prefilter: Optional[int] = None,
+) -> Optional[threading.Thread]:
+    """Start loading knowledge bases before the first chapter needs them"""
+    return _registry.warm(kb_paths, embedding_model, background, lexical_prefilter)
@@ -0,0 +1,414 @@
+"""Append-only, versioned knowledge base segments
+
+A segmented knowledge base is a directory (by convention ``<name>.kbseg``)::
+
+    manifest.json            version, embedding model, segments, tombstones
+    segments/seg_000001/     same files as a compiled sidecar
+    segments/seg_000002/
+
+Adding rows writes a new segment and deleting chunks records tombstones, so
+existing data is never rewritten. Every change bumps the manifest
+``version``, which queriers expose as ``kb_version`` so caches keyed on the
+knowledge base content can be invalidated exactly. Compaction merges the
+segments into one and drops tombstoned rows::
+
+    python -m agent.researcher.kb_segments append <store> <rows.parquet>
+    python -m agent.researcher.kb_segments delete <store> <chunk id> [...]
+    python -m agent.researcher.kb_segments compact <store>
+    python -m agent.researcher.kb_segments info <store>
+
+Rows appended without an ``embedding`` column are embedded with the
+store's embedding model.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from agent.researcher.embedding_cache import get_cached_embeddings
+from agent.researcher.kb_compiler import (
+    EMBEDDINGS_FILE,
+    MANIFEST_FILE,
+    ROWS_FILE,
+    normalize_kb_frame,
+    read_rows,
+    write_kb_files,
+)
+from agent.researcher.bm25 import BM25Index, bm25_index_path
+from agent.researcher.text_store import SegmentedTextStore, TextStore
+
+SEGMENTS_FORMAT_VERSION = 1
+SEGMENTS_DIR = "segments"
+
+# One writer lock per store directory within this process, and one lock
+# held for the whole of a compaction so only one runs per store
+_store_locks: Dict[str, threading.Lock] = {}
+_compact_locks: Dict[str, threading.Lock] = {}
+_store_locks_guard = threading.Lock()
+
+
+def _store_lock(path: Path) -> threading.Lock:
+    with _store_locks_guard:
+        return _store_locks.setdefault(str(path.resolve()), threading.Lock())
+
+
+def _compact_lock(path: Path) -> threading.Lock:
+    with _store_locks_guard:
+        return _compact_locks.setdefault(str(path.resolve()), threading.Lock())
+
+
+def read_segments_manifest(kb_path) -> Optional[Dict]:
+    """Return the manifest of a segmented knowledge base, or None"""
+    manifest_path = Path(kb_path) / MANIFEST_FILE
+    if not Path(kb_path).is_dir() or not manifest_path.exists():
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    # Compiled sidecars also have a manifest.json, but no segment list
+    return manifest if "segments" in manifest else None
+
+
+def is_segmented_kb(kb_path) -> bool:
+    return read_segments_manifest(kb_path) is not None
+
+
+def load_segments(kb_path, lazy_text: bool = False) -> Tuple[
+    pd.DataFrame,
+    np.ndarray,
+    Dict,
+    Optional[SegmentedTextStore],
+    Optional[BM25Index],
+]:
+    """Open every segment and return the live rows as one knowledge base
+
+    A single segment without tombstones stays memory-mapped; otherwise the
+    live rows are concatenated in memory until the store is compacted. The
+    per-segment BM25 indexes are merged into one over the live rows.
+    """
+    kb_path = Path(kb_path)
+    manifest = read_segments_manifest(kb_path)
+    if manifest is None:
+        raise ValueError(f"Not a segmented knowledge base: {kb_path}")
+
+    frames, matrices, stores, segment_of, local_rows = [], [], [], [], []
+    lexical_indexes, lexical_rows = [], []
+    for number, segment in enumerate(manifest["segments"]):
+        segment_dir = kb_path / SEGMENTS_DIR / segment["name"]
+        rows = read_rows(segment_dir / ROWS_FILE, kb_path.name, lazy_text)
+        embeddings = np.load(segment_dir / EMBEDDINGS_FILE, mmap_mode="r")
+
+        dead = manifest["tombstones"].get(segment["name"], [])
+        live = np.flatnonzero(~rows["id"].isin(dead).to_numpy())
+        if len(live) < len(rows):
+            rows = rows.iloc[live]
+            embeddings = embeddings[live]
+
+        frames.append(rows)
+        matrices.append(embeddings)
+        if bm25_index_path(segment_dir).exists():
+            lexical_indexes.append(BM25Index.load(bm25_index_path(segment_dir)))
+            lexical_rows.append(live)
+        if lazy_text:
+            stores.append(TextStore(segment_dir))
+            segment_of.append(np.full(len(live), number, dtype=np.int32))
+            local_rows.append(live)
+
+    if not frames:
+        df = normalize_kb_frame(
+            pd.DataFrame({"combined_text": [], "embedding": []}), kb_path.name
+        ).drop(columns=["embedding"])
+        embeddings = np.empty((0, manifest.get("dim") or 0), dtype=np.float32)
+    else:
+        df = pd.concat(frames, ignore_index=True)
+        embeddings = matrices[0] if len(matrices) == 1 else np.concatenate(matrices)
+
+    texts = None
+    if lazy_text and frames:
+        df = df.drop(columns=["combined_text"], errors="ignore")
+        texts = SegmentedTextStore(
+            stores, np.concatenate(segment_of), np.concatenate(local_rows)
+        )
+
+    lexical_index = None
+    if frames and len(lexical_indexes) == len(frames):
+        lexical_index = BM25Index.merge(lexical_indexes, lexical_rows)
+    return df, embeddings, manifest, texts, lexical_index
+
+
+class SegmentedKnowledgeBase:
+    """Writer for a segmented knowledge base
+
+    Writes within one process are serialised per store; the manifest is
+    replaced atomically, so readers always see a consistent segment list.
+    """
+
+    def __init__(self, path, embedding_model: str = "text-embedding-3-large"):
+        self.path = Path(path)
+        self.embedding_model = embedding_model
+        self._lock = _store_lock(self.path)
+        self._compact_lock = _compact_lock(self.path)
+
+    def read_manifest(self) -> Dict:
+        manifest = read_segments_manifest(self.path)
+        if manifest is None:
+            manifest = {
+                "format_version": SEGMENTS_FORMAT_VERSION,
+                "version": 0,
+                "embedding_model": self.embedding_model,
+                "dim": None,
+                "next_segment": 1,
+                "segments": [],
+                "tombstones": {},
+            }
+        return manifest
+
+    def _write_manifest(self, manifest: Dict):
+        manifest["updated"] = datetime.now().isoformat()
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path / (MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.path / MANIFEST_FILE)
+
+    def _segment_ids(self, name: str) -> pd.Series:
+        rows_path = self.path / SEGMENTS_DIR / name / ROWS_FILE
+        return pd.read_parquet(rows_path, columns=["id"])["id"]
+
+    def _tombstone(self, manifest: Dict, ids: set, segments: List[Dict]) -> int:
+        """Record tombstones for the live rows with these ids; returns the count"""
+        removed = 0
+        for segment in segments:
+            dead = set(manifest["tombstones"].get(segment["name"], []))
+            hits = set(self._segment_ids(segment["name"])) & (ids - dead)
+            if hits:
+                manifest["tombstones"][segment["name"]] = sorted(dead | hits)
+                removed += len(hits)
+        return removed
+
+    def append(
+        self,
+        df: pd.DataFrame,
+        source_name: str = "General",
+        replace_ids: Iterable[str] = (),
+    ) -> str:
+        """Write rows as a new segment; rows reusing a live id replace it
+
+        The live rows with ids in ``replace_ids`` are tombstoned in the same
+        manifest version, so readers never see both the old and new rows.
+        """
+        if df.empty:
+            raise ValueError("No rows to append")
+        df = df.copy()
+
+        with self._lock:
+            manifest = self.read_manifest()
+            if manifest["embedding_model"] != self.embedding_model:
+                raise ValueError(
+                    f"Store uses {manifest['embedding_model']}, "
+                    f"not {self.embedding_model}"
+                )
+            name = f"seg_{manifest['next_segment']:06d}"
+
+            if "id" not in df.columns:
+                df["id"] = [f"{name}_{i}" for i in range(len(df))]
+            if "embedding" not in df.columns:
+                print(f"  - Embedding {len(df):,} rows with {self.embedding_model}")
+                client = get_cached_embeddings(self.embedding_model)
+                df["embedding"] = client.embed_documents(df["combined_text"].tolist())
+            df = normalize_kb_frame(df, source_name)
+
+            segment_dir = self.path / SEGMENTS_DIR / name
+            tmp_dir = segment_dir.with_name(name + ".tmp")
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir)
+            tmp_dir.mkdir(parents=True)
+            dim = write_kb_files(tmp_dir, df)
+            if manifest["dim"] not in (None, dim):
+                shutil.rmtree(tmp_dir)
+                raise ValueError(
+                    f"Expected {manifest['dim']}-dim embeddings, got {dim}"
+                )
+            tmp_dir.rename(segment_dir)
+
+            replaced = self._tombstone(
+                manifest,
+                set(df["id"]) | set(replace_ids),
+                list(manifest["segments"]),
+            )
+            manifest["segments"].append(
+                {
+                    "name": name,
+                    "rows": len(df),
+                    "created": datetime.now().isoformat(),
+                }
+            )
+            manifest["dim"] = dim
+            manifest["next_segment"] += 1
+            manifest["version"] += 1
+            self._write_manifest(manifest)
+
+        print(
+            f"  - Appended {name}: {len(df):,} rows"
+            + (f", replacing {replaced:,}" if replaced else "")
+            + f" (version {manifest['version']})"
+        )
+        return name
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """Tombstone chunks by id; returns the number of rows removed"""
+        with self._lock:
+            manifest = self.read_manifest()
+            removed = self._tombstone(manifest, set(ids), manifest["segments"])
+            if removed:
+                manifest["version"] += 1
+                self._write_manifest(manifest)
+
+        print(f"  - Deleted {removed:,} rows (version {manifest['version']})")
+        return removed
+
+    def compact(self) -> Optional[str]:
+        """Merge all segments into one, dropping tombstoned rows
+
+        Appends and deletes made while the merge runs are kept: new segments
+        stay alongside the merged one and new tombstones are carried over.
+        Returns None without merging while another compaction of the store
+        is running.
+        """
+        if not self._compact_lock.acquire(blocking=False):
+            print("  - Compaction already running")
+            return None
+        try:
+            return self._compact()
+        finally:
+            self._compact_lock.release()
+
+    def _compact(self) -> Optional[str]:
+        with self._lock:
+            snapshot = self.read_manifest()
+        merged = snapshot["segments"]
+        if len(merged) <= 1 and not any(snapshot["tombstones"].values()):
+            print("  - Nothing to compact")
+            return None
+
+        frames, matrices = [], []
+        for segment in merged:
+            segment_dir = self.path / SEGMENTS_DIR / segment["name"]
+            rows = pd.read_parquet(segment_dir / ROWS_FILE)
+            embeddings = np.load(segment_dir / EMBEDDINGS_FILE, mmap_mode="r")
+            dead = snapshot["tombstones"].get(segment["name"], [])
+            live = np.flatnonzero(~rows["id"].isin(dead).to_numpy())
+            frames.append(rows.iloc[live])
+            matrices.append(np.asarray(embeddings[live]))
+
+        df = pd.concat(frames, ignore_index=True)
+        tmp_dir = Path(
+            tempfile.mkdtemp(
+                prefix="compacted.", suffix=".tmp", dir=self.path / SEGMENTS_DIR
+            )
+        )
+        # mkdtemp creates the directory private to the user
+        os.chmod(tmp_dir, 0o755)
+        if len(df):
+            write_kb_files(tmp_dir, df, np.concatenate(matrices))
+
+        merged_names = {segment["name"] for segment in merged}
+        with self._lock:
+            manifest = self.read_manifest()
+            name = f"seg_{manifest['next_segment']:06d}"
+            tmp_dir.rename(self.path / SEGMENTS_DIR / name)
+
+            # Tombstones recorded on the merged segments during the merge
+            late = set()
+            for old in merged_names:
+                late |= set(manifest["tombstones"].pop(old, [])) - set(
+                    snapshot["tombstones"].get(old, [])
+                )
+
+            kept = [s for s in manifest["segments"] if s["name"] not in merged_names]
+            manifest["segments"] = (
+                [
+                    {
+                        "name": name,
+                        "rows": len(df),
+                        "created": datetime.now().isoformat(),
+                    }
+                ]
+                if len(df)
+                else []
+            ) + kept
+            if late and len(df):
+                manifest["tombstones"][name] = sorted(late & set(df["id"]))
+            manifest["next_segment"] += 1
+            manifest["version"] += 1
+            self._write_manifest(manifest)
+
+        # Open memory maps keep working after the files are unlinked
+        for old in merged_names:
+            shutil.rmtree(self.path / SEGMENTS_DIR / old, ignore_errors=True)
+        if not len(df):
+            shutil.rmtree(self.path / SEGMENTS_DIR / name, ignore_errors=True)
+
+        print(
+            f"  - Compacted {len(merged_names)} segments into {name}: "
+            f"{len(df):,} rows (version {manifest['version']})"
+        )
+        return name
+
+    def compact_async(self) -> Optional[threading.Thread]:
+        """Run ``compact`` on a daemon thread, unless one is already running"""
+        if self._compact_lock.locked():
+            return None
+        thread = threading.Thread(
+            target=self.compact, name=f"kb-compact-{self.path.name}", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def info(self) -> Dict:
+        manifest = self.read_manifest()
+        return {
+            "version": manifest["version"],
+            "embedding_model": manifest["embedding_model"],
+            "segments": len(manifest["segments"]),
+            "rows": sum(segment["rows"] for segment in manifest["segments"]),
+            "tombstones": sum(len(ids) for ids in manifest["tombstones"].values()),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Manage an append-only, segmented knowledge base"
+    )
+    parser.add_argument("command", choices=["append", "delete", "compact", "info"])
+    parser.add_argument("store", help="Segmented knowledge base directory")
+    parser.add_argument(
+        "items", nargs="*", help="Parquet files to append, or chunk ids to delete"
+    )
+    parser.add_argument("--embedding-model", default="text-embedding-3-large")
+    args = parser.parse_args()
+
+    store = SegmentedKnowledgeBase(args.store, args.embedding_model)
+    if args.command == "append":
+        for parquet_path in args.items:
+            store.append(pd.read_parquet(parquet_path), Path(parquet_path).name)
+    elif args.command == "delete":
+        store.delete(args.items)
+    elif args.command == "compact":
+        store.compact()
+
+    info = store.info()
+    print(
+        f"  - {args.store}: version {info['version']}, {info['segments']} segments, "
+        f"{info['rows']:,} rows, {info['tombstones']:,} tombstones"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,232 @@
+import threading
+import time
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from typing import List, Dict, Optional
-from langchain_openai import OpenAIEmbeddings
+from agent.researcher.kb_compiler import (
+    compiled_dir,
+    load_compiled,
+    normalize_kb_frame,
+    source_fingerprint,
+)
+from agent.researcher.kb_segments import (
+    SegmentedKnowledgeBase,
+    is_segmented_kb,
+    load_segments,
+)
+from agent.researcher.ann_index import (
+    DEFAULT_ANN_MIN_ROWS,
+    IVFIndex,
+    ann_index_path,
+)
+from agent.researcher.bm25 import (
+    RRF_K,
+    BM25Index,
+    bm25_index_path,
+    reciprocal_rank_fusion,
+)
+from agent.researcher.filter_index import MetadataFilterIndex
+from agent.researcher.quantization import DEFAULT_RESCORE_CANDIDATES, CompactTier
+from agent.researcher.sentence_index import (
+    SentenceIndex,
+    expand_windows,
+    sentence_index_exists,
+)
+from agent.researcher.text_store import TextStore, text_store_exists
+from agent.researcher.embedding_cache import get_cached_embeddings
+
+# Number of entries retrieved per knowledge base for a chapter
+DEFAULT_TOP_K = 10
+
+# Dense and lexical candidates per query that go into rank fusion
+FUSION_DEPTH = 50
+
+# What dense search matches: whole chunks, or sentences expanded to windows
+RETRIEVAL_UNITS = ("chunk", "sentence")
+
+# Sentences matched per chunk wanted, so enough distinct chunks are found
+SENTENCES_PER_CHUNK = 4
+
+
+def chapter_search_query(chapter: Dict) -> str:
+    """Build the retrieval query from a chapter's purpose and key topics"""
+    purpose_text = " ".join(chapter.get("purpose", []))
+    key_topics_text = " ".join(chapter.get("key_topics", []))
+    return f"Purpose: {purpose_text}\n\nKey topics: {key_topics_text}"
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k highest scores, best first, without a full sort"""
+    if top_k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k >= len(scores):
+        return np.argsort(scores)[::-1]
+    candidates = np.argpartition(scores, -top_k)[-top_k:]
+    return candidates[np.argsort(scores[candidates])[::-1]]
 
 
 class KnowledgeBaseQuerier:
     """Query a pandas-based knowledge base using OpenAI embeddings"""
 
-    def __init__(self, kb_path: str, embedding_model: str = "text-embedding-3-large"):
+    def __init__(
+        self,
+        kb_path: str,
+        embedding_model: str = "text-embedding-3-large",
+        ann_nprobe: Optional[int] = None,
+        ann_min_rows: int = DEFAULT_ANN_MIN_ROWS,
+        rescore_candidates: int = DEFAULT_RESCORE_CANDIDATES,
+        lazy_text: bool = True,
+        lexical_prefilter: Optional[int] = None,
+    ):
         self.kb_path = Path(kb_path)
         self.df = None
         self.embeddings = None
-        self.embedding_model = OpenAIEmbeddings(model=embedding_model)
+        # With a compiled text store, chunk texts stay on disk and only the
+        # rows that are returned get read
+        self.lazy_text = lazy_text
+        self.text_store = None
+        # BM25 index over the chunk texts, fused with the dense ranking when
+        # the query text is known; ``lexical_prefilter`` optionally limits
+        # dense scoring to that many lexical candidates. Uncompiled parquet
+        # knowledge bases build it on the first query that needs it
+        self._lexical_index = None
+        self._lexical_pending = False
+        self._lexical_lock = threading.Lock()
+        self.lexical_prefilter = lexical_prefilter
+        # Identifies the loaded content: the manifest version of a segmented
+        # knowledge base, else the source file's mtime and size
+        self.kb_version = None
+        self.compiled_manifest = None
+        self.filter_index = None
+        # Precomputed sentence embeddings (compiled with --sentences), used to
+        # compress retrieved chunks down to their relevant sentences
+        self.sentence_index = None
+
+        # Approximate search knobs: lists probed per query, and the KB size
+        # below which exact search is always used
+        self.ann_index = None
+        self.ann_nprobe = ann_nprobe
+        self.ann_min_rows = ann_min_rows
+
+        # Compact first-pass tier chosen at build time; the top candidates are
+        # rescored against the full-precision (memory-mapped) vectors
+        self.tier = None
+        self.rescore_candidates = rescore_candidates
+        self.embedding_model_name = embedding_model
+        # Shared by every querier, so the same query is embedded only once
+        self.embedding_model = get_cached_embeddings(embedding_model)
+
+        start = time.perf_counter()
         self._load_knowledge_base_flexible()
+        if self.df is not None:
+            self.filter_index = MetadataFilterIndex(self.df)
+        self.load_seconds = time.perf_counter() - start
+
+    @property
+    def lexical_index(self) -> Optional[BM25Index]:
+        """BM25 index over the chunk texts, built now if it was deferred"""
+        if self._lexical_pending:
+            with self._lexical_lock:
+                if self._lexical_pending:
+                    start = time.perf_counter()
+                    self._lexical_index = BM25Index.build(
+                        self.df["combined_text"].values
+                    )
+                    self._lexical_pending = False
+                    print(
+                        f"  - BM25 index built for {self.kb_path.name} in "
+                        f"{time.perf_counter() - start:.2f}s"
+                    )
+        return self._lexical_index
+
+    @lexical_index.setter
+    def lexical_index(self, index: Optional[BM25Index]):
+        self._lexical_index = index
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the knowledge base was loaded successfully"""
+        return self.df is not None and self.embeddings is not None
+
+    def memory_usage(self) -> int:
+        """Approximate resident size of the loaded knowledge base in bytes"""
+        total = 0
+        if self.df is not None:
+            total += int(self.df.memory_usage(deep=True).sum())
+        # A memory-mapped matrix lives in the shared page cache instead
+        if self.embeddings is not None and not isinstance(self.embeddings, np.memmap):
+            total += int(self.embeddings.nbytes)
+        if self.tier is not None:
+            total += self.tier.nbytes
+        if self.text_store is not None:
+            total += self.text_store.cache_bytes
+        # Not built by measuring it
+        if self._lexical_index is not None:
+            total += self._lexical_index.nbytes
+        return total
 
     def _load_knowledge_base_flexible(self):
         """Load knowledge base with flexible column support"""
-        if self.kb_path.exists():
-            try:
-                # Load the parquet file
-                temp_df = pd.read_parquet(self.kb_path)
-
-                # Check what columns are available
-                available_cols = set(temp_df.columns)
-                required_cols = {"combined_text", "embedding"}
-                optional_cols = {"id", "Category_1", "Category_2"}
+        if is_segmented_kb(self.kb_path):
+            self._load_segments()
+            return
+
+        # Prefer the compiled sidecar: the matrix is memory-mapped, not copied
+        kb_dir = compiled_dir(self.kb_path)
+        lazy_text = self.lazy_text and text_store_exists(kb_dir)
+        try:
+            compiled = load_compiled(self.kb_path, lazy_text=lazy_text)
+        except Exception as e:
+            print(f"  - Error loading compiled knowledge base, using parquet: {e}")
+            compiled = None
 
-                if not required_cols.issubset(available_cols):
-                    raise ValueError(
-                        f"DataFrame must contain at least: {required_cols}"
-                    )
+        if self.kb_path.exists():
+            fingerprint = source_fingerprint(self.kb_path)
+            self.kb_version = f"{fingerprint['mtime_ns']}-{fingerprint['size']}"
+
+        if compiled is not None:
+            self.df, self.embeddings, manifest = compiled
+            self.compiled_manifest = manifest
+            if self.kb_version is None:
+                source = manifest.get("source", {})
+                self.kb_version = f"{source.get('mtime_ns')}-{source.get('size')}"
+            print(f"  - Knowledge base loaded (compiled): {len(self.df)} entries")
+            print(f"  - Embeddings shape: {self.embeddings.shape} (memory-mapped)")
+
+            if lazy_text:
+                self.text_store = TextStore(kb_dir)
+                print("  - Chunk texts read on demand from the text store")
+
+            if bm25_index_path(kb_dir).exists():
+                self.lexical_index = BM25Index.load(bm25_index_path(kb_dir))
+                print(f"  - BM25 index loaded: {len(self.lexical_index.terms):,} terms")
+
+            index_path = ann_index_path(kb_dir)
+            if index_path.exists():
+                self.ann_index = IVFIndex.load(index_path, self.ann_nprobe)
+                print(f"  - ANN index loaded: {self.ann_index.n_lists:,} lists")
+
+            if manifest.get("tier"):
+                self.tier = CompactTier.load(kb_dir, manifest["tier"])
+                print(
+                    f"  - Search tier: {self.tier.name} "
+                    f"({self.tier.nbytes / 1024 ** 2:,.1f} MB resident)"
+                )
 
-                # Use available columns
-                cols_to_use = list(
-                    required_cols.union(available_cols.intersection(optional_cols))
+            if manifest.get("sentences") and sentence_index_exists(kb_dir):
+                self.sentence_index = SentenceIndex(kb_dir)
+                print(
+                    f"  - Sentence index loaded: {len(self.sentence_index):,} sentences"
                 )
-                self.df = temp_df[cols_to_use].copy()
+            return
 
-                # Add missing columns with defaults
-                if "id" not in self.df.columns:
-                    self.df["id"] = [f"doc_{i}" for i in range(len(self.df))]
-                if "Category_1" not in self.df.columns:
-                    self.df["Category_1"] = "General"
-                if "Category_2" not in self.df.columns:
-                    self.df["Category_2"] = "General"
+        if self.kb_path.exists():
+            try:
+                # Load the parquet file
+                self.df = normalize_kb_frame(
+                    pd.read_parquet(self.kb_path), self.kb_path.name
+                )
 
                 print(f"  - Knowledge base loaded: {len(self.df)} entries")
 
@@ -55,8 +237,16 @@ class KnowledgeBaseQuerier:
                     self.embeddings = np.vstack(
                         self.df["embedding"].apply(np.array).values
                     )
+                # The matrix is the only copy we need from here on
+                self.df = self.df.drop(columns=["embedding"])
+                self._lexical_pending = True
 
                 print(f"  - Embeddings shape: {self.embeddings.shape}")
+                print(
+                    "  - Not compiled: the BM25 index is rebuilt on first use "
+                    "after every load. Run `python -m agent.researcher.kb_compiler "
+                    f"{self.kb_path}` to persist it and memory-map the matrix"
+                )
 
             except Exception as e:
                 print(f"  - Error loading knowledge base: {e}")
@@ -65,65 +255,468 @@ class KnowledgeBaseQuerier:
         else:
             print(f"  - Knowledge base not found at: {self.kb_path}")
 
+    def _load_segments(self):
+        """Load a segmented knowledge base (all live rows of every segment)"""
+        try:
+            (
+                self.df,
+                self.embeddings,
+                manifest,
+                self.text_store,
+                self.lexical_index,
+            ) = load_segments(self.kb_path, lazy_text=self.lazy_text)
+        except Exception as e:
+            print(f"  - Error loading segmented knowledge base: {e}")
+            self.df = None
+            self.embeddings = None
+            return
+
+        self.compiled_manifest = manifest
+        self.kb_version = str(manifest["version"])
+        print(
+            f"  - Knowledge base loaded (segmented, version {self.kb_version}): "
+            f"{len(self.df)} entries in {len(manifest['segments'])} segments"
+        )
+
+    def compact(self, background: bool = True):
+        """Merge the segments of a segmented knowledge base
+
+        The registry picks up the new version on the next lookup.
+        """
+        if not is_segmented_kb(self.kb_path):
+            print(f"  - Not a segmented knowledge base: {self.kb_path}")
+            return None
+        store = SegmentedKnowledgeBase(self.kb_path, self.embedding_model_name)
+        return store.compact_async() if background else store.compact()
+
     def semantic_search(
-        self, query_text: str, top_k: int = 10, category_filter: Optional[str] = None
+        self,
+        query_text: str,
+        top_k: int = 10,
+        category_filter: Optional[str] = None,
+        row_ids: Optional[np.ndarray] = None,
     ) -> List[Dict]:
-        """Perform semantic search using OpenAI embeddings"""
-        if self.df is None or self.embeddings is None:
+        """Perform semantic search using OpenAI embeddings
+
+        Args:
+            category_filter: Only score rows whose Category_1 or Category_2 matches
+            row_ids: Only score these rows (e.g. from ``route_filters``)
+        """
+        if not self.is_loaded:
+            return []
+
+        # Narrow the candidate rows before scoring, so only they are multiplied
+        if category_filter:
+            category_rows = self.filter_index.select(categories=[category_filter])
+            row_ids = (
+                category_rows
+                if row_ids is None
+                else np.intersect1d(row_ids, category_rows)
+            )
+        if row_ids is not None and len(row_ids) == 0:
             return []
 
         # Encode the query using OpenAI
         print("  - Encoding query with OpenAI embeddings...")
-        query_embedding = self.embedding_model.embed_query(query_text)
-        query_embedding = np.array(query_embedding).reshape(1, -1)
-
-        # Calculate cosine similarity
-        similarities = np.dot(self.embeddings, query_embedding.T).flatten()
+        try:
+            query_embedding = np.array(self.embedding_model.embed_query(query_text))
+        except Exception as e:
+            print(f"  - Embedding failed, using lexical search: {e}")
+            return self.lexical_search_batch([query_text], top_k, [row_ids])[0]
+
+        return self.search_by_vectors(
+            query_embedding.reshape(1, -1),
+            top_k=top_k,
+            row_filters=[row_ids],
+            query_texts=[query_text],
+        )[0]
+
+    def semantic_search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 10,
+        row_filters: Optional[List[Optional[np.ndarray]]] = None,
+    ) -> List[List[Dict]]:
+        """Search many queries with one embedding call and one matrix product
+
+        Args:
+            queries: Query texts
+            row_filters: Optional per-query row ids to restrict scoring to
+        """
+        if not self.is_loaded or not queries:
+            return [[] for _ in queries]
+
+        print(f"  - Encoding {len(queries)} queries with OpenAI embeddings...")
+        try:
+            query_embeddings = np.array(self.embedding_model.embed_documents(queries))
+        except Exception as e:
+            print(f"  - Embedding failed, using lexical search: {e}")
+            return self.lexical_search_batch(queries, top_k, row_filters)
+
+        return self.search_by_vectors(
+            query_embeddings, top_k, row_filters, query_texts=queries
+        )
+
+    def lexical_search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 10,
+        row_filters: Optional[List[Optional[np.ndarray]]] = None,
+    ) -> List[List[Dict]]:
+        """Rank rows by BM25 alone, without any embedding call
+
+        No cosine similarity is known without a query embedding, so
+        ``score`` is 0; ``lexical_relevance`` is the BM25 score relative to
+        the best hit of the query and ``fused_score`` ranks the hits.
+        """
+        if not self.is_loaded or self.lexical_index is None:
+            return [[] for _ in queries]
+        if row_filters is None:
+            row_filters = [None] * len(queries)
+
+        all_results = []
+        for query_text, rows in zip(queries, row_filters):
+            found, scores = self.lexical_index.top(query_text, top_k, rows)
+            results = []
+            for rank, (row, score) in enumerate(zip(found, scores)):
+                result = self._make_result(row, 0.0)
+                result["lexical_score"] = float(score)
+                result["lexical_relevance"] = float(score / scores[0])
+                result["fused_score"] = 1.0 / (RRF_K + 1 + rank)
+                results.append(result)
+            all_results.append(results)
+        return all_results
+
+    def search_by_vectors(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 10,
+        row_filters: Optional[List[Optional[np.ndarray]]] = None,
+        min_score: Optional[float] = 0.3,
+        query_texts: Optional[List[str]] = None,
+        units: str = "chunk",
+    ) -> List[List[Dict]]:
+        """Rank rows for already-embedded queries (Q x D matrix)
+
+        Args:
+            query_texts: The queries' texts; when given and a BM25 index is
+                loaded, dense and lexical rankings are fused with RRF
+            units: "sentence" matches the precomputed sentence embeddings
+                (when compiled) and returns each chunk with the merged
+                ``windows`` around its matching sentences
+        """
+        n_queries = len(query_embeddings)
+        if not self.is_loaded or n_queries == 0:
+            return [[] for _ in range(n_queries)]
+        if row_filters is None:
+            row_filters = [None] * n_queries
+
+        if units == "sentence" and self.sentence_index is not None:
+            return self._search_sentences(
+                query_embeddings, top_k, row_filters, min_score, query_texts
+            )
 
-        # Apply category filter if specified
-        if category_filter:
-            mask = (self.df["Category_1"] == category_filter) | (
-                self.df["Category_2"] == category_filter
+        hybrid = query_texts is not None and self.lexical_index is not None
+        base_filters = row_filters
+        depth = max(top_k, FUSION_DEPTH) if hybrid else top_k
+
+        # Optionally only score the rows that match the query lexically
+        if hybrid and self.lexical_prefilter:
+            row_filters = [
+                self._lexical_candidates(text, rows, top_k)
+                for text, rows in zip(query_texts, row_filters)
+            ]
+
+        # Large knowledge bases only score the rows in the probed IVF lists
+        if self.uses_ann:
+            ann_candidates = self.ann_index.candidates(
+                query_embeddings, self.ann_nprobe
             )
-            filtered_indices = self.df[mask].index
-            # Set non-matching indices to -1
-            for i in range(len(similarities)):
-                if i not in filtered_indices:
-                    similarities[i] = -1
+            row_filters = [
+                self._restrict_to_candidates(candidates, rows, top_k)
+                for candidates, rows in zip(ann_candidates, row_filters)
+            ]
+
+        # First pass on the compact tier, keeping candidates for exact rescoring
+        if self.tier is not None:
+            row_filters = [
+                self._first_pass(query, rows, top_k)
+                for query, rows in zip(query_embeddings, row_filters)
+            ]
+
+        row_filters = [
+            None if rows is None else np.unique(rows) for rows in row_filters
+        ]
+        # Match the matrix dtype so a float32 matrix is never upcast
+        query_embeddings = np.asarray(query_embeddings, dtype=self.embeddings.dtype)
+
+        # Score the union of all candidate rows once (Q x N_candidates)
+        if any(rows is None for rows in row_filters):
+            scored_rows = None
+            scores = query_embeddings @ self.embeddings.T
+        else:
+            scored_rows = np.unique(np.concatenate(row_filters))
+            scores = query_embeddings @ self.embeddings[scored_rows].T
 
-        # Get top k results
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        all_results = []
+        for i, rows in enumerate(row_filters):
+            if rows is None:
+                query_scores, query_rows = scores[i], scored_rows
+            else:
+                positions = (
+                    np.searchsorted(scored_rows, rows)
+                    if scored_rows is not None
+                    else rows
+                )
+                query_scores, query_rows = scores[i, positions], rows
+
+            ranked = top_k_indices(query_scores, depth)
+            if min_score is not None:  # Skip low similarity
+                ranked = ranked[query_scores[ranked] >= min_score]
+            dense_rows = ranked if query_rows is None else query_rows[ranked]
+
+            if hybrid:
+                results = self._fuse(
+                    query_embeddings[i],
+                    dense_rows,
+                    query_scores[ranked],
+                    query_texts[i],
+                    base_filters[i],
+                    top_k,
+                )
+            else:
+                results = [
+                    self._make_result(idx, score)
+                    for idx, score in zip(dense_rows, query_scores[ranked])
+                ]
+            all_results.append(results)
+
+        return all_results
+
+    def rerank_rows(
+        self,
+        rows: np.ndarray,
+        query_embedding: np.ndarray,
+        top_k: int = 10,
+        query_text: Optional[str] = None,
+        min_score: Optional[float] = None,
+    ) -> List[Dict]:
+        """Rank a known candidate set for a query, like ``search_by_vectors``
 
-        results = []
-        for idx in top_indices:
-            if similarities[idx] < 0.3:  # Skip low similarity results
-                continue
+        Only the given rows are scored; with ``query_text`` and a BM25 index
+        the dense and lexical rankings of the candidates are fused with RRF.
+        """
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        if not self.is_loaded or len(rows) == 0:
+            return []
 
-            row = self.df.iloc[idx]
+        query = np.asarray(query_embedding, dtype=self.embeddings.dtype)
+        scores = np.asarray(self.embeddings[rows] @ query)
+        ranked = np.argsort(-scores, kind="stable")
+        if min_score is not None:
+            ranked = ranked[scores[ranked] >= min_score]
+
+        if query_text is not None and self.lexical_index is not None:
+            return self._fuse(
+                query, rows[ranked], scores[ranked], query_text, rows, top_k
+            )
+        return [
+            self._make_result(row, score)
+            for row, score in zip(rows[ranked[:top_k]], scores[ranked[:top_k]])
+        ]
+
+    def _search_sentences(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int,
+        row_filters: List[Optional[np.ndarray]],
+        min_score: Optional[float],
+        query_texts: Optional[List[str]],
+    ) -> List[List[Dict]]:
+        """Match sentences, then rank their chunks by the best matching one"""
+        hybrid = query_texts is not None and self.lexical_index is not None
+        depth = max(top_k, FUSION_DEPTH) if hybrid else top_k
+        n_units = depth * SENTENCES_PER_CHUNK
+
+        # Without row filters every query scores the sentence matrix in one pass
+        if all(rows is None for rows in row_filters):
+            found, scores = self.sentence_index.search(query_embeddings, n_units)
+            matches = list(zip(found, scores))
+        else:
+            matches = []
+            for query, rows in zip(query_embeddings, row_filters):
+                units = None if rows is None else self.sentence_index.units_of(rows)
+                found, scores = self.sentence_index.search(
+                    query[None, :], n_units, units
+                )
+                matches.append((found[0], scores[0]))
+
+        all_results = []
+        for i, (found, scores) in enumerate(matches):
+            if min_score is not None:
+                found, scores = found[scores >= min_score], scores[scores >= min_score]
+            chunk_rows = self.sentence_index.row_of[found]
+            # First (best) sentence of each chunk, in rank order
+            _, first = np.unique(chunk_rows, return_index=True)
+            first = np.sort(first)[:depth]
+            dense_rows = chunk_rows[first].astype(np.int64)
+            windows = self.sentence_index.windows_of(
+                found[np.isin(chunk_rows, dense_rows)]
+            )
 
-            result = {
-                "score": float(similarities[idx]),
-                "id": row["id"],
-                "combined_text": row["combined_text"],
-                "category_1": row["Category_1"],
-                "category_2": row["Category_2"],
-            }
+            if hybrid:
+                results = self._fuse(
+                    query_embeddings[i],
+                    dense_rows,
+                    scores[first],
+                    query_texts[i],
+                    row_filters[i],
+                    top_k,
+                )
+            else:
+                results = [
+                    self._make_result(idx, score)
+                    for idx, score in zip(dense_rows, scores[first])
+                ]
+            # Lexical-only hits have no matching sentence and stay whole
+            for result in results:
+                if result["row"] in windows:
+                    result["windows"] = windows[result["row"]]
+            all_results.append(results)
+        return all_results
+
+    def _fuse(
+        self,
+        query: np.ndarray,
+        dense_rows: np.ndarray,
+        dense_scores: np.ndarray,
+        query_text: str,
+        rows: Optional[np.ndarray],
+        top_k: int,
+    ) -> List[Dict]:
+        """Fuse the dense ranking with the BM25 ranking of the same rows"""
+        lexical_rows, lexical_scores = self.lexical_index.top(
+            query_text, max(top_k, FUSION_DEPTH), rows
+        )
+        fused_rows, fused_scores = reciprocal_rank_fusion([dense_rows, lexical_rows])
+        fused_rows, fused_scores = fused_rows[:top_k], fused_scores[:top_k]
+
+        # Cosine similarity is still reported; score lexical-only hits exactly
+        cosine = dict(zip(dense_rows.tolist(), dense_scores.tolist()))
+        missing = np.array([row for row in fused_rows if row not in cosine])
+        if len(missing):
+            missing.sort()
+            exact = np.asarray(self.embeddings[missing] @ query)
+            cosine.update(zip(missing.tolist(), exact.tolist()))
+        lexical = dict(zip(lexical_rows.tolist(), lexical_scores.tolist()))
 
+        results = []
+        for row, fused in zip(fused_rows.tolist(), fused_scores):
+            result = self._make_result(row, cosine[row])
+            result["fused_score"] = float(fused)
+            result["lexical_score"] = lexical.get(row, 0.0)
             results.append(result)
-
         return results
 
-    def search(self, chapter_info: str) -> List[Dict]:
-        """Search based on chapter information"""
-        # Create a comprehensive query from chapter info
-
-        # Combine into query
-        full_query = " ".join(chapter_info)
+    def _lexical_candidates(
+        self, query_text: str, rows: Optional[np.ndarray], top_k: int
+    ) -> Optional[np.ndarray]:
+        """Rows that match the query lexically, or ``rows`` if too few do"""
+        candidates, _ = self.lexical_index.top(query_text, self.lexical_prefilter, rows)
+        return np.sort(candidates) if len(candidates) >= top_k else rows
+
+    @property
+    def uses_ann(self) -> bool:
+        """Whether searches go through the ANN index instead of a full scan"""
+        return self.ann_index is not None and len(self.df) >= self.ann_min_rows
+
+    @staticmethod
+    def _restrict_to_candidates(
+        candidates: np.ndarray, rows: Optional[np.ndarray], top_k: int
+    ) -> Optional[np.ndarray]:
+        """Intersect ANN candidates with a row filter, or fall back to exact"""
+        if rows is not None:
+            candidates = np.intersect1d(candidates, rows)
+        # Too few candidates to fill top_k: search the filter exactly instead
+        return candidates if len(candidates) >= top_k else rows
+
+    def _first_pass(
+        self, query: np.ndarray, rows: Optional[np.ndarray], top_k: int
+    ) -> np.ndarray:
+        """Rank rows on the compact tier and keep the best for rescoring"""
+        approx = self.tier.score(query[None, :], rows)[0]
+        keep = top_k_indices(approx, max(self.rescore_candidates, top_k))
+        return keep if rows is None else rows[keep]
+
+    def _make_result(self, idx: int, score: float) -> Dict:
+        """Build the result dict for one knowledge base row"""
+        row = self.df.iloc[int(idx)]
+        return {
+            "score": float(score),
+            "row": int(idx),
+            "id": row["id"],
+            "combined_text": (
+                self.text_store.get(idx)
+                if self.text_store is not None
+                else row["combined_text"]
+            ),
+            "category_1": row["Category_1"],
+            "category_2": row["Category_2"],
+        }
+
+    def route_filters(
+        self, chapter: Optional[Dict], min_rows: int = DEFAULT_TOP_K
+    ) -> Optional[np.ndarray]:
+        """Choose the rows to search from the chapter's keywords and source hints
+
+        Returns None (search everything) when nothing matches or when the
+        filters would leave fewer than ``min_rows`` candidates.
+        """
+        if not chapter or self.filter_index is None:
+            return None
+
+        source_hints = chapter.get("source_hints") or {}
+        routing = self.filter_index.route(
+            chapter.get("keywords", []), source_hints.get("internal_files", [])
+        )
+        row_ids = self.filter_index.select(
+            categories=routing["categories"], sources=routing["sources"]
+        )
+        if row_ids is None:
+            return None
+
+        if len(row_ids) < min_rows:
+            print(
+                f"    • Filters matched only {len(row_ids)} entries, "
+                "searching the whole knowledge base"
+            )
+            return None
+
+        print(
+            f"    • Filtered to {len(row_ids):,}/{len(self.df):,} entries "
+            f"(categories: {routing['categories'] or 'any'}, "
+            f"sources: {routing['sources'] or 'any'})"
+        )
+        return row_ids
+
+    def search(self, chapter_info, chapter: Optional[Dict] = None) -> List[Dict]:
+        """Search based on chapter information
+
+        Args:
+            chapter_info: Query text, or the chapter dict itself
+            chapter: Chapter whose keywords and source hints select filters
+        """
+        if isinstance(chapter_info, dict):
+            chapter = chapter if chapter is not None else chapter_info
+            full_query = chapter_search_query(chapter_info)
+        elif isinstance(chapter_info, str):
+            full_query = chapter_info
+        else:
+            full_query = " ".join(chapter_info)
 
-        # Check if we should filter by category based on chapter keywords (TODO)
-        category_filter = None
+        row_ids = self.route_filters(chapter, min_rows=DEFAULT_TOP_K)
 
-        return self.semantic_search(full_query, category_filter=None)
+        return self.semantic_search(full_query, top_k=DEFAULT_TOP_K, row_ids=row_ids)
 
     def format_results(self, results: List[Dict]) -> str:
         """Format search results for inclusion in research prompt"""
@@ -134,7 +727,9 @@ class KnowledgeBaseQuerier:
         formatted += f"*Found {len(results)} highly relevant entries*\n"
 
         for i, result in enumerate(results, 1):
-            formatted += f"\n**Entry {i}** (Similarity: {result['score']:.3f})\n"
+            # Lexical-only hits have no cosine similarity, only BM25 relevance
+            score = result.get("lexical_relevance", result["score"])
+            formatted += f"\n**Entry {i}** (Similarity: {score:.3f})\n"
             formatted += f"- ID: {result['id']}\n"
             formatted += f"- Categories: {result['category_1']}"
 
@@ -143,8 +738,8 @@ class KnowledgeBaseQuerier:
             formatted += "\n"
 
             # Include full text for high similarity scores, truncate for lower scores
-            text = result["combined_text"]
-            if result["score"] > 0.7:
+            text = expand_windows(result["combined_text"], result.get("windows"))
+            if score > 0.7:
                 formatted += f"- Content: {text}\n"
             elif len(text) > 800:
                 formatted += f"- Content: {text[:800]}...\n"
@@ -1,12 +1,108 @@
+import re
+import threading
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional
+import numpy as np
+from agent.researcher.bm25 import BM25Index
+from agent.researcher.context_packer import count_tokens
+from agent.researcher.embedding_cache import get_cached_embeddings
+
+# Sections longer than this are split further at paragraph boundaries
+MAX_SECTION_TOKENS = 800
+
+_HEADER_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+# Sections of each file by (path, mtime_ns), with their embeddings once computed
+_sections_cache: Dict = {}
+_cache_lock = threading.Lock()
+
+
+def split_sections(content: str) -> List[Dict]:
+    """Split markdown along header boundaries
+
+    Each section holds its heading path (e.g. "Overview > Scope"), its text
+    (header line included) and its position in the file.
+    """
+    sections = []
+    path: List[str] = []
+    lines: List[str] = []
+    in_fence = False
+
+    def flush():
+        text = "\n".join(lines).strip()
+        if text:
+            sections.append(
+                {"heading": " > ".join(path) or "Introduction", "text": text}
+            )
+
+    for line in content.splitlines():
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADER_RE.match(line)
+        # A header directly followed by a subheader stays with its subsection
+        if match and any(l.strip() and not _HEADER_RE.match(l) for l in lines):
+            flush()
+            lines = []
+        if match:
+            level = len(match.group(1))
+            path = path[: level - 1] + [match.group(2)]
+        lines.append(line)
+    flush()
+
+    parts = []
+    for section in sections:
+        parts.extend(_split_long(section))
+    for position, section in enumerate(parts):
+        section["position"] = position
+    return parts
+
+
+def _split_long(section: Dict) -> List[Dict]:
+    """Split an oversized section at blank lines into parts of bounded size"""
+    if count_tokens(section["text"]) <= MAX_SECTION_TOKENS:
+        return [section]
+
+    parts, current, current_tokens = [], [], 0
+    for paragraph in re.split(r"\n\s*\n", section["text"]):
+        tokens = count_tokens(paragraph)
+        if current and current_tokens + tokens > MAX_SECTION_TOKENS:
+            parts.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += tokens
+    if current:
+        parts.append("\n\n".join(current))
+
+    return [
+        {
+            "heading": (
+                section["heading"]
+                if i == 0
+                else f"{section['heading']} (cont. {i + 1})"
+            ),
+            "text": text,
+        }
+        for i, text in enumerate(parts)
+    ]
 
 
 class MarkdownProcessor:
-    """Process markdown files - include entire content without chunking"""
+    """Process markdown research files
+
+    Files are split along their headers and only the sections relevant to
+    the chapter are retrieved, within a token budget. Sections are cached
+    per file path and modification time, and embedded once through the
+    embedding cache. ``process_research_file`` still returns a whole file.
+    """
 
-    def __init__(self):
-        pass
+    def __init__(
+        self,
+        embedding_model: str = "text-embedding-3-large",
+        allow_embedding: bool = True,
+    ):
+        self.embeddings = get_cached_embeddings(embedding_model)
+        self.allow_embedding = allow_embedding
 
     def process_research_file(self, md_file: str, chapter_info: Dict) -> str:
         """Read and return the entire markdown file content"""
@@ -32,6 +128,113 @@ class MarkdownProcessor:
             print(f"  - Error reading markdown file: {e}")
             return ""
 
+    def load_sections(self, md_file: str) -> Optional[Dict]:
+        """Sections of a file, re-split only when the file changes"""
+        file_path = Path(md_file)
+        if not file_path.exists():
+            print(f"  - Warning: Markdown file not found: {md_file}")
+            return None
+
+        key = (str(file_path.resolve()), file_path.stat().st_mtime_ns)
+        with _cache_lock:
+            entry = _sections_cache.get(key)
+        if entry is not None:
+            return entry
+
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except Exception as e:
+            print(f"  - Error reading markdown file: {e}")
+            return None
+
+        sections = split_sections(content)
+        entry = {
+            "sections": sections,
+            "tokens": np.array([count_tokens(s["text"]) for s in sections]),
+            "vectors": None,
+            "lexical_index": BM25Index.build(
+                f"{s['heading']}\n{s['text']}" for s in sections
+            ),
+        }
+        print(
+            f"  - Indexed research file: {file_path.name} "
+            f"({len(sections)} sections, {int(entry['tokens'].sum()):,} tokens)"
+        )
+        with _cache_lock:
+            # Drop entries of older versions of the same file
+            for old_key in [k for k in _sections_cache if k[0] == key[0]]:
+                del _sections_cache[old_key]
+            _sections_cache[key] = entry
+        return entry
+
+    def retrieve_sections(
+        self,
+        md_file: str,
+        query: str,
+        query_vector: Optional[np.ndarray],
+        budget_tokens: int,
+    ) -> List[Dict]:
+        """Most relevant sections of a file that fit the budget, in file order
+
+        Sections are ranked by cosine similarity to ``query_vector``, or by
+        BM25 when there is no query vector or the sections cannot be embedded.
+        """
+        entry = self.load_sections(md_file)
+        if not entry or not entry["sections"]:
+            return []
+
+        scores = None
+        if query_vector is not None:
+            vectors = self._section_vectors(entry)
+            if vectors is not None:
+                # Not in place: callers share the query vector across files
+                direction = np.asarray(query_vector, dtype=np.float32)
+                direction = direction / max(float(np.linalg.norm(direction)), 1e-12)
+                scores = vectors @ direction
+        if scores is None:
+            lexical = entry["lexical_index"].scores(query)
+            scores = lexical / lexical.max() if lexical.max() > 0 else lexical
+
+        selected, used = [], 0
+        for i in np.argsort(-scores, kind="stable"):
+            if used + entry["tokens"][i] <= budget_tokens:
+                selected.append(int(i))
+                used += int(entry["tokens"][i])
+
+        total = int(entry["tokens"].sum())
+        print(
+            f"    • {Path(md_file).name}: {len(selected)}/{len(entry['sections'])} "
+            f"sections, {used:,}/{total:,} tokens"
+        )
+        return [
+            {**entry["sections"][i], "score": float(scores[i])}
+            for i in sorted(selected)
+        ]
+
+    def _section_vectors(self, entry: Dict) -> Optional[np.ndarray]:
+        """Normalised section embeddings, computed on first use"""
+        if entry["vectors"] is not None:
+            return entry["vectors"]
+
+        texts = [f"{s['heading']}\n{s['text']}" for s in entry["sections"]]
+        try:
+            if self.allow_embedding:
+                vectors = self.embeddings.embed_documents(texts)
+            else:
+                vectors = self.embeddings.cached_vectors(texts)
+                if any(vector is None for vector in vectors):
+                    return None
+        except Exception as e:
+            print(f"    • Section embedding failed, ranking lexically: {e}")
+            return None
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        entry["vectors"] = vectors / norms
+        return entry["vectors"]
+
     def format_content(self, content: str, filename: str) -> str:
         """Format the markdown content for inclusion in research prompt"""
         if not content:
@@ -0,0 +1,44 @@
+from typing import Dict
+from agent.state import ResearcherState
+from agent.researcher.compression import (
+    DEFAULT_TARGET_RATIO,
+    ContextCompressor,
+    print_compression_report,
+)
+from agent.researcher.federated import FederatedKnowledgeBase
+from agent.researcher.knowledge_base import chapter_search_query
+
+
+def compress_context_node(state: ResearcherState) -> Dict:
+    """Cut retrieved chunks down to their sentences relevant to the chapter"""
+
+    print("\n--- ✂️ COMPRESS CONTEXT NODE ---")
+
+    if not state.get("context_compression", True):
+        print("  - Context compression disabled")
+        return {}
+
+    chapter = state["current_chapter"]
+    context_items = state["raw_search_results"]
+
+    # The chapter query was embedded for retrieval, so this is a cache hit
+    federated = FederatedKnowledgeBase.from_state(state)
+    query_vector = federated.embed_queries([chapter_search_query(chapter)])[0]
+    if query_vector is None:
+        print("  - No query embedding available, keeping chunks whole")
+        return {}
+
+    compressor = ContextCompressor(
+        federated,
+        query_vector,
+        target_ratio=state.get("compression_target_ratio", DEFAULT_TARGET_RATIO),
+        # Lexical and cached modes must not call the embeddings API
+        allow_embedding=federated.retrieval_mode in ("hybrid", "dense"),
+    )
+    compressed, report = compressor.compress(context_items)
+    print_compression_report(report)
+
+    chapter_works = state["chapter_works"]
+    chapter_works[state["current_chapter_id"]]["compression_report"] = report
+
+    return {"raw_search_results": compressed, "chapter_works": chapter_works}
@@ -0,0 +1,166 @@
+from typing import Dict, List
+from pathlib import Path
+from agent.state import ContextItem, ResearcherState
+from agent.researcher.compression import (
+    DEFAULT_TARGET_RATIO,
+    ContextCompressor,
+    print_compression_report,
+)
+from agent.researcher.context_packer import (
+    budget_for,
+    kb_items,
+    pack_context,
+    pack_report,
+    print_pack_report,
+    render_context,
+    section_items,
+)
+from agent.researcher.federated import FederatedKnowledgeBase
+from agent.researcher.md_processor import MarkdownProcessor
+from agent.researcher.researcher_prompts import DELTA_RESEARCH_PROMPT
+from utils.llm_config import get_llm
+from utils.token_tracker import (
+    create_token_usage,
+    update_total_tokens,
+    print_token_usage,
+)
+
+# Knowledge base candidates retrieved per source for the feedback
+DELTA_KB_CANDIDATES = 10
+
+DELTA_HEADING = "=== ADDITIONAL CONTEXT FOR REVIEW FEEDBACK ==="
+
+
+def route_research(state: ResearcherState) -> str:
+    """Route a rejected chapter with existing research to the delta path"""
+    current_work = state["current_work"]
+    incremental = (
+        state.get("incremental_rewrite", True)
+        and current_work.get("review_decision") == "reject"
+        and current_work.get("research_results")
+        and current_work.get("context_report")
+    )
+    return "delta" if incremental else "full"
+
+
+def delta_research_node(state: ResearcherState) -> Dict:
+    """Retrieve context for the review feedback and merge it into the research
+
+    The research of the previous pass is kept. Only the knowledge bases and
+    research file sections are searched again, with the feedback as query;
+    entries already packed in the previous pass are skipped. In direct mode
+    the new context is appended to the research as is, otherwise a short LLM
+    call turns it into additional notes.
+    """
+
+    print("\n--- 🔁 DELTA RESEARCH NODE ---")
+
+    chapter = state["current_chapter"]
+    chapter_id = state["current_chapter_id"]
+    chapter_works = state["chapter_works"]
+    current_work = chapter_works[chapter_id]
+    feedback = current_work.get("review_feedback") or ""
+    query = f"{chapter['heading_label']}: {feedback}"
+    print(f"  - Retrieving context for review feedback: {feedback}")
+
+    # Everything packed in earlier passes is already part of the research
+    known = {
+        (item["source"], item["id"])
+        for item in current_work["context_report"]["packed"]
+    }
+
+    federated = FederatedKnowledgeBase.from_state(state)
+    context_items: List[ContextItem] = kb_items(
+        federated.search(query, chapter, top_k=DELTA_KB_CANDIDATES)
+    )
+
+    # Whole research files are already in the research in full mode
+    research_files = chapter.get("research_files", [])
+    query_vector = None
+    if research_files and state.get("research_files_mode") != "full":
+        query_vector = federated.embed_queries([query])[0]
+        md_processor = MarkdownProcessor(
+            state.get("embedding_model", "text-embedding-3-large"),
+            allow_embedding=federated.retrieval_mode in ("hybrid", "dense"),
+        )
+        for md_file in research_files:
+            sections = md_processor.retrieve_sections(
+                md_file, query, query_vector, budget_for(state, "documents")
+            )
+            context_items.extend(section_items(Path(md_file).name, sections))
+
+    new_items = [i for i in context_items if (i["source"], i["id"]) not in known]
+    print(
+        f"  - {len(new_items)} new context items "
+        f"({len(context_items) - len(new_items)} already in the research)"
+    )
+    if not new_items:
+        print("  - Keeping the previous research")
+        return {"chapter_works": chapter_works}
+
+    if state.get("context_compression", True) and query_vector is None:
+        # Embedded by the knowledge base search above, so a cache hit
+        query_vector = federated.embed_queries([query])[0]
+    if query_vector is not None and state.get("context_compression", True):
+        compressor = ContextCompressor(
+            federated,
+            query_vector,
+            target_ratio=state.get("compression_target_ratio", DEFAULT_TARGET_RATIO),
+            allow_embedding=federated.retrieval_mode in ("hybrid", "dense"),
+        )
+        new_items, report = compressor.compress(new_items)
+        print_compression_report(report)
+
+    packed = pack_context(
+        new_items, budget_for(state, "rewrite"), state.get("context_min_per_source")
+    )
+    print_pack_report(packed)
+    sources = render_context(packed["items"])
+
+    token_updates = {}
+    if current_work.get("research_mode") == "direct":
+        addition = f"{DELTA_HEADING}\n\n{sources}"
+    else:
+        styleguide = state.get("styleguide", {})
+        prompt = DELTA_RESEARCH_PROMPT.format(
+            chapter_title=chapter["heading_label"],
+            tone_and_style=styleguide.get("overall_tone_and_style", "Professional"),
+            feedback=feedback,
+            sources=sources,
+        )
+        print("  - Calling LLM for delta research...")
+        response = get_llm().invoke(prompt)
+        usage_metadata = response.response_metadata.get("token_usage", {})
+        token_usage = create_token_usage(
+            usage_metadata.get("prompt_tokens", 0),
+            usage_metadata.get("completion_tokens", 0),
+        )
+        print_token_usage(token_usage, "Delta Research Token Usage")
+
+        # Keep the usage of every rewrite, like the reviewer does
+        previous = sum(
+            1 for key in current_work["token_usage"] if key.startswith("researcher_")
+        )
+        operation_name = f"researcher_delta_{previous + 1}"
+        current_work["token_usage"][operation_name] = token_usage
+        token_updates = update_total_tokens(
+            state, token_usage, operation_name, chapter_id
+        )
+        addition = f"{DELTA_HEADING}\n\n{response.content}"
+
+    research = f"{current_work['research_results']}\n\n{addition}"
+    report = pack_report(packed)
+    current_work["research_results"] = research
+    current_work["context_report"] = {
+        **current_work["context_report"],
+        "packed": current_work["context_report"]["packed"] + report["packed"],
+        "delta_reports": current_work["context_report"].get("delta_reports", [])
+        + [report],
+    }
+    print(f"  - Research extended to {len(research):,} characters")
+
+    return {
+        "chapter_works": chapter_works,
+        "research_results": research,
+        **token_updates,
+    }
@@ -1,5 +1,14 @@
 from typing import Dict
 from agent.state import ResearcherState
+from agent.researcher.context_packer import (
+    budget_for,
+    delivered_sources,
+    pack_context,
+    pack_report,
+    print_pack_report,
+    render_context,
+)
+from agent.researcher.digest import chapter_digest_items
 from agent.researcher.prompt_builder import ResearchPromptBuilder
 from utils.llm_config import get_llm
 from utils.token_tracker import (
@@ -8,40 +17,75 @@ from utils.token_tracker import (
     print_token_usage,
 )
 
+# synthesize: the researcher LLM summarises the context for the writer;
+# direct: the packed context goes straight to the writer; auto: direct when
+# the context fits the writer's budget, synthesize otherwise
+RESEARCH_MODES = ("synthesize", "direct", "auto")
+
 
 def format_research_node(state: ResearcherState) -> Dict:
-    """Format all search results and call LLM to generate research"""
+    """Format all search results and call LLM to generate research
+
+    Depending on ``research_mode``, the LLM synthesis is skipped and the
+    packed context becomes the research passed to the writer.
+    """
 
     print("\n--- 📝 FORMAT RESEARCH NODE ---")
 
     chapter = state["current_chapter"]
     current_work = state["current_work"]
-    raw_results = state["raw_search_results"]
-
-    # Combine all search results into formatted sections
-    research_content = []
-
-    if raw_results["web"]:
-        research_content.append("=== WEB SEARCH RESULTS ===")
-        research_content.append(raw_results["web"])
-        research_content.append("")
-
-    if raw_results["kb_primary"]:
-        research_content.append("=== PRIMARY KNOWLEDGE BASE ===")
-        research_content.append(raw_results["kb_primary"])
-        research_content.append("")
-
-    if raw_results["kb_ifrs"]:
-        research_content.append("=== IFRS KNOWLEDGE BASE ===")
-        research_content.append(raw_results["kb_ifrs"])
-        research_content.append("")
-
-    if raw_results["documents"]:
-        research_content.append("=== RESEARCH DOCUMENTS ===")
-        research_content.append(raw_results["documents"])
-        research_content.append("")
+    context_items = state["raw_search_results"]
+    chapter_id = state["current_chapter_id"]
+    chapter_works = state["chapter_works"]
 
-    combined_research = "\n".join(research_content)
+    mode = state.get("research_mode") or "synthesize"
+    if mode not in RESEARCH_MODES:
+        raise ValueError(
+            f"Unknown research mode '{mode}', expected one of {RESEARCH_MODES}"
+        )
+
+    # Research files digested before the loop contribute their relevant sections
+    if state.get("research_files_mode") != "full":
+        context_items = context_items + chapter_digest_items(state, chapter)
+
+    if mode != "synthesize":
+        # Fit the context into the writer's budget and hand it over as is
+        packed = pack_context(
+            context_items,
+            budget_for(state, "writer"),
+            state.get("context_min_per_source"),
+        )
+        overflow = any(i["reason"] == "over token budget" for i in packed["dropped"])
+        if mode == "direct" or not overflow:
+            print_pack_report(packed)
+            research = render_context(packed["items"])
+            print(
+                f"  - Direct context: {len(research):,} characters "
+                f"go to the writer, skipping research synthesis"
+            )
+            chapter_works[chapter_id]["research_results"] = research
+            chapter_works[chapter_id]["research_mode"] = "direct"
+            chapter_works[chapter_id]["context_report"] = pack_report(packed)
+            return {
+                "chapter_works": chapter_works,
+                "research_results": research,
+                "delivered_web_sources": delivered_sources(
+                    packed["items"], chapter_id, state.get("delivered_web_sources")
+                ),
+            }
+        print(
+            f"  - Context exceeds the writer budget "
+            f"({packed['budget']:,} tokens), synthesizing research"
+        )
+
+    # Fit the search results from all sources into the research token budget
+    packed = pack_context(
+        context_items,
+        budget_for(state, "research"),
+        state.get("context_min_per_source"),
+    )
+    print_pack_report(packed)
+    combined_research = render_context(packed["items"])
 
     # Build prompt using existing prompt builder
     prompt_builder = ResearchPromptBuilder(state, chapter, current_work)
@@ -64,11 +108,10 @@ def format_research_node(state: ResearcherState) -> Dict:
     print_token_usage(token_usage, "Researcher Token Usage")
 
     # Update state
-    chapter_id = state["current_chapter_id"]
-    chapter_works = state["chapter_works"]
-
     chapter_works[chapter_id]["research_results"] = response.content
+    chapter_works[chapter_id]["research_mode"] = "synthesize"
     chapter_works[chapter_id]["token_usage"]["researcher"] = token_usage
+    chapter_works[chapter_id]["context_report"] = pack_report(packed)
 
     # Update total tokens
     token_updates = update_total_tokens(state, token_usage, "researcher", chapter_id)
@@ -76,5 +119,8 @@ def format_research_node(state: ResearcherState) -> Dict:
     return {
         "chapter_works": chapter_works,
         "research_results": response.content,
+        "delivered_web_sources": delivered_sources(
+            packed["items"], chapter_id, state.get("delivered_web_sources")
+        ),
         **token_updates,
     }
@@ -0,0 +1,30 @@
+from typing import Dict
+from agent.state import ResearcherState
+from agent.researcher.web_kb import DEFAULT_WEB_KB_PATH, get_web_kb
+
+
+def promote_web_node(state: ResearcherState) -> Dict:
+    """Promote the chapter's cited web pages into the web knowledge base
+
+    Later chapters and runs then find them through the knowledge base search
+    instead of searching the web again.
+    """
+
+    print("\n--- 🛰️ PROMOTE WEB NODE ---")
+
+    if not state.get("web_kb", True):
+        print("  - Web knowledge base disabled")
+        return {}
+    # Promoted pages are embedded, which lexical and cached modes must not do
+    if (state.get("kb_retrieval_mode") or "hybrid") not in ("hybrid", "dense"):
+        print("  - Retrieval mode does not embed, not promoting web pages")
+        return {}
+
+    chapter_id = state["current_chapter_id"]
+    web_results = (state.get("cached_web_results") or {}).get(chapter_id) or []
+    get_web_kb().promote(
+        web_results,
+        state.get("web_kb_path") or DEFAULT_WEB_KB_PATH,
+        state.get("embedding_model", "text-embedding-3-large"),
+    )
+    return {}
@@ -1,14 +1,25 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 from pathlib import Path
-import anthropic
 from agent.state import ResearcherState
-from agent.researcher.knowledge_base import KnowledgeBaseQuerier
+from agent.researcher.context_packer import (
+    DEFAULT_KB_CANDIDATES,
+    budget_for,
+    document_items,
+    kb_items,
+    section_items,
+    web_items,
+)
+from agent.researcher.federated import FederatedKnowledgeBase
+from agent.researcher.knowledge_base import chapter_search_query
 from agent.researcher.md_processor import MarkdownProcessor
-import ast
-
-
-# Initialize Anthropic client
-client = anthropic.Anthropic()
+from agent.researcher.semantic_cache import get_semantic_cache
+from agent.researcher.web_cache import WEB_CACHE_MODES, get_web_cache
+from agent.researcher.web_kb import WEB_KB_SOURCE, get_web_kb
+from agent.researcher.web_search import perform_web_search
+from agent.researcher.web_sources import (
+    DEFAULT_WEB_SOURCE_MAX_AGE,
+    record_web_sources,
+)
 
 
 def search_all_node(state: ResearcherState) -> Dict:
@@ -22,181 +33,227 @@ def search_all_node(state: ResearcherState) -> Dict:
     # TODO: review chapter structure, overlapping info
 
     # Create a simple search query from purpose and key topics
-    purpose_text = " ".join(chapter.get("purpose", []))
-    key_topics_text = " ".join(chapter.get("key_topics", []))
-
-    search_query = f"Purpose: {purpose_text}\n\nKey topics: {key_topics_text}"
+    search_query = chapter_search_query(chapter)
 
     # Check if we already have web search results for this chapter
     cached_web_results = state.get("cached_web_results", {})
+    federated = FederatedKnowledgeBase.from_state(state)
 
     # 1. Web Search (with caching)
     if chapter_id in cached_web_results:
         print("  - Using cached web search results")
         web_results = cached_web_results[chapter_id]
     else:
-        print("  - Performing web search...")
-        web_results = perform_web_search(search_query)
+        web_results = cached_web_search(search_query, chapter, federated, state)
+        # Keep the pages found in the URL store, merged with earlier snippets
+        web_results = record_web_sources(web_results, chapter_id)
         # Cache the results
         cached_web_results[chapter_id] = web_results
 
-    # Initialize results container
-    all_results = {"web": "", "kb_primary": "", "kb_ifrs": "", "documents": ""}
+    # Initialize results container: scored context items from every source,
+    # packed into the token budget by format_research_node
+    context_items = []
 
-    # 1. Web Search
-    print("  - Performing web search...")
-    all_results["web"] = format_web_results(web_results)
-
-    # 2. Primary KB Search
-    print("  - Searching primary knowledge base...")
-    primary_kb_path = state.get(
-        "knowledge_base_path", "data/knowledge_base/df_with_embeddings_large.parquet"
+    # 1. Web Search (pages already given to earlier chapters are only referenced)
+    context_items.extend(
+        web_items(web_results, state.get("delivered_web_sources"), chapter_id)
     )
-    embedding_model = state.get("embedding_model", "text-embedding-3-large")
-
-    primary_querier = KnowledgeBaseQuerier(primary_kb_path, embedding_model)
-    primary_results = primary_querier.search(search_query)
 
-    if primary_results:
-        print(f"    • Found {len(primary_results)} entries")
-        # ADD: Display similarity scores
-        print("    • Similarity scores:")
-        for i, result in enumerate(primary_results[:10]):  # Show top 10
-            print(
-                f"      {i+1}. Score: {result['score']:.4f} - {result.get('Title_Heading', result.get('combined_text', '')[:50])}"
-            )
-        all_results["kb_primary"] = primary_querier.format_results(primary_results)
-
-    # 3. IFRS KB Search
-    print("  - Searching IFRS knowledge base...")
-    ifrs_kb_path = state.get(
-        "knowledge_base_additional_path",
-        "data/knowledge_base/ifrs_knowledge_base_with_embeddings.parquet",
-    )
+    # 2. Knowledge Base Search (all sources in one pass)
+    print("  - Searching knowledge bases...")
 
-    ifrs_querier = KnowledgeBaseQuerier(ifrs_kb_path, embedding_model)
-    ifrs_results = ifrs_querier.search(search_query)
+    # Results retrieved for the whole outline up front, if that stage ran
+    prefetched = state.get("prefetched_kb_results") or {}
+    if chapter_id in prefetched:
+        print("    • Using prefetched results")
+        kb_results = refresh_web_kb_results(
+            prefetched[chapter_id], search_query, chapter, federated
+        )
+    else:
+        kb_results = federated.search(
+            search_query, chapter, top_k=DEFAULT_KB_CANDIDATES
+        )
 
-    if ifrs_results:
-        print(f"    • Found {len(ifrs_results)} entries")
-        # Display similarity scores
+    if kb_results:
+        print(f"    • Found {len(kb_results)} entries")
         print("    • Similarity scores:")
-        for i, result in enumerate(ifrs_results[:10]):  # Show top 10
+        for i, result in enumerate(kb_results[:10]):  # Show top 10
             print(
-                f"      {i+1}. Score: {result['score']:.4f} - {result.get('combined_text', '')[:50]}"
+                f"      {i+1}. Score: {result['score']:.4f} [{result['source']}] - {result.get('combined_text', '')[:50]}"
             )
-        all_results["kb_ifrs"] = ifrs_querier.format_results(ifrs_results)
+        context_items.extend(kb_items(kb_results))
 
-    # 4. Research Documents
+    # 3. Research Documents
     print("  - Loading research documents...")
     research_files = chapter.get("research_files", [])
+    full_files = state.get("research_files_mode") == "full"
+    if not full_files:
+        # Digested files are added from their digest by format_research_node
+        digests = state.get("research_digests") or {}
+        research_files = [f for f in research_files if f not in digests]
 
     if research_files:
-        md_processor = MarkdownProcessor()
-        doc_contents = []
-
-        for md_file in research_files:
-            print(f"    • Processing: {md_file}")
-            content = md_processor.process_research_file(md_file, chapter)
-            if content:
-                formatted = md_processor.format_content(content, Path(md_file).name)
-                doc_contents.append(formatted)
+        md_processor = MarkdownProcessor(
+            state.get("embedding_model", "text-embedding-3-large"),
+            # Lexical and cached modes must not call the embeddings API
+            allow_embedding=federated.retrieval_mode in ("hybrid", "dense"),
+        )
 
-        all_results["documents"] = "\n\n".join(doc_contents)
+        if full_files:
+            doc_contents = {}
+            for md_file in research_files:
+                print(f"    • Processing: {md_file}")
+                content = md_processor.process_research_file(md_file, chapter)
+                if content:
+                    name = Path(md_file).name
+                    doc_contents[name] = md_processor.format_content(content, name)
+            context_items.extend(document_items(doc_contents))
+        else:
+            # Only the sections relevant to this chapter, per file budget
+            query_vector = federated.embed_queries([search_query])[0]
+            for md_file in research_files:
+                sections = md_processor.retrieve_sections(
+                    md_file,
+                    search_query,
+                    query_vector,
+                    budget_for(state, "documents"),
+                )
+                context_items.extend(section_items(Path(md_file).name, sections))
 
     # Store all results in state
     return {
-        "raw_search_results": all_results,
+        "raw_search_results": context_items,
         "cached_web_results": cached_web_results,  # Preserve cache in state
     }
 
 
-def perform_web_search(search_query: str) -> List[Dict]:
-    """Execute web searches for the query"""
-
-    search_queries = generate_search_queries(search_query)
-    search_results = []
-
-    for idx, query in enumerate(search_queries, 1):
-        try:
-            response = client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=2048,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"Please search for information about: {query}\n\nFocus on finding recent developments, best practices, and authoritative sources.",
-                    }
-                ],
-                tools=[
-                    {"type": "web_search_20250305", "name": "web_search", "max_uses": 3}
-                ],
-            )
-
-            result_text = ""
-            for content_block in response.content:
-                if hasattr(content_block, "type") and content_block.type == "text":
-                    result_text += content_block.text
-
-            search_results.append({"query": query, "response": result_text})
-
-        except Exception as e:
-            search_results.append({"query": query, "response": f"Error: {str(e)}"})
-
-    return search_results
-
-
-def generate_search_queries(search_query: str, num_queries: int = 3) -> List[str]:
-    """Generate search queries using LLM based on the search query string"""
-
-    prompt = f"""Based on the following information, generate {num_queries} diverse and specific web search queries that would help gather comprehensive information on this topic.
-
-Information:
-{search_query}
-
-Return ONLY a Python list of {num_queries} search query strings, no explanation needed.
-Example format: ["query 1", "query 2", "query 3"]"""
-
-    try:
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=256,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
+def cached_web_search(
+    search_query: str,
+    chapter: Dict,
+    federated: FederatedKnowledgeBase,
+    state: ResearcherState,
+) -> List[Dict]:
+    """Web search served from the persistent web cache when possible"""
+    # Queries generated for the whole outline up front, if that stage ran
+    search_queries = (state.get("chapter_search_queries") or {}).get(chapter["id"])
+
+    mode = state.get("web_cache_mode") or "read_write"
+    if mode not in WEB_CACHE_MODES:
+        raise ValueError(
+            f"Unknown web cache mode '{mode}', expected one of {WEB_CACHE_MODES}"
         )
+    if mode == "off":
+        if web_kb_covers(search_query, federated, state):
+            return []
+        return semantic_web_search(search_query, federated, search_queries, state)
+
+    web_cache = get_web_cache()
+    web_results = web_cache.get(
+        search_query,
+        chapter,
+        max_age=state.get("web_cache_ttl"),
+        frozen=mode == "frozen",
+    )
+    if web_results is not None:
+        print("  - Using web search results from the web cache")
+        return web_results
+
+    # Frozen runs replay the cache only, so they are reproducible
+    if mode == "frozen":
+        print("  - Web cache is frozen and has no results for this chapter")
+        return []
+
+    # Fresh pages of the web knowledge base reach the chapter via the KB search
+    if web_kb_covers(search_query, federated, state):
+        return []
+
+    web_results = semantic_web_search(search_query, federated, search_queries, state)
+    if web_results:
+        web_cache.put(search_query, web_results, chapter)
+    return web_results
+
+
+def refresh_web_kb_results(
+    kb_results: List[Dict],
+    search_query: str,
+    chapter: Dict,
+    federated: FederatedKnowledgeBase,
+) -> List[Dict]:
+    """Prefetched results with current hits of the web knowledge base
+
+    The prefetch runs before the chapter loop, so it misses pages promoted
+    since (which may have let the chapter skip its live web search). The
+    web shard is searched again and its hits replace the prefetched ones.
+    """
+    if WEB_KB_SOURCE not in federated.queriers:
+        return kb_results
+    web_hits = federated.subset([WEB_KB_SOURCE]).search(
+        search_query, chapter, top_k=DEFAULT_KB_CANDIDATES
+    )
+    by_source: Dict[str, List[Dict]] = {WEB_KB_SOURCE: web_hits}
+    for result in kb_results:
+        if result["source"] != WEB_KB_SOURCE:
+            by_source.setdefault(result["source"], []).append(result)
+    print(f"    • {len(web_hits)} current entries from the web knowledge base")
+    return federated.merge_rankings(by_source, DEFAULT_KB_CANDIDATES)
+
+
+def web_kb_covers(
+    search_query: str,
+    federated: FederatedKnowledgeBase,
+    state: ResearcherState,
+) -> bool:
+    """Whether the web knowledge base answers the chapter without a live search"""
+    if not state.get("web_kb", True):
+        return False
+    return get_web_kb().covers(
+        federated,
+        search_query,
+        max_age=state.get("web_kb_max_age"),
+        min_score=state.get("web_kb_min_score"),
+        min_hits=state.get("web_kb_min_hits"),
+    )
 
-        # Extract the list from response
-        response_text = response.content[0].text.strip()
-        print(f"    • LLM response: {response_text}")  # DEBUG
-
-        queries = ast.literal_eval(response_text)
-        print(f"    • Parsed queries: {queries}, type: {type(queries)}")  # DEBUG
 
-        if isinstance(queries, list) and len(queries) > 0:
-            return queries[:num_queries]
-        else:
+def semantic_web_search(
+    search_query: str,
+    federated: FederatedKnowledgeBase,
+    search_queries: Optional[List[str]] = None,
+    state: Optional[ResearcherState] = None,
+) -> List[Dict]:
+    """Web search, reusing the results of semantically close earlier queries
+
+    Queries searched recently (``web_source_max_age``) are answered with their
+    pages from the web source store instead of being searched again.
+    """
+    query_vector = None
+    if federated.semantic_cache_distance is not None:
+        query_vector = federated.embed_queries([search_query])[0]
+
+    if query_vector is not None:
+        cached = get_semantic_cache().lookup(
+            "web", query_vector, max_distance=federated.semantic_cache_distance
+        )
+        if cached:
             print(
-                f"    • Failed condition: is list? {isinstance(queries, list)}, has items? {len(queries) if isinstance(queries, list) else 'N/A'}"
+                f"  - Reusing web search results of {len(cached)} "
+                "similar chapter queries"
             )
+            # Merge the closest queries' results, skipping repeated queries
+            merged = {}
+            for results in cached:
+                for result in results:
+                    merged.setdefault(result["query"], result)
+            return list(merged.values())
 
-    except Exception as e:
-        print(f"    • Error generating queries with LLM: {e}")
-
-    # Should never reach here
-    raise Exception("Failed to generate valid search queries")
-
-
-def format_web_results(search_results: List[Dict]) -> str:
-    """Format web search results for inclusion in research"""
-
-    if not search_results:
-        return "No web search results available."
-
-    formatted_parts = []
-
-    for idx, result in enumerate(search_results, 1):
-        formatted_parts.append(f"--- Web Search {idx}: {result['query']} ---")
-        formatted_parts.append(result["response"])
-        formatted_parts.append("")  # Empty line between results
-
-    return "\n".join(formatted_parts)
+    print("  - Performing web search...")
+    web_results = perform_web_search(
+        search_query,
+        search_queries=search_queries,
+        source_max_age=(state or {}).get(
+            "web_source_max_age", DEFAULT_WEB_SOURCE_MAX_AGE
+        ),
+    )
+    if query_vector is not None and web_results:
+        get_semantic_cache().put("web", query_vector, web_results)
+    return web_results
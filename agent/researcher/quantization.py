@@ -0,0 +1,129 @@
+from pathlib import Path
+from typing import Optional
+import numpy as np
+
+# First-pass storage tiers; full-precision vectors are only used to rescore
+TIERS = ("trunc256", "trunc512", "trunc1024", "int8", "binary")
+
+# Candidates kept by the compact first pass for exact rescoring
+DEFAULT_RESCORE_CANDIDATES = 200
+
+# Rows scored per step, bounds the temporary float copy of int8/binary codes
+_SCORE_BATCH = 65_536
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class CompactTier:
+    """Compact copy of a KB's embeddings used for a cheap first-pass ranking
+
+    - ``truncN``: Matryoshka truncation to the first N dims, re-normalised
+    - ``int8``: per-row symmetric scalar quantisation
+    - ``binary``: 1 bit per dimension (sign), ranked by Hamming distance
+    """
+
+    def __init__(
+        self, name: str, codes: np.ndarray, scales: Optional[np.ndarray] = None
+    ):
+        if name not in TIERS:
+            raise ValueError(f"Unknown tier '{name}', expected one of {TIERS}")
+        self.name = name
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def nbytes(self) -> int:
+        return int(
+            self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        )
+
+    @classmethod
+    def build(cls, name: str, embeddings: np.ndarray) -> "CompactTier":
+        """Encode a (normalised) embedding matrix, in batches"""
+        n_rows, dim = embeddings.shape
+        scales = None
+
+        if name.startswith("trunc"):
+            dims = int(name[len("trunc") :])
+            if dims >= dim:
+                raise ValueError(f"Cannot truncate {dim}-dim embeddings to {dims}")
+            codes = np.empty((n_rows, dims), dtype=np.float32)
+        elif name == "int8":
+            codes = np.empty((n_rows, dim), dtype=np.int8)
+            scales = np.empty(n_rows, dtype=np.float32)
+        elif name == "binary":
+            codes = np.empty((n_rows, (dim + 7) // 8), dtype=np.uint8)
+        else:
+            raise ValueError(f"Unknown tier '{name}', expected one of {TIERS}")
+
+        for start in range(0, n_rows, _SCORE_BATCH):
+            batch = np.asarray(
+                embeddings[start : start + _SCORE_BATCH], dtype=np.float32
+            )
+            stop = start + len(batch)
+            if name.startswith("trunc"):
+                codes[start:stop] = _normalize(batch[:, : codes.shape[1]])
+            elif name == "int8":
+                row_max = np.abs(batch).max(axis=1)
+                row_max[row_max == 0] = 1.0
+                codes[start:stop] = np.round(batch / row_max[:, None] * 127)
+                scales[start:stop] = row_max / 127
+            else:
+                codes[start:stop] = np.packbits(batch > 0, axis=1)
+
+        return cls(name, codes, scales)
+
+    def score(
+        self, query_embeddings: np.ndarray, rows: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Approximate Q x N scores (higher is better) for all or some rows"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if self.name.startswith("trunc"):
+            queries = _normalize(queries[:, : self.codes.shape[1]])
+        elif self.name == "binary":
+            n_dims = queries.shape[1]
+            queries = np.packbits(queries > 0, axis=1)
+
+        n_rows = len(self.codes) if rows is None else len(rows)
+        scores = np.empty((len(queries), n_rows), dtype=np.float32)
+
+        for start in range(0, n_rows, _SCORE_BATCH):
+            stop = min(start + _SCORE_BATCH, n_rows)
+            batch_rows = slice(start, stop) if rows is None else rows[start:stop]
+            codes = self.codes[batch_rows]
+
+            if self.name == "binary":
+                # Hamming distance mapped onto the cosine range [-1, 1]
+                for i, query in enumerate(queries):
+                    hamming = np.bitwise_count(codes ^ query).sum(axis=1)
+                    scores[i, start:stop] = 1 - 2 * hamming / n_dims
+            elif self.name == "int8":
+                scores[:, start:stop] = (
+                    queries @ codes.T.astype(np.float32)
+                ) * self.scales[batch_rows]
+            else:
+                scores[:, start:stop] = queries @ codes.T
+
+        return scores
+
+    def save(self, kb_dir):
+        np.save(tier_path(kb_dir, self.name), self.codes)
+        if self.scales is not None:
+            np.save(tier_path(kb_dir, self.name, "scales"), self.scales)
+
+    @classmethod
+    def load(cls, kb_dir, name: str) -> "CompactTier":
+        """Load the tier into RAM; it is the part meant to stay resident"""
+        codes = np.load(tier_path(kb_dir, name))
+        scales_path = tier_path(kb_dir, name, "scales")
+        scales = np.load(scales_path) if scales_path.exists() else None
+        return cls(name, codes, scales)
+
+
+def tier_path(kb_dir, name: str, part: str = "codes") -> Path:
+    """File holding one part of a tier inside a compiled sidecar"""
+    return Path(kb_dir) / f"tier_{name}_{part}.npy"
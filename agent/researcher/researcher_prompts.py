@@ -41,3 +41,41 @@ IMPORTANT - Topics to AVOID in your research:
 Please provide detailed research summaries that will help write a {target_word_count}-word chapter.
 Your research should be thorough enough to support all the stated purposes and cover all key topics comprehensively.
 """
+
+DIGEST_SECTION_PROMPT = """
+You are building a reference digest of the research document '{filename}'.
+
+Summarise the section '{heading}' below for later use as research material.
+Keep every definition, figure, threshold, date and regulatory reference
+(e.g. paragraph numbers, guideline identifiers) exactly as written. Leave out
+repetition and filler. Use at most {max_words} words.
+
+Section:
+{text}
+"""
+
+DIGEST_OVERVIEW_PROMPT = """
+Below are the section digests of the research document '{filename}'.
+
+Write an overview of the whole document in at most {max_words} words: what it
+covers, its main conclusions, and which sections hold which kind of detail.
+
+Section digests:
+{summaries}
+"""
+
+DELTA_RESEARCH_PROMPT = """
+You are extending the research for the chapter '{chapter_title}' of a business
+document (tone and style: {tone_and_style}).
+
+A reviewer rejected the draft written from the existing research with this
+feedback:
+{feedback}
+
+The sources below were retrieved specifically for this feedback. Write
+additional research notes that address it, keeping definitions, figures and
+regulatory references exactly as written in the sources. Do not repeat
+general background; the existing research already covers the chapter.
+
+{sources}
+"""
@@ -0,0 +1,184 @@
+"""Semantic cache of retrieval results
+
+Sibling and parent/child chapters often produce nearly identical queries.
+Results are cached under the query embedding: a later query within
+``max_distance`` (cosine distance) of cached queries in the same namespace
+reuses their results instead of searching again. The caller merges and
+re-ranks the cached candidates against the new query.
+
+Entries carry a version (the knowledge base version for KB results); a lookup
+with another version drops the stale entries of that namespace.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 512
+
+# Cosine distance (1 - similarity) under which a cached query is reused
+DEFAULT_MAX_DISTANCE = 0.05
+
+# Cached entries merged into the candidate set of one lookup
+DEFAULT_MAX_MERGED = 3
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+class SemanticCache:
+    """Bounded LRU cache of results keyed by query-embedding proximity
+
+    Args:
+        max_entries: Entries kept before the least recently used is evicted
+        max_distance: Default cosine distance for a cached query to match
+        max_merged: Most matching entries returned by one lookup
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_distance: float = DEFAULT_MAX_DISTANCE,
+        max_merged: int = DEFAULT_MAX_MERGED,
+    ):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_merged = max_merged
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def lookup(
+        self,
+        namespace: Hashable,
+        vector,
+        version: Optional[str] = None,
+        max_distance: Optional[float] = None,
+    ) -> List[Any]:
+        """Values of the cached queries close to ``vector``, closest first
+
+        Only entries of the same namespace and version match; an empty list
+        is a miss.
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        query = _normalize(vector)
+
+        with self._lock:
+            counters = self._counters_for(namespace)
+            stale = [
+                entry_id
+                for entry_id, entry in self._entries.items()
+                if entry["namespace"] == namespace and entry["version"] != version
+            ]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            counters["invalidations"] += len(stale)
+
+            candidates = [
+                (entry_id, entry)
+                for entry_id, entry in self._entries.items()
+                if entry["namespace"] == namespace
+                and entry["vector"].shape == query.shape
+            ]
+            matches = []
+            if candidates:
+                similarities = np.stack([e["vector"] for _, e in candidates]) @ query
+                for position in np.argsort(-similarities, kind="stable"):
+                    if 1.0 - similarities[position] > max_distance:
+                        break
+                    matches.append(candidates[position])
+                    if len(matches) == self.max_merged:
+                        break
+
+            for entry_id, _ in matches:
+                self._entries.move_to_end(entry_id)
+            if matches:
+                counters["hits"] += 1
+                counters["merged"] += len(matches) > 1
+            else:
+                counters["misses"] += 1
+            return [entry["value"] for _, entry in matches]
+
+    def put(
+        self,
+        namespace: Hashable,
+        vector,
+        value: Any,
+        version: Optional[str] = None,
+    ):
+        """Cache the value of a query, evicting the least recently used"""
+        with self._lock:
+            self._counters_for(namespace)
+            self._entries[self._next_id] = {
+                "namespace": namespace,
+                "version": version,
+                "vector": _normalize(vector),
+                "value": value,
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._counters_for(evicted["namespace"])["evictions"] += 1
+
+    def invalidate(self, namespace: Optional[Hashable] = None):
+        """Drop the entries of one namespace, or every entry"""
+        with self._lock:
+            for entry_id in [
+                entry_id
+                for entry_id, entry in self._entries.items()
+                if namespace is None or entry["namespace"] == namespace
+            ]:
+                del self._entries[entry_id]
+
+    @staticmethod
+    def _kind(namespace: Hashable) -> str:
+        """Kind of result cached in a namespace (its first element if a tuple)"""
+        return str(namespace[0] if isinstance(namespace, tuple) else namespace)
+
+    def _counters_for(self, namespace: Hashable) -> Dict[str, int]:
+        return self._counters.setdefault(
+            self._kind(namespace),
+            {"hits": 0, "misses": 0, "merged": 0, "evictions": 0, "invalidations": 0},
+        )
+
+    def stats(self) -> Dict[str, Dict]:
+        """Hit rate and counters per kind of cached result"""
+        with self._lock:
+            stats = {}
+            for kind, counters in self._counters.items():
+                lookups = counters["hits"] + counters["misses"]
+                stats[kind] = {
+                    **counters,
+                    "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+                    "entries": sum(
+                        self._kind(entry["namespace"]) == kind
+                        for entry in self._entries.values()
+                    ),
+                }
+            return stats
+
+    def print_stats(self):
+        """Pretty print cache effectiveness"""
+        print("\n🧠 Semantic Result Cache:")
+        stats = self.stats()
+        if not stats:
+            print("  - No lookups")
+        for kind, entry in stats.items():
+            print(
+                f"  - {kind}: {entry['hits']:,} hits, {entry['misses']:,} misses "
+                f"(hit rate {entry['hit_rate']:.0%}, {entry['merged']:,} merged), "
+                f"{entry['entries']:,} entries, {entry['evictions']:,} evicted, "
+                f"{entry['invalidations']:,} invalidated"
+            )
+
+
+_semantic_cache = SemanticCache()
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Return the process-wide semantic result cache"""
+    return _semantic_cache
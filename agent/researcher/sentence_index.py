@@ -0,0 +1,274 @@
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+SENTENCE_EMBEDDINGS_FILE = "sentence_embeddings.npy"
+SENTENCE_SPANS_FILE = "sentence_spans.npy"
+SENTENCE_OFFSETS_FILE = "sentence_offsets.npy"
+SENTENCE_WINDOWS_FILE = "sentence_windows.npy"
+
+# Sentence vectors are Matryoshka-truncated to this many dims and stored as
+# float16; they only rank sentences within an already retrieved chunk
+DEFAULT_SENTENCE_DIMS = 256
+
+# Sentences on each side of a matched sentence returned as its context
+DEFAULT_WINDOW = 2
+
+# Sentences sent to the embeddings API per request while building
+EMBED_BATCH = 512
+
+# Sentence vectors scored per step when searching, bounds the float32 copy
+_SCORE_BATCH = 65_536
+
+GAP_MARKER = "[...]"
+
+# Sentence ends: terminal punctuation followed by a capitalised word (or a
+# number or bracket), a blank line, or a line starting a list item
+_BOUNDARY_RE = re.compile(
+    r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])"
+    r"|\n\s*\n"
+    r"|\n(?=\s*(?:[-*•]|\d+[.)])\s)"
+)
+
+# Words whose trailing period does not end a sentence
+_ABBREVIATIONS = frozenset(
+    "e.g i.e etc para paras no nos art arts cf vs fig ref sec approx incl "
+    "mr ms dr st".split()
+)
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Character spans of the sentences of a text"""
+    text = text or ""
+    spans = []
+    start = 0
+    for match in _BOUNDARY_RE.finditer(text):
+        before = text[start : match.start()]
+        last_word = before.rsplit(None, 1)[-1].rstrip(".").lower() if before else ""
+        abbreviated = last_word in _ABBREVIATIONS or (
+            len(last_word) == 1 and last_word.isalpha()
+        )
+        if before.endswith(".") and abbreviated and "\n" not in match.group():
+            continue
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, len(text)))
+
+    # Trim surrounding whitespace and drop empty pieces
+    trimmed = []
+    for begin, end in spans:
+        piece = text[begin:end]
+        stripped = piece.strip()
+        if stripped:
+            begin += len(piece) - len(piece.lstrip())
+            trimmed.append((begin, begin + len(stripped)))
+    return trimmed
+
+
+def truncate_vectors(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """First ``dims`` dimensions of each vector, re-normalised"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))[:, :dims]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def window_offsets(offsets: np.ndarray, window: int = DEFAULT_WINDOW) -> np.ndarray:
+    """(first, stop) sentence of each sentence's window, within its chunk"""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    chunk_start = np.repeat(offsets[:-1], counts)
+    chunk_stop = np.repeat(offsets[1:], counts)
+    units = np.arange(offsets[-1], dtype=np.int64)
+    return np.stack(
+        [
+            np.maximum(units - window, chunk_start),
+            np.minimum(units + window + 1, chunk_stop),
+        ],
+        axis=1,
+    ).astype(np.int32)
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merge overlapping or touching (start, stop) ranges"""
+    merged: List[Tuple[int, int]] = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def expand_windows(text: str, windows: List[Tuple[int, int]]) -> str:
+    """Text of the (character) windows of a chunk, marking what is left out"""
+    if not windows:
+        return text
+    parts = []
+    for start, stop in windows:
+        if start > 0 or parts:
+            parts.append(GAP_MARKER)
+        parts.append(text[start:stop])
+    if windows[-1][1] < len(text.rstrip()):
+        parts.append(GAP_MARKER)
+    return " ".join(parts)
+
+
+def sentence_index_exists(kb_dir) -> bool:
+    kb_dir = Path(kb_dir)
+    return all(
+        (kb_dir / name).exists()
+        for name in (
+            SENTENCE_EMBEDDINGS_FILE,
+            SENTENCE_SPANS_FILE,
+            SENTENCE_OFFSETS_FILE,
+        )
+    )
+
+
+def write_sentence_index(
+    kb_dir,
+    texts: Iterable[str],
+    embeddings,
+    dims: int = DEFAULT_SENTENCE_DIMS,
+    window: int = DEFAULT_WINDOW,
+) -> int:
+    """Split every chunk into sentences and store their embeddings
+
+    Args:
+        kb_dir: Sidecar directory to write into
+        texts: Chunk texts in matrix order
+        embeddings: Client with an ``embed_documents`` method
+        dims: Dimensions kept per sentence vector
+        window: Sentences on each side included in a sentence's window
+
+    Returns:
+        Number of sentences written
+    """
+    kb_dir = Path(kb_dir)
+    spans, offsets, sentences = [], [0], []
+    for text in texts:
+        text = text or ""
+        chunk_spans = split_sentences(text)
+        spans.extend(chunk_spans)
+        sentences.extend(text[begin:end] for begin, end in chunk_spans)
+        offsets.append(offsets[-1] + len(chunk_spans))
+
+    matrix = None
+    for start in range(0, len(sentences), EMBED_BATCH):
+        batch = truncate_vectors(
+            embeddings.embed_documents(sentences[start : start + EMBED_BATCH]), dims
+        )
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(
+                kb_dir / SENTENCE_EMBEDDINGS_FILE,
+                mode="w+",
+                dtype=np.float16,
+                shape=(len(sentences), batch.shape[1]),
+            )
+        matrix[start : start + len(batch)] = batch
+    if matrix is None:
+        np.save(kb_dir / SENTENCE_EMBEDDINGS_FILE, np.empty((0, dims), np.float16))
+    else:
+        matrix.flush()
+        del matrix
+
+    np.save(
+        kb_dir / SENTENCE_SPANS_FILE,
+        np.asarray(spans, dtype=np.int32).reshape(-1, 2),
+    )
+    np.save(kb_dir / SENTENCE_OFFSETS_FILE, np.asarray(offsets, dtype=np.int64))
+    np.save(kb_dir / SENTENCE_WINDOWS_FILE, window_offsets(offsets, window))
+    return len(sentences)
+
+
+class SentenceIndex:
+    """Precomputed sentence spans and embeddings of a compiled knowledge base
+
+    All arrays are memory-mapped. ``offsets`` maps each chunk row to its
+    range of sentences, and ``windows`` maps each sentence to the range of
+    sentences around it that is returned when the sentence matches.
+    """
+
+    def __init__(self, kb_dir):
+        kb_dir = Path(kb_dir)
+        self.embeddings = np.load(kb_dir / SENTENCE_EMBEDDINGS_FILE, mmap_mode="r")
+        self.spans = np.load(kb_dir / SENTENCE_SPANS_FILE, mmap_mode="r")
+        self.offsets = np.load(kb_dir / SENTENCE_OFFSETS_FILE, mmap_mode="r")
+        windows_path = kb_dir / SENTENCE_WINDOWS_FILE
+        # Indexes built before windows were stored get the default window
+        self.windows = (
+            np.load(windows_path, mmap_mode="r")
+            if windows_path.exists()
+            else window_offsets(self.offsets)
+        )
+        self.row_of = np.repeat(
+            np.arange(len(self.offsets) - 1, dtype=np.int32), np.diff(self.offsets)
+        )
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    @property
+    def dims(self) -> int:
+        return self.embeddings.shape[1]
+
+    def sentences(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Sentence spans and (float32) vectors of one chunk"""
+        start, stop = int(self.offsets[row]), int(self.offsets[row + 1])
+        return (
+            np.asarray(self.spans[start:stop]),
+            np.asarray(self.embeddings[start:stop], dtype=np.float32),
+        )
+
+    def units_of(self, rows: np.ndarray) -> np.ndarray:
+        """Sentences of the given chunk rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts, stops = self.offsets[rows], self.offsets[rows + 1]
+        if not len(rows):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(
+            [np.arange(start, stop) for start, stop in zip(starts, stops)]
+        )
+
+    def search(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int,
+        units: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Best matching sentences (Q x top_k) and their cosine scores"""
+        queries = truncate_vectors(query_embeddings, self.dims)
+        n_units = len(self) if units is None else len(units)
+        scores = np.empty((len(queries), n_units), dtype=np.float32)
+        for start in range(0, n_units, _SCORE_BATCH):
+            stop = min(start + _SCORE_BATCH, n_units)
+            batch_units = slice(start, stop) if units is None else units[start:stop]
+            vectors = np.asarray(self.embeddings[batch_units], dtype=np.float32)
+            scores[:, start:stop] = queries @ vectors.T
+
+        k = min(top_k, n_units)
+        if k == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        found = top if units is None else np.asarray(units)[top]
+        return found, np.take_along_axis(top_scores, order, axis=1)
+
+    def windows_of(self, units: np.ndarray) -> Dict[int, List[Tuple[int, int]]]:
+        """Merged character windows per chunk row for a set of matched sentences"""
+        by_row: Dict[int, List[Tuple[int, int]]] = {}
+        for unit in np.asarray(units, dtype=np.int64):
+            first, stop = (int(v) for v in self.windows[unit])
+            by_row.setdefault(int(self.row_of[unit]), []).append((first, stop))
+        return {
+            row: [
+                (int(self.spans[first][0]), int(self.spans[stop - 1][1]))
+                for first, stop in merge_ranges(ranges)
+            ]
+            for row, ranges in by_row.items()
+        }
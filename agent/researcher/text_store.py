@@ -0,0 +1,129 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List
+import numpy as np
+
+TEXTS_FILE = "texts.bin"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+
+# Chunks kept decoded in memory per knowledge base
+DEFAULT_TEXT_CACHE_SIZE = 1024
+
+
+def text_store_exists(kb_dir) -> bool:
+    kb_dir = Path(kb_dir)
+    return (kb_dir / TEXTS_FILE).exists() and (kb_dir / TEXT_OFFSETS_FILE).exists()
+
+
+def write_text_store(kb_dir, texts: Iterable[str]):
+    """Write chunk texts as one UTF-8 blob plus an (N + 1) byte-offset array"""
+    kb_dir = Path(kb_dir)
+    offsets = [0]
+    with open(kb_dir / TEXTS_FILE, "wb") as f:
+        for text in texts:
+            data = (text or "").encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(kb_dir / TEXT_OFFSETS_FILE, np.asarray(offsets, dtype=np.int64))
+
+
+class TextStore:
+    """Chunk texts of a compiled knowledge base, read on demand
+
+    The blob and the offsets are memory-mapped, so only the pages of rows
+    that are actually returned get read. Recently used chunks are kept in a
+    small LRU cache.
+    """
+
+    def __init__(self, kb_dir, cache_size: int = DEFAULT_TEXT_CACHE_SIZE):
+        kb_dir = Path(kb_dir)
+        self.offsets = np.load(kb_dir / TEXT_OFFSETS_FILE, mmap_mode="r")
+        blob_path = kb_dir / TEXTS_FILE
+        # np.memmap cannot map an empty file
+        self.blob = (
+            np.memmap(blob_path, dtype=np.uint8, mode="r")
+            if blob_path.stat().st_size
+            else np.empty(0, dtype=np.uint8)
+        )
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[int, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def cache_bytes(self) -> int:
+        """Approximate size of the decoded chunks held in the LRU cache"""
+        with self._lock:
+            return sum(len(text) for text in self._cache.values())
+
+    def get(self, row: int) -> str:
+        """Text of one row"""
+        row = int(row)
+        with self._lock:
+            text = self._cache.get(row)
+            if text is not None:
+                self._cache.move_to_end(row)
+                self.hits += 1
+                return text
+            self.misses += 1
+
+        start, stop = int(self.offsets[row]), int(self.offsets[row + 1])
+        text = bytes(self.blob[start:stop]).decode("utf-8")
+
+        with self._lock:
+            self._cache[row] = text
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return text
+
+    def get_many(self, rows: Iterable[int]) -> List[str]:
+        return [self.get(row) for row in rows]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "cached": len(self._cache),
+            }
+
+
+class SegmentedTextStore:
+    """Text lookup over the per-segment stores of a segmented knowledge base
+
+    Rows are numbered as in the concatenated (live) matrix; ``segment_of``
+    and ``local_row`` map each one back to its segment's own text store.
+    """
+
+    def __init__(
+        self, stores: List[TextStore], segment_of: np.ndarray, local_row: np.ndarray
+    ):
+        self.stores = stores
+        self.segment_of = segment_of
+        self.local_row = local_row
+
+    def __len__(self) -> int:
+        return len(self.segment_of)
+
+    @property
+    def cache_bytes(self) -> int:
+        return sum(store.cache_bytes for store in self.stores)
+
+    def get(self, row: int) -> str:
+        row = int(row)
+        return self.stores[self.segment_of[row]].get(self.local_row[row])
+
+    def get_many(self, rows: Iterable[int]) -> List[str]:
+        return [self.get(row) for row in rows]
+
+    def stats(self) -> Dict:
+        totals = {"hits": 0, "misses": 0, "cached": 0}
+        for store in self.stores:
+            for key, value in store.stats().items():
+                totals[key] += value
+        return totals
@@ -6,7 +6,8 @@ from utils.token_tracker import (
     update_total_tokens,
     print_token_usage,
 )
-from agent.researcher.knowledge_base import KnowledgeBaseQuerier
+from agent.researcher.federated import FederatedKnowledgeBase, knowledge_base_sources
+from agent.researcher.knowledge_base import chapter_search_query
 from agent.researcher.md_processor import MarkdownProcessor
 from agent.researcher.prompt_builder import ResearchPromptBuilder
 
@@ -42,95 +43,36 @@ def research_chapter(state: ResearcherState, llm) -> dict:
 
 def query_knowledge_base_semantic(chapter: Dict, state: ResearcherState) -> str:
     """Query the embeddings-based knowledge bases using semantic search"""
-    # Primary knowledge base
-    kb_path = state.get(
-        "knowledge_base_path", "data/knowledge_base/df_with_embeddings_large.parquet"
-    )
-    # IFRS knowledge base
-    ifrs_kb_path = state.get(
-        "knowledge_base_additional_path",
-        "data/knowledge_base/ifrs_knowledge_base_with_embeddings.parquet",
-    )
+    sources = knowledge_base_sources(state)
     embedding_model = state.get("embedding_model", "text-embedding-3-large")
 
     print("  - Querying knowledge bases:")
-    print(f"    • Primary: {kb_path}")
-    print(f"    • IFRS: {ifrs_kb_path}")
+    for name, kb_path in sources.items():
+        print(f"    • {name}: {kb_path}")
     print(f"  - Using embedding model: {embedding_model}")
 
     print(f"  - The input to search: {chapter}")
 
-    # Query primary knowledge base
-    kb_querier = KnowledgeBaseQuerier(kb_path, embedding_model)
-    primary_results = kb_querier.search(chapter)
-
-    if primary_results:
-        print(f"    • Found {len(primary_results)} entries")
-        print("    • Similarity scores:")
-        for i, result in enumerate(primary_results):
-            print(f"      {i+1}. Score: {result['score']:.4f}")
-
-    # Query IFRS knowledge base
-    ifrs_kb_querier = KnowledgeBaseQuerier(ifrs_kb_path, embedding_model)
-    ifrs_results = ifrs_kb_querier.search(chapter)
-
-    if ifrs_results:
-        print(f"    • Found {len(ifrs_results)} entries")
-        print("    • Similarity scores:")
-        for i, result in enumerate(ifrs_results):
-            print(f"      {i+1}. Score: {result['score']:.4f}")
-
-    # Combine results
-    all_results = []
-
-    if primary_results:
-        print(f"  - Found {len(primary_results)} relevant entries in primary KB")
-        # Show top 3 scores from primary
-        for i, result in enumerate(primary_results[:5]):
-            print(
-                f"    • Entry {result['id']}: similarity = {result['score']:.3f} ({result['category_1']})"
-            )
-        all_results.extend(primary_results)
-    else:
-        print("  - No relevant entries found in primary knowledge base")
-
-    if ifrs_results:
-        print(f"  - Found {len(ifrs_results)} relevant entries in IFRS KB")
-        # Show top 3 scores from IFRS
-        for i, result in enumerate(ifrs_results[:5]):
-            print(
-                f"    • IFRS Entry {result['id']}: similarity = {result['score']:.3f} ({result.get('category_1', 'IFRS')})"
-            )
-        all_results.extend(ifrs_results)
-    else:
-        print("  - No relevant entries found in IFRS knowledge base")
+    # One embedding and one ranked list across every knowledge base
+    federated = FederatedKnowledgeBase.from_state(state)
+    all_results = federated.search(
+        chapter_search_query(chapter), chapter, min_score=0.3
+    )
 
-    # Sort combined results by similarity score (descending)
     if all_results:
-        all_results.sort(key=lambda x: x["score"], reverse=True)
         print(f"  - Total combined entries: {len(all_results)}")
+        for result in all_results[:10]:
+            print(
+                f"    • [{result['source']}] Entry {result['id']}: similarity = {result['score']:.3f} ({result.get('category_1', '')})"
+            )
 
         # Format results with source indication
-        formatted_primary = kb_querier.format_results(
-            [r for r in all_results if r in primary_results]
-        )
-        formatted_ifrs = ifrs_kb_querier.format_results(
-            [r for r in all_results if r in ifrs_results]
-        )
-
-        # Combine formatted results with clear separation
-        combined_output = ""
-        if formatted_primary:
-            combined_output += "=== PRIMARY KNOWLEDGE BASE RESULTS ===\n"
-            combined_output += formatted_primary + "\n"
-
-        if formatted_ifrs:
-            if combined_output:
-                combined_output += "\n"
-            combined_output += "=== IFRS KNOWLEDGE BASE RESULTS ===\n"
-            combined_output += formatted_ifrs
-
-        return combined_output
+        sections = [
+            f"=== {source.upper()} KNOWLEDGE BASE RESULTS ===\n{formatted}"
+            for source, formatted in federated.format_results(all_results).items()
+            if formatted
+        ]
+        return "\n\n".join(sections)
     else:
         print("  - No relevant entries found in any knowledge base")
         return ""
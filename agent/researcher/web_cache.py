@@ -0,0 +1,200 @@
+"""Persistent cache of web search results
+
+Results are stored in SQLite, keyed by the normalised search query and a hash
+of the chapter spec it was built from, so they survive subgraph invocations
+and runs. Entries expire after ``ttl_seconds``, and the least recently used
+are evicted once the stored results exceed ``max_bytes``.
+
+Modes: ``read_write`` (default) serves fresh entries and stores new results;
+``frozen`` replays cached results only, expired or not, and never searches,
+for reproducible regeneration; ``off`` bypasses the cache.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from agent.researcher.embedding_cache import normalize_text
+
+DEFAULT_WEB_CACHE_PATH = "data/cache/web_search.sqlite"
+DEFAULT_WEB_CACHE_MAX_BYTES = 64 * 1024**2
+DEFAULT_WEB_CACHE_TTL = 7 * 24 * 3600
+
+WEB_CACHE_MODES = ("read_write", "frozen", "off")
+
+# Chapter fields that shape the web search, hashed into the cache key
+CHAPTER_SPEC_FIELDS = ("heading_label", "purpose", "key_topics", "keywords")
+
+
+def chapter_spec_hash(chapter: Optional[Dict]) -> str:
+    """Hash of the chapter fields the web search is derived from"""
+    spec = {field: (chapter or {}).get(field) for field in CHAPTER_SPEC_FIELDS}
+    payload = json.dumps(spec, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def web_cache_key(query: str, chapter: Optional[Dict] = None) -> str:
+    """Content address of a web search: normalised query and chapter spec"""
+    payload = f"{normalize_text(query).lower()}\x1f{chapter_spec_hash(chapter)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class WebSearchCache:
+    """Web search results stored as JSON in SQLite, with TTL and LRU eviction"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_WEB_CACHE_PATH,
+        ttl_seconds: float = DEFAULT_WEB_CACHE_TTL,
+        max_bytes: int = DEFAULT_WEB_CACHE_MAX_BYTES,
+    ):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS web_results (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                results TEXT NOT NULL,
+                nbytes INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_web_results_last_used ON web_results(last_used)"
+        )
+        self._conn.commit()
+
+    def get(
+        self,
+        query: str,
+        chapter: Optional[Dict] = None,
+        max_age: Optional[float] = None,
+        frozen: bool = False,
+    ) -> Optional[List[Dict]]:
+        """Cached results of a search, or None on a miss
+
+        Entries older than ``max_age`` (the cache TTL by default) count as
+        misses unless ``frozen``, which replays whatever is stored.
+        """
+        max_age = self.ttl_seconds if max_age is None else max_age
+        key = web_cache_key(query, chapter)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, created FROM web_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            results, created = row
+            if not frozen and now - created > max_age:
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE web_results SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(results)
+
+    def put(self, query: str, results: List[Dict], chapter: Optional[Dict] = None):
+        """Store the results of a search, evicting the least recently used"""
+        blob = json.dumps(results, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO web_results VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    web_cache_key(query, chapter),
+                    normalize_text(query),
+                    blob,
+                    len(blob.encode("utf-8")),
+                    now,
+                    now,
+                ),
+            )
+            self.stores += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop expired entries, then the least recently used until under budget"""
+        self._conn.execute(
+            "DELETE FROM web_results WHERE created < ?",
+            (time.time() - self.ttl_seconds,),
+        )
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(nbytes), 0) FROM web_results"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        evict, freed = [], 0
+        for key, nbytes in self._conn.execute(
+            "SELECT key, nbytes FROM web_results ORDER BY last_used"
+        ).fetchall():
+            if total - freed <= self.max_bytes:
+                break
+            evict.append(key)
+            freed += nbytes
+        self._conn.executemany(
+            "DELETE FROM web_results WHERE key = ?", [(key,) for key in evict]
+        )
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM web_results"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "stored": self.stores,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": size,
+            }
+
+    def print_stats(self):
+        """Pretty print cache effectiveness"""
+        stats = self.stats()
+        print("\n🌐 Web Search Cache:")
+        print(
+            f"  - Hits: {stats['hits']:,}, misses: {stats['misses']:,} "
+            f"(hit rate {stats['hit_rate']:.0%}, {stats['expired']:,} expired)"
+        )
+        print(
+            f"  - Stored: {stats['entries']:,} searches, "
+            f"{stats['bytes'] / 1024 ** 2:,.1f} MB"
+        )
+
+
+_web_cache: Optional[WebSearchCache] = None
+_lock = threading.Lock()
+
+
+def get_web_cache() -> WebSearchCache:
+    """Return the process-wide web search cache"""
+    global _web_cache
+    with _lock:
+        if _web_cache is None:
+            _web_cache = WebSearchCache()
+        return _web_cache
@@ -0,0 +1,229 @@
+"""Web search findings promoted into a local knowledge base shard
+
+Every page cited by a web search is written, with its cited passages, to a
+segmented knowledge base (``data/knowledge_base/web.kbseg`` by default) that
+is searched as the "web" source next to the other knowledge bases. A row
+holds the page title, URL and first retrieval date; its chunk id is derived
+from the URL and content, so unchanged pages are never appended twice and
+a page with new passages replaces its previous row.
+
+Before searching the web, a chapter asks the shard first. If enough fresh
+pages match well enough (see ``covers``), the live search is skipped and
+the shard's results come in through the knowledge base search. A page is
+fresh while its last retrieval, kept in the web source store, is younger
+than ``max_age``; stale pages do not count, so the chapter searches live
+and the page is refreshed.
+"""
+
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+from agent.researcher.kb_registry import get_knowledge_base
+from agent.researcher.kb_segments import SegmentedKnowledgeBase, is_segmented_kb
+from agent.researcher.web_sources import get_web_source_store
+
+DEFAULT_WEB_KB_PATH = "data/knowledge_base/web.kbseg"
+WEB_KB_SOURCE = "web"
+
+# Cited text a page needs before it is promoted (characters)
+WEB_KB_MIN_CHARS = 200
+
+# Freshness policy: pages must be younger than this (seconds), match with at
+# least this cosine similarity, and be this many to skip the live search
+DEFAULT_WEB_KB_MAX_AGE = 30 * 24 * 3600
+DEFAULT_WEB_KB_MIN_SCORE = 0.5
+DEFAULT_WEB_KB_MIN_HITS = 3
+
+# Segments after which the shard is compacted in the background
+WEB_KB_COMPACT_SEGMENTS = 16
+
+
+def web_kb_rows(results: List[Dict]) -> pd.DataFrame:
+    """Knowledge base rows for the cited pages of web results
+
+    Pages whose passages are shorter than ``WEB_KB_MIN_CHARS`` in total are
+    left out, as are pages found by several queries after the first.
+    """
+    rows = {}
+    for result in results:
+        for source in result.get("sources") or []:
+            snippets = source.get("snippets") or []
+            if source["url"] in rows or sum(map(len, snippets)) < WEB_KB_MIN_CHARS:
+                continue
+            retrieved = source.get("first_retrieved") or source.get("retrieved")
+            text = (
+                f"{source['title']}\n"
+                f"Source: {source['url']} (retrieved {str(retrieved)[:10]})\n\n"
+                + "\n\n".join(snippets)
+            )
+            digest = hashlib.sha256(
+                f"{source['url']}\x1f{text}".encode("utf-8")
+            ).hexdigest()
+            rows[source["url"]] = {
+                "id": f"web_{digest[:16]}",
+                "combined_text": text,
+                "Category_1": "Web",
+                "Category_2": urlparse(source["url"]).netloc or "Web",
+                "source_file": source["url"],
+            }
+    return pd.DataFrame(list(rows.values()))
+
+
+class WebKnowledgeBase:
+    """Promotes web findings into the web shard and checks its coverage"""
+
+    def __init__(self):
+        self.promoted = 0
+        self.replaced = 0
+        self.covered = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def promote(
+        self,
+        results: List[Dict],
+        kb_path: str = DEFAULT_WEB_KB_PATH,
+        embedding_model: str = "text-embedding-3-large",
+    ) -> int:
+        """Append the new or changed pages of web results to the shard
+
+        Returns the number of pages written.
+        """
+        df = web_kb_rows(results)
+        if df.empty:
+            print("  - No cited web pages to promote")
+            return 0
+
+        # Rows already in the shard: unchanged pages keep their id
+        replaced_ids: List[str] = []
+        if is_segmented_kb(kb_path):
+            querier = get_knowledge_base(kb_path, embedding_model)
+            if querier.is_loaded:
+                live = querier.df
+                df = df[~df["id"].isin(live["id"])]
+                replaced_ids = live.loc[
+                    live["source_file"].isin(df["source_file"]), "id"
+                ].tolist()
+        if df.empty:
+            print("  - Cited web pages are already in the web knowledge base")
+            return 0
+
+        store = SegmentedKnowledgeBase(kb_path, embedding_model)
+        try:
+            # One manifest version: the old rows of updated pages go with it
+            store.append(
+                df.reset_index(drop=True), WEB_KB_SOURCE, replace_ids=replaced_ids
+            )
+        except Exception as e:
+            print(f"  - Could not promote web pages: {e}")
+            return 0
+
+        with self._lock:
+            self.promoted += len(df)
+            self.replaced += len(replaced_ids)
+        print(
+            f"  - Promoted {len(df)} web pages to the web knowledge base "
+            f"({len(replaced_ids)} updated)"
+        )
+
+        if len(store.read_manifest()["segments"]) > WEB_KB_COMPACT_SEGMENTS:
+            store.compact_async()
+        return len(df)
+
+    def covers(
+        self,
+        federated,
+        query: str,
+        max_age: Optional[float] = None,
+        min_score: Optional[float] = None,
+        min_hits: Optional[int] = None,
+    ) -> bool:
+        """Whether fresh pages of the web shard answer the query
+
+        Needs the query embedding, so it is always False in lexical mode.
+        """
+        max_age = DEFAULT_WEB_KB_MAX_AGE if max_age is None else max_age
+        min_score = DEFAULT_WEB_KB_MIN_SCORE if min_score is None else min_score
+        min_hits = DEFAULT_WEB_KB_MIN_HITS if min_hits is None else min_hits
+
+        querier = federated.queriers.get(WEB_KB_SOURCE)
+        if querier is None:
+            return False
+        query_vector = federated.embed_queries([query])[0]
+        if query_vector is None:
+            return False
+
+        results = querier.search_by_vectors(
+            np.asarray(query_vector, dtype=np.float32).reshape(1, -1),
+            top_k=max(min_hits, 1) * 2,
+            min_score=min_score,
+            query_texts=[query],
+        )[0]
+        sources = get_web_source_store()
+        now = datetime.now()
+        matching = fresh = 0
+        for result in results:
+            # Fused rankings may include lexical-only hits below the cutoff
+            if result["score"] < min_score:
+                continue
+            matching += 1
+            url = querier.df.iloc[result["row"]]["source_file"]
+            stored = sources.get(url)
+            if stored is None:
+                continue
+            age = now - datetime.fromisoformat(stored["last_retrieved"])
+            fresh += age.total_seconds() <= max_age
+
+        covered = fresh >= min_hits
+        with self._lock:
+            if covered:
+                self.covered += 1
+            else:
+                self.fallbacks += 1
+        print(
+            f"  - Web knowledge base: {fresh} fresh of {matching} matching pages"
+            + (
+                ", skipping the live web search"
+                if covered
+                else f" (need {min_hits}), searching the web"
+            )
+        )
+        return covered
+
+    def stats(self) -> Dict:
+        """Pages promoted and chapters answered from the shard this run"""
+        with self._lock:
+            checks = self.covered + self.fallbacks
+            return {
+                "promoted": self.promoted,
+                "replaced": self.replaced,
+                "covered": self.covered,
+                "fallbacks": self.fallbacks,
+                "coverage_rate": self.covered / checks if checks else 0.0,
+            }
+
+    def print_stats(self):
+        """Pretty print promotion and coverage"""
+        stats = self.stats()
+        print("\n🛰️ Web Knowledge Base:")
+        print(
+            f"  - Promoted: {stats['promoted']:,} pages "
+            f"({stats['replaced']:,} updated)"
+        )
+        print(
+            f"  - Served from the shard: {stats['covered']:,} chapters, "
+            f"live search: {stats['fallbacks']:,} "
+            f"(coverage {stats['coverage_rate']:.0%})"
+        )
+
+
+_web_kb = WebKnowledgeBase()
+
+
+def get_web_kb() -> WebKnowledgeBase:
+    """Return the process-wide web knowledge base"""
+    return _web_kb
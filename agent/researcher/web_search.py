@@ -0,0 +1,350 @@
+"""Web search through Claude's server-side web search tool
+
+A chapter's search queries are sent concurrently, each with its own timeout,
+so the chapter waits roughly as long as its slowest query. Queries that fail
+or time out are logged and left out; the others are still returned.
+
+The queries of every chapter can be generated up front in one structured
+call (``generate_search_queries_batch``) and cached per outline under
+``data/cache/search_queries``, so unchanged chapters never regenerate them.
+"""
+
+import ast
+import hashlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional
+import anthropic
+from agent.researcher.web_sources import extract_sources, get_web_source_store
+
+WEB_SEARCH_MODEL = "claude-sonnet-4-20250514"
+
+# Queries searched in parallel, and the time allowed for each (seconds)
+WEB_SEARCH_CONCURRENCY = 4
+WEB_SEARCH_TIMEOUT = 90.0
+
+# Search queries generated per chapter, attempts per chapter, and chapters
+# per structured batch call
+NUM_SEARCH_QUERIES = 3
+QUERY_GENERATION_ATTEMPTS = 2
+QUERY_BATCH_SIZE = 30
+
+# Bump when the query prompts change, invalidating cached queries
+QUERY_CACHE_VERSION = 1
+
+DEFAULT_QUERY_CACHE_DIR = "data/cache/search_queries"
+
+# Initialize Anthropic client
+client = anthropic.Anthropic()
+
+
+def search_web_query(query: str, timeout: float = WEB_SEARCH_TIMEOUT) -> Dict:
+    """Run one web search query
+
+    Returns the text response and the pages it found, with cited passages.
+    """
+    response = client.with_options(timeout=timeout, max_retries=1).messages.create(
+        model=WEB_SEARCH_MODEL,
+        max_tokens=2048,
+        messages=[
+            {
+                "role": "user",
+                "content": f"Please search for information about: {query}\n\nFocus on finding recent developments, best practices, and authoritative sources.",
+            }
+        ],
+        tools=[{"type": "web_search_20250305", "name": "web_search", "max_uses": 3}],
+    )
+
+    result_text = ""
+    for content_block in response.content:
+        if hasattr(content_block, "type") and content_block.type == "text":
+            result_text += content_block.text
+
+    return {
+        "query": query,
+        "response": result_text,
+        "sources": extract_sources(response),
+    }
+
+
+def perform_web_search(
+    search_query: str,
+    timeout: float = WEB_SEARCH_TIMEOUT,
+    search_queries: Optional[List[str]] = None,
+    source_max_age: Optional[float] = None,
+) -> List[Dict]:
+    """Execute web searches for the query, all generated queries at once
+
+    Args:
+        search_queries: Queries generated ahead of time (e.g. by the outline
+            batch); generated from ``search_query`` when not given
+        source_max_age: Answer queries searched within this many seconds
+            with their pages from the web source store instead of searching
+            again (their text response is not kept); None always searches
+    """
+
+    if not search_queries:
+        search_queries = generate_search_queries(search_query)
+
+    stored: Dict[str, Dict] = {}
+    if source_max_age is not None:
+        store = get_web_source_store()
+        for query in search_queries:
+            pages = store.query_pages(query, source_max_age)
+            if pages:
+                stored[query] = {"query": query, "response": "", "sources": pages}
+        if stored:
+            print(
+                f"    • {len(stored)} queries answered with pages from the "
+                "web source store"
+            )
+    live = [q for q in search_queries if q not in stored]
+
+    futures = {}
+    done = set()
+    if live:
+        executor = ThreadPoolExecutor(
+            max_workers=min(len(live), WEB_SEARCH_CONCURRENCY),
+            thread_name_prefix="web-search",
+        )
+        futures = {q: executor.submit(search_web_query, q, timeout) for q in live}
+        # The client enforces the timeout per request; this bounds retries too
+        done, _ = wait(futures.values(), timeout=2 * timeout)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    search_results = []
+    for query in search_queries:
+        if query in stored:
+            search_results.append(stored[query])
+            continue
+        future = futures[query]
+        if future not in done:
+            print(f"    • Web search timed out: {query}")
+            continue
+        try:
+            search_results.append(future.result())
+        except Exception as e:
+            print(f"    • Web search failed for '{query}': {e}")
+
+    print(
+        f"    • Web search: {len(search_results)}/{len(search_queries)} "
+        "queries answered"
+    )
+    return search_results
+
+
+def parse_query_list(text: str, num_queries: int = NUM_SEARCH_QUERIES) -> List[str]:
+    """Search queries from an LLM reply: a JSON (or Python) list of strings
+
+    Code fences and text around the list are ignored. Raises ValueError
+    when no non-empty list of strings can be found.
+    """
+    text = re.sub(r"```[a-zA-Z]*", "", text).strip()
+    match = re.search(r"\[.*\]", text, re.DOTALL)
+    candidates = [text] + ([match.group(0)] if match else [])
+
+    for candidate in candidates:
+        for parse in (json.loads, ast.literal_eval):
+            try:
+                queries = parse(candidate)
+            except (ValueError, SyntaxError):
+                continue
+            if isinstance(queries, list):
+                queries = [q.strip() for q in queries if isinstance(q, str)]
+                queries = [q for q in queries if q]
+                if queries:
+                    return queries[:num_queries]
+    raise ValueError(f"No list of search queries in: {text[:200]}")
+
+
+def generate_search_queries(
+    search_query: str, num_queries: int = NUM_SEARCH_QUERIES
+) -> List[str]:
+    """Generate search queries using LLM based on the search query string"""
+
+    prompt = f"""Based on the following information, generate {num_queries} diverse and specific web search queries that would help gather comprehensive information on this topic.
+
+Information:
+{search_query}
+
+Return ONLY a JSON list of {num_queries} search query strings, no explanation needed.
+Example format: ["query 1", "query 2", "query 3"]"""
+
+    for attempt in range(1, QUERY_GENERATION_ATTEMPTS + 1):
+        try:
+            response = client.messages.create(
+                model=WEB_SEARCH_MODEL,
+                max_tokens=256,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+            )
+            queries = parse_query_list(response.content[0].text, num_queries)
+            print(f"    • Search queries: {queries}")
+            return queries
+        except Exception as e:
+            print(f"    • Error generating queries with LLM (attempt {attempt}): {e}")
+
+    raise Exception("Failed to generate valid search queries")
+
+
+# Structured output: the model must answer by calling this tool
+SEARCH_QUERIES_TOOL = {
+    "name": "submit_search_queries",
+    "description": "Submit the web search queries generated for each chapter.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "chapters": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "chapter_id": {"type": "string"},
+                        "queries": {"type": "array", "items": {"type": "string"}},
+                    },
+                    "required": ["chapter_id", "queries"],
+                },
+            }
+        },
+        "required": ["chapters"],
+    },
+}
+
+
+def generate_search_queries_batch(
+    search_queries: Dict[str, str], num_queries: int = NUM_SEARCH_QUERIES
+) -> Dict[str, List[str]]:
+    """Generate the web search queries of many chapters in few calls
+
+    Args:
+        search_queries: Chapter id -> the chapter's search query text
+
+    Returns:
+        Chapter id -> generated queries. Chapters the batch call misses are
+        retried one by one; chapters that still fail are left out.
+    """
+    generated: Dict[str, List[str]] = {}
+    chapter_ids = list(search_queries)
+    for start in range(0, len(chapter_ids), QUERY_BATCH_SIZE):
+        batch = chapter_ids[start : start + QUERY_BATCH_SIZE]
+        chapters = "\n\n".join(
+            f"Chapter {chapter_id}:\n{search_queries[chapter_id]}"
+            for chapter_id in batch
+        )
+        prompt = f"""For each chapter below, generate {num_queries} diverse and specific web search queries that would help gather comprehensive information on its topic. Avoid repeating the same query across chapters.
+
+{chapters}
+
+Submit the queries of every chapter with the submit_search_queries tool."""
+
+        try:
+            response = client.messages.create(
+                model=WEB_SEARCH_MODEL,
+                max_tokens=max(1024, 150 * num_queries * len(batch)),
+                messages=[{"role": "user", "content": prompt}],
+                tools=[SEARCH_QUERIES_TOOL],
+                tool_choice={"type": "tool", "name": SEARCH_QUERIES_TOOL["name"]},
+            )
+            for block in response.content:
+                if getattr(block, "type", None) != "tool_use":
+                    continue
+                for entry in block.input.get("chapters", []):
+                    chapter_id = str(entry.get("chapter_id", ""))
+                    queries = [
+                        q.strip()
+                        for q in entry.get("queries") or []
+                        if isinstance(q, str) and q.strip()
+                    ]
+                    if chapter_id in batch and queries:
+                        generated[chapter_id] = queries[:num_queries]
+        except Exception as e:
+            print(f"  - Batch query generation failed: {e}")
+
+    missing = [chapter_id for chapter_id in chapter_ids if chapter_id not in generated]
+    print(
+        f"  - Generated queries for {len(chapter_ids) - len(missing)}/"
+        f"{len(chapter_ids)} chapters in one pass"
+    )
+    for chapter_id in missing:
+        print(f"  - Retrying query generation for chapter {chapter_id}")
+        try:
+            generated[chapter_id] = generate_search_queries(
+                search_queries[chapter_id], num_queries
+            )
+        except Exception as e:
+            print(f"    • Chapter {chapter_id} will generate its queries later: {e}")
+    return generated
+
+
+def search_queries_path(
+    outline_path: str, cache_dir: str = DEFAULT_QUERY_CACHE_DIR
+) -> Path:
+    """Cache file of the generated queries, keyed by the outline path"""
+    path = Path(outline_path)
+    digest = hashlib.sha256(str(path.resolve()).encode("utf-8")).hexdigest()
+    return Path(cache_dir) / f"{path.stem}-{digest[:12]}.json"
+
+
+def query_cache_key(search_query: str, num_queries: int = NUM_SEARCH_QUERIES) -> str:
+    """Cache key of a chapter's queries: its search text and the query setup"""
+    payload = (
+        f"{QUERY_CACHE_VERSION}\n{WEB_SEARCH_MODEL}\n{num_queries}\n{search_query}"
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_search_queries(
+    outline_path: str,
+    search_queries: Dict[str, str],
+    num_queries: int = NUM_SEARCH_QUERIES,
+) -> Dict[str, List[str]]:
+    """Queries of every chapter, generating only those not cached yet
+
+    The cache maps each chapter's query key to its queries, so a chapter
+    whose spec changed gets new queries while the others are reused.
+    """
+    path = search_queries_path(outline_path)
+    cached: Dict[str, Dict] = {}
+    if path.exists():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"  - Ignoring unreadable query cache {path}: {e}")
+
+    keys = {
+        chapter_id: query_cache_key(text, num_queries)
+        for chapter_id, text in search_queries.items()
+    }
+    queries = {
+        chapter_id: cached[key]["queries"]
+        for chapter_id, key in keys.items()
+        if key in cached
+    }
+    missing = {
+        chapter_id: text
+        for chapter_id, text in search_queries.items()
+        if chapter_id not in queries
+    }
+    print(f"  - Search queries cached for {len(queries)}/{len(keys)} chapters")
+    if not missing:
+        return queries
+
+    generated = generate_search_queries_batch(missing, num_queries)
+    queries.update(generated)
+
+    # Keep only the entries of the current outline
+    entries = {
+        keys[chapter_id]: {"chapter_id": chapter_id, "queries": chapter_queries}
+        for chapter_id, chapter_queries in queries.items()
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2, ensure_ascii=False)
+        print(f"  - Search queries saved to {path}")
+    except OSError as e:
+        print(f"  - Could not save the query cache {path}: {e}")
+    return queries
@@ -0,0 +1,281 @@
+"""URL-level store of web search sources
+
+Claude's web search returns structured blocks next to its text answer: the
+pages it found (URL, title, page age) and citations quoting them. These are
+kept per URL in SQLite, with every passage cited from the page so far, when
+it was first and last retrieved, and the chapters it was found for. A page
+found again later is served from the store, snippets from earlier searches
+included, and its content goes to the researcher only once per run.
+
+The store also remembers which pages each search query found. A query
+searched again within ``max_age`` (e.g. by a later chapter) is answered
+with those pages instead of fetching them again; pages already given to
+an earlier chapter then reach the new one as references only.
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from agent.researcher.embedding_cache import normalize_text
+
+DEFAULT_WEB_SOURCES_PATH = "data/cache/web_sources.sqlite"
+
+# Cited passages kept per page
+MAX_SNIPPETS = 20
+
+# Age (seconds) under which a query's stored pages answer it again
+DEFAULT_WEB_SOURCE_MAX_AGE = 7 * 24 * 3600
+
+
+def query_key(query: str) -> str:
+    """Stored queries are matched after normalising case and whitespace"""
+    return normalize_text(query).lower()
+
+
+def extract_sources(response) -> List[Dict]:
+    """Pages found by a web search response, with the passages it cited
+
+    Reads the ``web_search_tool_result`` blocks (pages) and the
+    ``web_search_result_location`` citations of the text blocks (passages).
+    """
+    retrieved = datetime.now().isoformat()
+    sources: Dict[str, Dict] = {}
+
+    def source(url: str, title: Optional[str]) -> Dict:
+        entry = sources.setdefault(
+            url,
+            {
+                "url": url,
+                "title": title or url,
+                "page_age": None,
+                "snippets": [],
+                "retrieved": retrieved,
+            },
+        )
+        if title and entry["title"] == url:
+            entry["title"] = title
+        return entry
+
+    for block in response.content:
+        block_type = getattr(block, "type", None)
+        if block_type == "web_search_tool_result":
+            # An error result carries an error object instead of a list
+            for result in getattr(block, "content", None) or []:
+                if getattr(result, "type", None) == "web_search_result":
+                    source(result.url, result.title)["page_age"] = result.page_age
+        elif block_type == "text":
+            for citation in getattr(block, "citations", None) or []:
+                if getattr(citation, "type", None) != "web_search_result_location":
+                    continue
+                entry = source(citation.url, citation.title)
+                text = (citation.cited_text or "").strip()
+                if text and text not in entry["snippets"]:
+                    entry["snippets"].append(text)
+
+    return list(sources.values())
+
+
+class WebSourceStore:
+    """Web sources keyed by URL, persisted in SQLite across runs"""
+
+    def __init__(self, path: str = DEFAULT_WEB_SOURCES_PATH):
+        self.path = Path(path)
+        self.added = 0
+        self.reused = 0
+        self.query_hits = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS web_sources (
+                url TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                page_age TEXT,
+                snippets TEXT NOT NULL,
+                chapters TEXT NOT NULL,
+                first_retrieved TEXT NOT NULL,
+                last_retrieved TEXT NOT NULL
+            )""")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS web_queries (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                urls TEXT NOT NULL,
+                retrieved TEXT NOT NULL
+            )""")
+        self._conn.commit()
+
+    def add(self, sources: List[Dict], chapter_id: Optional[str] = None) -> List[Dict]:
+        """Merge sources into the store and return the stored records
+
+        Snippets are merged with those of earlier searches, so a record may
+        hold passages this search did not cite.
+        """
+        records = []
+        with self._lock:
+            for source in sources:
+                # Records replayed from a cache carry their last retrieval
+                retrieved = source.get("retrieved") or source.get("last_retrieved")
+                first = source.get("first_retrieved") or retrieved
+                stored = self._get(source["url"])
+                if stored is None:
+                    self.added += 1
+                    stored = {
+                        "url": source["url"],
+                        "title": source["title"],
+                        "page_age": source.get("page_age"),
+                        "snippets": [],
+                        "chapters": [],
+                        "first_retrieved": first,
+                        "last_retrieved": retrieved,
+                    }
+                else:
+                    self.reused += 1
+                stored["title"] = source["title"] or stored["title"]
+                stored["page_age"] = source.get("page_age") or stored["page_age"]
+                # Replays from the web cache must not move either time back
+                # (ISO timestamps compare in time order)
+                stored["first_retrieved"] = min(stored["first_retrieved"], first)
+                stored["last_retrieved"] = max(stored["last_retrieved"], retrieved)
+                for snippet in source["snippets"]:
+                    if snippet not in stored["snippets"]:
+                        stored["snippets"].append(snippet)
+                stored["snippets"] = stored["snippets"][-MAX_SNIPPETS:]
+                if chapter_id and chapter_id not in stored["chapters"]:
+                    stored["chapters"].append(chapter_id)
+
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO web_sources VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        stored["url"],
+                        stored["title"],
+                        stored["page_age"],
+                        json.dumps(stored["snippets"], ensure_ascii=False),
+                        json.dumps(stored["chapters"]),
+                        stored["first_retrieved"],
+                        stored["last_retrieved"],
+                    ),
+                )
+                records.append(stored)
+            self._conn.commit()
+        return records
+
+    def add_query(self, query: str, urls: List[str], retrieved: str):
+        """Remember the pages a search query found"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT retrieved FROM web_queries WHERE key = ?", (query_key(query),)
+            ).fetchone()
+            # Replays from the web cache must not move the time back
+            if row is not None and row[0] > retrieved:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO web_queries VALUES (?, ?, ?, ?)",
+                (query_key(query), query, json.dumps(urls), retrieved),
+            )
+            self._conn.commit()
+
+    def query_pages(
+        self, query: str, max_age: float = DEFAULT_WEB_SOURCE_MAX_AGE
+    ) -> Optional[List[Dict]]:
+        """Stored pages of a query searched within ``max_age``, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT urls, retrieved FROM web_queries WHERE key = ?",
+                (query_key(query),),
+            ).fetchone()
+            if row is None:
+                return None
+            age = datetime.now() - datetime.fromisoformat(row[1])
+            if age.total_seconds() > max_age:
+                return None
+            pages = [self._get(url) for url in json.loads(row[0])]
+            if not pages or any(page is None for page in pages):
+                return None
+            self.query_hits += 1
+            return pages
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            return self._get(url)
+
+    def _get(self, url: str) -> Optional[Dict]:
+        row = self._conn.execute(
+            "SELECT url, title, page_age, snippets, chapters, first_retrieved, "
+            "last_retrieved FROM web_sources WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "url": row[0],
+            "title": row[1],
+            "page_age": row[2],
+            "snippets": json.loads(row[3]),
+            "chapters": json.loads(row[4]),
+            "first_retrieved": row[5],
+            "last_retrieved": row[6],
+        }
+
+    def stats(self) -> Dict:
+        """Sources stored, and how many were new or seen again this run"""
+        with self._lock:
+            (entries,) = self._conn.execute(
+                "SELECT COUNT(*) FROM web_sources"
+            ).fetchone()
+            return {
+                "entries": entries,
+                "added": self.added,
+                "reused": self.reused,
+                "query_hits": self.query_hits,
+            }
+
+    def print_stats(self):
+        """Pretty print the store contents"""
+        stats = self.stats()
+        print("\n🔗 Web Source Store:")
+        print(
+            f"  - {stats['entries']:,} pages stored, {stats['added']:,} new "
+            f"and {stats['reused']:,} found again this run"
+        )
+        print(f"  - Queries answered from the store: {stats['query_hits']:,}")
+
+
+def record_web_sources(results: List[Dict], chapter_id: str) -> List[Dict]:
+    """Store the sources of a chapter's web results, returning the records
+
+    The pages each query found are remembered too, so the query can later be
+    answered from the store.
+    """
+    store = get_web_source_store()
+    recorded = []
+    for result in results:
+        if not result.get("sources"):
+            recorded.append(result)
+            continue
+        sources = store.add(result["sources"], chapter_id)
+        store.add_query(
+            result["query"],
+            [source["url"] for source in sources],
+            max(source["last_retrieved"] for source in sources),
+        )
+        recorded.append({**result, "sources": sources})
+    return recorded
+
+
+_store: Optional[WebSourceStore] = None
+_lock = threading.Lock()
+
+
+def get_web_source_store() -> WebSourceStore:
+    """Return the process-wide web source store"""
+    global _store
+    with _lock:
+        if _store is None:
+            _store = WebSourceStore()
+        return _store
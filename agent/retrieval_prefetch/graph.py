@@ -0,0 +1,17 @@
+from langgraph.graph import StateGraph, END
+from agent.state import GraphState
+from agent.retrieval_prefetch.tools import prefetch_retrieval, prefetch_search_queries
+
+
+def create_retrieval_prefetch_graph():
+    """Create the outline-wide retrieval subgraph"""
+    workflow = StateGraph(GraphState)
+
+    workflow.add_node("prefetch", prefetch_retrieval)
+    workflow.add_node("search_queries", prefetch_search_queries)
+
+    workflow.set_entry_point("prefetch")
+    workflow.add_edge("prefetch", "search_queries")
+    workflow.add_edge("search_queries", END)
+
+    return workflow.compile()
@@ -0,0 +1,54 @@
+from typing import Dict, List
+from agent.state import GraphState
+from agent.researcher.federated import FederatedKnowledgeBase
+from agent.researcher.context_packer import DEFAULT_KB_CANDIDATES
+from agent.researcher.knowledge_base import chapter_search_query
+from agent.researcher.web_search import load_search_queries
+
+DEFAULT_OUTLINE_PATH = "data/input/outline.json"
+
+
+def prefetch_retrieval(state: GraphState) -> dict:
+    """Retrieve knowledge base context for every chapter of the outline at once"""
+    print("\n--- 📦 PREFETCHING KNOWLEDGE BASE RETRIEVAL ---")
+
+    if not state.get("prefetch_retrieval"):
+        print("  - Skipped (prefetch_retrieval is disabled)")
+        return {}
+
+    chapters = state["outline"].get("table_of_contents", [])
+    if not chapters:
+        return {}
+
+    federated = FederatedKnowledgeBase.from_state(state)
+    queries = [chapter_search_query(chapter) for chapter in chapters]
+    batch_results = federated.search_batch(
+        queries, chapters, top_k=DEFAULT_KB_CANDIDATES
+    )
+
+    prefetched: Dict[str, List[Dict]] = {
+        chapter["id"]: results for chapter, results in zip(chapters, batch_results)
+    }
+    return {"prefetched_kb_results": prefetched}
+
+
+def prefetch_search_queries(state: GraphState) -> dict:
+    """Generate the web search queries of every chapter in one batch"""
+    print("\n--- 🔎 GENERATING SEARCH QUERIES ---")
+
+    if not state.get("batch_search_queries"):
+        print("  - Skipped (batch_search_queries is disabled)")
+        return {}
+    if state.get("web_cache_mode") == "frozen":
+        print("  - Skipped (the web cache is frozen, no web search will run)")
+        return {}
+
+    chapters = state["outline"].get("table_of_contents", [])
+    if not chapters:
+        return {}
+
+    queries = load_search_queries(
+        state.get("outline_path") or DEFAULT_OUTLINE_PATH,
+        {chapter["id"]: chapter_search_query(chapter) for chapter in chapters},
+    )
+    return {"chapter_search_queries": queries}
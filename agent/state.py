@@ -26,6 +26,19 @@ class SourceHints(TypedDict):
     public_references: List[str]
 
 
+class ContextItem(TypedDict, total=False):
+    source: str  # web, documents or kb_<name>
+    id: str
+    score: float
+    header: str
+    text: str
+    tokens: int
+    truncated: bool
+    row: int  # matrix row of a knowledge base result
+    url: str  # page of a web source
+    compressed: bool
+
+
 class ChapterWork(TypedDict):
     chapter_details: Dict
     research_results: Optional[str]
@@ -33,6 +46,9 @@ class ChapterWork(TypedDict):
     review_feedback: Optional[str]
     review_decision: Optional[str]
     token_usage: Dict[str, TokenUsage]
+    context_report: Optional[Dict]
+    compression_report: Optional[Dict]
+    research_mode: Optional[str]  # how research_results were produced
 
 
 class GraphState(TypedDict):
@@ -47,6 +63,64 @@ class GraphState(TypedDict):
     total_token_usage: TokenUsage
     token_log: List[Dict]
 
+    # Knowledge base configuration
+    knowledge_base_path: Optional[str]
+    knowledge_base_additional_path: Optional[str]
+    knowledge_base_sources: Optional[Dict[str, str]]
+    knowledge_base_quotas: Optional[Dict[str, int]]
+    kb_retrieval_mode: Optional[str]  # hybrid | dense | lexical | cached
+    kb_retrieval_unit: Optional[str]  # chunk | sentence
+    # BM25 candidates hybrid search limits dense scoring to (0: every row)
+    kb_lexical_prefilter: Optional[int]
+    kb_mmr_lambda: Optional[float]
+    kb_duplicate_threshold: Optional[float]
+    # Reuse results of queries within this cosine distance (on by default)
+    semantic_cache: Optional[bool]
+    semantic_cache_distance: Optional[float]
+    embedding_model: Optional[str]
+
+    # Token budgets per stage (e.g. {"research": 24000}) and the minimum
+    # number of context items kept per source
+    context_budgets: Optional[Dict[str, int]]
+    context_min_per_source: Optional[Dict[str, int]]
+    context_compression: Optional[bool]
+    compression_target_ratio: Optional[float]
+    research_files_mode: Optional[str]  # sections (default) | full
+    research_mode: Optional[str]  # synthesize (default) | direct | auto
+    # Rewrites only retrieve context for the review feedback (on by default)
+    incremental_rewrite: Optional[bool]
+
+    # Web search results per chapter (chapter_id -> results), and the
+    # persistent web cache: read_write (default) | frozen | off
+    cached_web_results: Optional[Dict[str, List[Dict]]]
+    web_cache_mode: Optional[str]
+    web_cache_ttl: Optional[float]  # seconds
+    # Web pages whose content went to a chapter (URL -> first chapter id)
+    delivered_web_sources: Optional[Dict[str, str]]
+    # Queries searched within this many seconds are answered from the web
+    # source store (None: always search)
+    web_source_max_age: Optional[float]
+    # Cited web pages promoted into a local knowledge base shard
+    web_kb: Optional[bool]
+    web_kb_path: Optional[str]
+    web_kb_max_age: Optional[float]  # seconds
+    web_kb_min_score: Optional[float]
+    web_kb_min_hits: Optional[int]
+
+    # Outline-wide retrieval (chapter_id -> ranked results across knowledge bases)
+    prefetch_retrieval: Optional[bool]
+    prefetched_kb_results: Optional[Dict[str, List[Dict]]]
+
+    # Web search queries of every chapter generated in one batch and cached
+    # per outline under data/cache (chapter_id -> queries)
+    outline_path: Optional[str]
+    batch_search_queries: Optional[bool]
+    chapter_search_queries: Optional[Dict[str, List[str]]]
+
+    # Research file digests built before the loop (file path -> digest)
+    digest_research_files: Optional[bool]
+    research_digests: Optional[Dict[str, Dict]]
+
 
 # Subgraph-specific states
 class ResearcherState(TypedDict):
@@ -57,8 +131,18 @@ class ResearcherState(TypedDict):
     # Intermediate values (used between nodes)
     current_chapter: Optional[Dict]
     current_work: Optional[Dict]
-    raw_search_results: Optional[Dict[str, str]]
+    raw_search_results: Optional[List[ContextItem]]
     cached_web_results: Optional[Dict[str, List[Dict]]]
+    prefetched_kb_results: Optional[Dict[str, List[Dict]]]
+    chapter_search_queries: Optional[Dict[str, List[str]]]
+    delivered_web_sources: Optional[Dict[str, str]]
+    web_source_max_age: Optional[float]  # seconds
+    web_kb: Optional[bool]
+    web_kb_path: Optional[str]
+    web_kb_max_age: Optional[float]  # seconds
+    web_kb_min_score: Optional[float]
+    web_kb_min_hits: Optional[int]
+    research_digests: Optional[Dict[str, Dict]]
 
     # Final output
     research_results: Optional[str]
@@ -66,8 +150,31 @@ class ResearcherState(TypedDict):
     # Configuration
     knowledge_base_path: Optional[str]
     knowledge_base_additional_path: Optional[str]
+    knowledge_base_sources: Optional[Dict[str, str]]
+    knowledge_base_quotas: Optional[Dict[str, int]]
+    kb_retrieval_mode: Optional[str]  # hybrid | dense | lexical | cached
+    kb_retrieval_unit: Optional[str]  # chunk | sentence
+    kb_lexical_prefilter: Optional[int]
+    kb_mmr_lambda: Optional[float]
+    kb_duplicate_threshold: Optional[float]
+    # Reuse results of queries within this cosine distance (on by default)
+    semantic_cache: Optional[bool]
+    semantic_cache_distance: Optional[float]
     embedding_model: Optional[str]
 
+    # Token budgets per stage (e.g. {"research": 24000}) and the minimum
+    # number of context items kept per source
+    context_budgets: Optional[Dict[str, int]]
+    context_min_per_source: Optional[Dict[str, int]]
+    context_compression: Optional[bool]
+    compression_target_ratio: Optional[float]
+    research_files_mode: Optional[str]  # sections (default) | full
+    research_mode: Optional[str]  # synthesize (default) | direct | auto
+    # Rewrites only retrieve context for the review feedback (on by default)
+    incremental_rewrite: Optional[bool]
+    web_cache_mode: Optional[str]  # read_write (default) | frozen | off
+    web_cache_ttl: Optional[float]  # seconds
+
     # Token tracking
     total_tokens: Dict[str, Any]
 
@@ -22,6 +22,11 @@ def write_chapter(state: WriterState, llm) -> dict:
     if current_work.get("review_decision") == "reject":
         feedback_prompt = f"Please address the following feedback from the previous version: {current_work['review_feedback']}"
 
+    # Direct-context research is raw source material, not a synthesis
+    research_note = ""
+    if current_work.get("research_mode") == "direct":
+        research_note = "(Excerpts retrieved from the sources below, grouped by source. Use only what is relevant to this chapter.)\n"
+
     # Format key topics as a bullet list
     key_topics = "\n".join(
         [f"- {topic}" for topic in current_chapter.get("key_topics", [])]
@@ -45,7 +50,7 @@ Purpose of this chapter:
 {' '.join(current_chapter.get('purpose', []))}
 
 Research material:
-{research}
+{research_note}{research}
 
 {feedback_prompt}
 
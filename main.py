@@ -1,6 +1,12 @@
 import json
 from datetime import datetime
 from agent import create_document_generation_graph, GraphState
+from agent.researcher.kb_registry import get_registry, warm_knowledge_bases
+from agent.researcher.embedding_cache import get_embedding_cache
+from agent.researcher.semantic_cache import get_semantic_cache
+from agent.researcher.web_cache import get_web_cache
+from agent.researcher.web_kb import get_web_kb
+from agent.researcher.web_sources import get_web_source_store
 from utils.token_tracker import create_token_usage
 
 
@@ -46,8 +52,30 @@ def main():
         "knowledge_base_path": "data/knowledge_base/df_with_embeddings_large.parquet",
         "knowledge_base_additional_path": 'data/knowledge_base/ifrs_knowledge_base_with_embeddings.parquet',
         "embedding_model": "text-embedding-3-large",
+        # Hybrid BM25 + dense retrieval; set a BM25 candidate count (e.g. 2000)
+        # to only score those rows densely on large knowledge bases
+        "kb_retrieval_mode": "hybrid",
+        "kb_lexical_prefilter": 0,
+        # Retrieve knowledge base context for all chapters before the loop
+        "prefetch_retrieval": True,
+        # Generate every chapter's web search queries in one call
+        "batch_search_queries": True,
+        # Digest each research file once and give chapters its relevant sections
+        "digest_research_files": True,
+        # Skip the research synthesis call when the context fits the writer
+        "research_mode": "auto",
     }
 
+    # Load the knowledge bases in the background while the graph starts up
+    warm_knowledge_bases(
+        [
+            initial_state["knowledge_base_path"],
+            initial_state["knowledge_base_additional_path"],
+        ],
+        initial_state["embedding_model"],
+        lexical_prefilter=initial_state["kb_lexical_prefilter"],
+    )
+
     print("\n🚀 Starting Document Generation Process...")
     print(f"⏰ Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(
@@ -106,6 +134,13 @@ def print_final_summary(final_state: GraphState):
     else:
         print("  - No chapters completed")
 
+    get_registry().print_stats()
+    get_embedding_cache().print_stats()
+    get_semantic_cache().print_stats()
+    get_web_cache().print_stats()
+    get_web_source_store().print_stats()
+    get_web_kb().print_stats()
+
     print("\n💾 Output files have been saved to the 'output' directory.")
 
 